@@ -0,0 +1,98 @@
+import asyncio
+import time
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.enums import ChatMemberStatus
+from aiogram.exceptions import TelegramAPIError
+
+from config import ADMIN_IDS, GROUP_ADMIN_CACHE_TTL
+import logger
+import metrics
+
+log = logger.get_logger("admins")
+
+# TTL ning shu qismidan keyin kesh fonda yangilanadi (foydalanuvchi kutmaydi)
+REFRESH_AHEAD = 0.8
+ADMIN_STATUSES = (ChatMemberStatus.CREATOR, ChatMemberStatus.ADMINISTRATOR)
+
+# chat_id -> (guruh adminlari, olingan vaqt)
+_cache: Dict[int, Tuple[FrozenSet[int], float]] = {}
+# chat_id -> ishlayotgan yangilash vazifasi (bir vaqtda bitta so'rov)
+_inflight: Dict[int, asyncio.Task] = {}
+
+
+async def _fetch(bot: Bot, chat_id: int) -> Optional[FrozenSet[int]]:
+    """Telegramdan guruh adminlarini olish"""
+    try:
+        members = await bot.get_chat_administrators(chat_id)
+        admin_ids = frozenset(m.user.id for m in members if not m.user.is_bot)
+        _cache[chat_id] = (admin_ids, time.monotonic())
+        metrics.inc("group_admins_fetched")
+        return admin_ids
+    except TelegramAPIError as e:
+        metrics.inc("group_admins_fetch_errors")
+        log.warning(f"⚠️ Guruh adminlarini olish xatosi ({chat_id}): {e}")
+        return None
+    finally:
+        _inflight.pop(chat_id, None)
+
+
+def _refresh(bot: Bot, chat_id: int) -> asyncio.Task:
+    """Yangilashni boshlash yoki ishlayotganiga qo'shilish"""
+    task = _inflight.get(chat_id)
+    if task is None:
+        task = asyncio.create_task(_fetch(bot, chat_id))
+        _inflight[chat_id] = task
+    return task
+
+
+async def get_group_admins(bot: Bot, chat_id: int) -> FrozenSet[int]:
+    """Guruh adminlari (keshdan, kerak bo'lsa Telegramdan)"""
+    entry = _cache.get(chat_id)
+    now = time.monotonic()
+
+    if entry is not None:
+        admin_ids, fetched_at = entry
+        age = now - fetched_at
+        if age < GROUP_ADMIN_CACHE_TTL:
+            metrics.inc("group_admins_cache_hits")
+            if age >= GROUP_ADMIN_CACHE_TTL * REFRESH_AHEAD:
+                _refresh(bot, chat_id)
+            return admin_ids
+
+    metrics.inc("group_admins_cache_misses")
+    admin_ids = await asyncio.shield(_refresh(bot, chat_id))
+    if admin_ids is None:
+        # Telegram javob bermasa eski ro'yxatdan foydalanamiz
+        return entry[0] if entry is not None else frozenset()
+    return admin_ids
+
+
+def apply_member_update(chat_id: int, user_id: int, status: str):
+    """chat_member update kelganda keshni API chaqiruvisiz yangilash"""
+    entry = _cache.get(chat_id)
+    if entry is None:
+        return
+
+    admin_ids, fetched_at = entry
+    if status in ADMIN_STATUSES:
+        admin_ids = admin_ids | {user_id}
+    else:
+        admin_ids = admin_ids - {user_id}
+    _cache[chat_id] = (admin_ids, fetched_at)
+    metrics.inc("group_admins_member_updates")
+
+
+def invalidate(chat_id: int):
+    """Guruh keshini o'chirish"""
+    _cache.pop(chat_id, None)
+
+
+async def is_chat_admin(bot: Bot, user_id: int, chat_id: int) -> bool:
+    """Global admin yoki shu guruhning admini"""
+    if user_id in ADMIN_IDS:
+        return True
+    if chat_id > 0:
+        return False
+    return user_id in await get_group_admins(bot, chat_id)
@@ -0,0 +1,186 @@
+import asyncio
+import random
+import ssl
+import time
+from typing import Callable, Dict, List, Optional
+
+import certifi
+from aiohttp import (
+    ClientConnectionError,
+    ClientConnectorError,
+    ClientError,
+    ClientSession,
+    ClientTimeout,
+    TraceConfig
+)
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+from aiogram.__meta__ import __version__
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramNetworkError
+
+from config import (
+    BOT_API_POOL_SIZE,
+    BOT_API_KEEPALIVE,
+    BOT_API_DNS_TTL,
+    BOT_API_CONNECT_TIMEOUT,
+    BOT_API_TIMEOUT,
+    BOT_API_TIMEOUTS,
+    BOT_API_RETRIES,
+    BOT_API_RETRY_BASE,
+    BOT_API_SLOW_MS
+)
+import logger
+import metrics
+
+log = logger.get_logger("api")
+
+# (metod, ms, muvaffaqiyatli) - har bir Bot API chaqiruvidan keyin
+TimingHook = Callable[[str, float, bool], None]
+
+RETRY_MAX_DELAY = 5.0  # sekund
+
+
+def parse_timeouts(spec: str) -> Dict[str, float]:
+    """'sendMessage=10,getChat=5' -> {'sendMessage': 10.0, 'getChat': 5.0}"""
+    timeouts = {}
+    for item in spec.split(","):
+        if "=" in item:
+            method, value = item.split("=", 1)
+            try:
+                timeouts[method.strip()] = float(value)
+            except ValueError:
+                log.warning(f"⚠️ Noto'g'ri timeout: {item.strip()}")
+    return timeouts
+
+
+def _is_safe_to_repeat(method_name: str) -> bool:
+    """Javobsiz qolgan so'rovni qayta yuborish mumkinmi (send*/edit* ikki marta bajarilishi mumkin)"""
+    return method_name.startswith("get") and method_name != "getUpdates"
+
+
+def is_retryable(error: BaseException, method_name: str) -> bool:
+    """Xatodan keyin so'rovni qayta yuborish mumkinmi.
+    Ulanish o'rnatilmagan bo'lsa (ClientConnectorError) so'rov Telegramga yetmagan - har doim.
+    Ulanish uzilishi (ServerDisconnectedError) va timeout so'rov qabul qilingandan keyin ham
+    bo'lishi mumkin - faqat takrorlash xavfsiz metodlar uchun."""
+    if isinstance(error, asyncio.TimeoutError):
+        return _is_safe_to_repeat(method_name)
+    if isinstance(error, ClientConnectorError):
+        return True
+    if isinstance(error, ClientConnectionError):
+        return _is_safe_to_repeat(method_name)
+    return False
+
+
+def record_metrics(method_name: str, elapsed_ms: float, ok: bool):
+    """Metod bo'yicha chaqiruvlar soni, umumiy vaqt va xatolar"""
+    metrics.inc(f"api_{method_name}_calls")
+    metrics.inc(f"api_{method_name}_ms", int(elapsed_ms))
+    if not ok:
+        metrics.inc(f"api_{method_name}_errors")
+    if elapsed_ms >= BOT_API_SLOW_MS and method_name != "getUpdates":
+        log.warning(f"🐢 Sekin Bot API chaqiruvi: {method_name} {elapsed_ms:.0f} ms")
+
+
+def _connection_trace() -> TraceConfig:
+    """Yangi va qayta ishlatilgan ulanishlarni sanash (keep-alive samarasi)"""
+    trace = TraceConfig()
+
+    async def on_create(session, context, params):
+        metrics.inc("api_connections_opened")
+
+    async def on_reuse(session, context, params):
+        metrics.inc("api_connections_reused")
+
+    trace.on_connection_create_end.append(on_create)
+    trace.on_connection_reuseconn.append(on_reuse)
+    return trace
+
+
+class TunedAiohttpSession(AiohttpSession):
+    """Sozlanadigan ulanishlar pooli, metod bo'yicha timeout, qayta urinish va o'lchovlar"""
+
+    def __init__(self, timeouts: Optional[Dict[str, float]] = None,
+                 retries: int = BOT_API_RETRIES, retry_base: float = BOT_API_RETRY_BASE, **kwargs):
+        super().__init__(limit=BOT_API_POOL_SIZE, timeout=BOT_API_TIMEOUT, **kwargs)
+        self._connector_init.update({
+            "ssl": ssl.create_default_context(cafile=certifi.where()),
+            "limit_per_host": BOT_API_POOL_SIZE,
+            "keepalive_timeout": BOT_API_KEEPALIVE,
+            "ttl_dns_cache": BOT_API_DNS_TTL,
+            "use_dns_cache": True
+        })
+        self.timeouts = parse_timeouts(BOT_API_TIMEOUTS) if timeouts is None else timeouts
+        self.retries = retries
+        self.retry_base = retry_base
+        self.timing_hooks: List[TimingHook] = [record_metrics]
+
+    async def create_session(self) -> ClientSession:
+        if self._should_reset_connector:
+            await self.close()
+
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=self._connector_type(**self._connector_init),
+                headers={USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{__version__}"},
+                trace_configs=[_connection_trace()]
+            )
+            self._should_reset_connector = False
+
+        return self._session
+
+    def _timeout_for(self, method_name: str, timeout: Optional[float]) -> ClientTimeout:
+        # Chaqiruvchi bergan timeout (masalan, getUpdates long-polling) ustun turadi
+        if timeout is None:
+            timeout = self.timeouts.get(method_name, self.timeout)
+        return ClientTimeout(total=timeout, connect=min(BOT_API_CONNECT_TIMEOUT, timeout))
+
+    def _retry_delay(self, attempt: int) -> float:
+        """Eksponensial kutish, to'liq jitter bilan (bir vaqtda qayta urinmasliklari uchun)"""
+        return random.uniform(0, min(self.retry_base * (2 ** attempt), RETRY_MAX_DELAY))
+
+    def _run_hooks(self, method_name: str, elapsed_ms: float, ok: bool):
+        for hook in self.timing_hooks:
+            try:
+                hook(method_name, elapsed_ms, ok)
+            except Exception as e:
+                log.warning(f"⚠️ Timing hook xatosi: {e}")
+
+    async def make_request(self, bot, method, timeout: Optional[int] = None):
+        session = await self.create_session()
+        method_name = method.__api_method__
+        url = self.api.api_url(token=bot.token, method=method_name)
+        client_timeout = self._timeout_for(method_name, timeout)
+
+        attempt = 0
+        started = time.perf_counter()
+        while True:
+            # Forma har urinishda qayta quriladi (fayllar oqimi bir marta o'qiladi)
+            form = self.build_form_data(bot=bot, method=method)
+            try:
+                async with session.post(url, data=form, timeout=client_timeout) as resp:
+                    raw_result = await resp.text()
+                break
+            except (asyncio.TimeoutError, ClientError) as e:
+                if not is_retryable(e, method_name) or attempt >= self.retries:
+                    self._run_hooks(method_name, (time.perf_counter() - started) * 1000, False)
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise TelegramNetworkError(method=method, message="Request timeout error")
+                    raise TelegramNetworkError(method=method, message=f"{type(e).__name__}: {e}")
+
+                metrics.inc("api_retries")
+                await asyncio.sleep(self._retry_delay(attempt))
+                attempt += 1
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        try:
+            response = self.check_response(
+                bot=bot, method=method, status_code=resp.status, content=raw_result
+            )
+        except Exception:
+            self._run_hooks(method_name, elapsed_ms, False)
+            raise
+
+        self._run_hooks(method_name, elapsed_ms, True)
+        return response.result
@@ -1,4 +1,7 @@
 import asyncio
+import time
+import tracemalloc
+from typing import Dict, Optional, Tuple
 from aiogram import Bot, Dispatcher, F
 from aiogram.enums import ChatType, ChatMemberStatus, ParseMode
 from aiogram.types import (
@@ -12,27 +15,84 @@ from aiogram.types import (
 )
 from aiogram.filters import Command, CommandObject, ChatMemberUpdatedFilter
 from aiogram.client.default import DefaultBotProperties
-
-from config import BOT_TOKEN, ADMIN_IDS, ALLOWED_GROUP_IDS, DEV_NAME, DEV_USERNAME, BOT_USERNAME, print_config
+from aiogram.exceptions import TelegramBadRequest
+
+from config import (
+    BOT_TOKEN,
+    ADMIN_IDS,
+    DEV_NAME,
+    DEV_USERNAME,
+    BOT_USERNAME,
+    SHUTDOWN_TIMEOUT,
+    CONTACTS_COALESCE_WINDOW,
+    WARMUP_ON_START,
+    LOG_LEVEL,
+    LOG_LEVELS,
+    LOG_RATE_LIMIT,
+    LOG_RATE_WINDOW,
+    LOG_QUEUE_SIZE,
+    print_config
+)
+from api_session import TunedAiohttpSession
+from middlewares import (
+    InflightMiddleware,
+    OrderedUpdatesMiddleware,
+    ThrottlingMiddleware,
+    TracingMiddleware,
+    HandlerSpanMiddleware,
+    TracingRequestMiddleware
+)
 import db
+import admins
+import broadcast
+import groups
+import journal
+import logger
+import trending
+import metrics
+import screens
+import snapshot
+import tracing
+
+log = logger.get_logger("bot")
 
 # =================== BOT YARATISH ===================
 bot = Bot(
     token=BOT_TOKEN,
+    session=TunedAiohttpSession(),
     default=DefaultBotProperties(parse_mode=ParseMode.HTML)
 )
 dp = Dispatcher()
 
+inflight = InflightMiddleware()
+dp.update.outer_middleware(inflight)
+dp.update.outer_middleware(TracingMiddleware())
+# Throttling navbatdan oldin - limitdan oshgan update chat navbatida kutib turmaydi
+dp.update.outer_middleware(ThrottlingMiddleware())
+scheduler = OrderedUpdatesMiddleware()
+dp.update.outer_middleware(scheduler)
+dp.message.middleware(HandlerSpanMiddleware())
+dp.callback_query.middleware(HandlerSpanMiddleware())
+bot.session.middleware(TracingRequestMiddleware())
+
 
 # =================== YORDAMCHI FUNKSIYALAR ===================
+# Baza javob bermaganda snapshotdan berilgan ro'yxat uchun ogohlantirish
+STALE_NOTE = "\n\n⚠️ <i>Baza vaqtincha javob bermayapti - ma'lumotlar eskirgan bo'lishi mumkin</i>"
+DB_UNAVAILABLE_TEXT = (
+    "⚠️ <b>Ma'lumotlar bazasi vaqtincha javob bermayapti.</b>\n\n"
+    "Iltimos, birozdan so'ng qayta urinib ko'ring."
+)
+
+
 def is_allowed_chat(chat_id: int) -> bool:
     """Guruh tekshiruvi - bir nechta guruhlar uchun"""
-    return str(chat_id) in ALLOWED_GROUP_IDS or chat_id > 0
+    return chat_id > 0 or groups.is_allowed(chat_id)
 
 
 def is_allowed_group(chat_id: int) -> bool:
     """Faqat guruhlar uchun tekshirish"""
-    return str(chat_id) in ALLOWED_GROUP_IDS
+    return groups.is_allowed(chat_id)
 
 
 def is_admin(user_id: int) -> bool:
@@ -40,6 +100,16 @@ def is_admin(user_id: int) -> bool:
     return user_id in ADMIN_IDS
 
 
+async def is_chat_admin(user_id: int, chat_id: int) -> bool:
+    """Global admin yoki shu guruh admini (keshdan)"""
+    return await admins.is_chat_admin(bot, user_id, chat_id)
+
+
+async def is_contact_admin_message(message: Message) -> bool:
+    """Matn orqali kontakt qo'shish filtri - faqat adminlar uchun"""
+    return await is_chat_admin(message.from_user.id, message.chat.id)
+
+
 def create_main_menu(is_admin_user: bool = False, is_private: bool = False):
     """Asosiy menyu"""
     buttons = []
@@ -59,17 +129,18 @@ def create_main_menu(is_admin_user: bool = False, is_private: bool = False):
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def create_admin_menu():
-    """Admin menyusi"""
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="➕ Kontakt qo'shish", callback_data="admin:add")],
-            [InlineKeyboardButton(text="🗑️ Kontakt o'chirish", callback_data="admin:delete")],
-            [InlineKeyboardButton(text="👥 Foydalanuvchilar", callback_data="admin:users")],
-            [InlineKeyboardButton(text="📋 Kontaktlar ro'yxati", callback_data="menu:contacts")],
-            [InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back")]
-        ]
-    )
+def create_admin_menu(is_global_admin: bool = False):
+    """Admin menyusi (barcha guruhlar bo'yicha bo'limlar faqat bot adminlariga)"""
+    buttons = [
+        [InlineKeyboardButton(text="➕ Kontakt qo'shish", callback_data="admin:add")],
+        [InlineKeyboardButton(text="🗑️ Kontakt o'chirish", callback_data="admin:delete")],
+        [InlineKeyboardButton(text="📊 Statistika", callback_data="admin:stats")],
+        [InlineKeyboardButton(text="📋 Kontaktlar ro'yxati", callback_data="menu:contacts")],
+        [InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back")]
+    ]
+    if is_global_admin:
+        buttons.insert(2, [InlineKeyboardButton(text="👥 Foydalanuvchilar", callback_data="admin:users")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
 def format_contact_button(service: str, phone: str) -> str:
@@ -143,6 +214,48 @@ def create_whatsapp_url(phone: str) -> str:
         return f"https://wa.me/{cleaned}"
 
 
+def build_trending_screen(group_id: int):
+    """"Hozir mashhur" ekrani (xotiradagi ballardan, bazaga murojaatsiz)"""
+    trending_contacts = trending.get_trending(group_id, 8)
+
+    if not trending_contacts:
+        text = (
+            "📈 <b>Hozircha so'nggi vaqtda bosilgan kontaktlar yo'q.</b>\n\n"
+            "Kontaktlarni bosing, reyting shakllanadi."
+        )
+        keyboard = InlineKeyboardMarkup(
+            inline_keyboard=[
+                [InlineKeyboardButton(text="🔥 Mashhur 8ta", callback_data="menu:top")],
+                [InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back")]
+            ]
+        )
+        return text, keyboard
+
+    buttons = []
+    for i, (service, phone, score) in enumerate(trending_contacts, 1):
+        emoji = ["🥇", "🥈", "🥉", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣"][i - 1]
+        button_text = format_contact_button(service, phone)
+        display_text = f"{emoji} {button_text[2:]}"
+
+        buttons.append([
+            InlineKeyboardButton(
+                text=display_text,
+                callback_data=f"contact:{service}:{phone}"
+            )
+        ])
+
+    buttons.append([
+        InlineKeyboardButton(text="🔥 Mashhur 8ta", callback_data="menu:top"),
+        InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back")
+    ])
+
+    text = (
+        "📈 <b>Hozir mashhur kontaktlar:</b>\n\n"
+        "<i>So'nggi vaqtdagi bosilishlar bo'yicha tartiblangan</i>"
+    )
+    return text, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
 async def setup_bot_commands():
     """Bot command larini sozlash"""
     commands = [
@@ -155,9 +268,9 @@ async def setup_bot_commands():
 
     try:
         await bot.set_my_commands(commands, scope=BotCommandScopeDefault())
-        print("✅ Bot command lar sozlandi")
+        log.info("✅ Bot command lar sozlandi")
     except Exception as e:
-        print(f"⚠️ Command sozlash xatosi: {e}")
+        log.warning(f"⚠️ Command sozlash xatosi: {e}")
 
 
 async def add_menu_to_history(call: CallbackQuery, menu_name: str = None):
@@ -173,10 +286,45 @@ async def add_menu_to_history(call: CallbackQuery, menu_name: str = None):
     db.add_to_menu_history(call.from_user.id, menu_name)
 
 
+def remember_menu_screen(call: CallbackQuery, menu_name: str, text: str,
+                         reply_markup: InlineKeyboardMarkup, group_id: int = None,
+                         with_clicks: bool = False):
+    """Chizilgan ekranni orqaga qaytish uchun tarixda saqlash"""
+    db.save_menu_screen(
+        call.from_user.id,
+        menu_name,
+        call.message.chat.id,
+        text,
+        screens.store_markup(reply_markup),
+        group_id,
+        with_clicks
+    )
+
+
+async def restore_menu_screen(call: CallbackQuery, menu_name: str) -> bool:
+    """Saqlangan ekranni bazaga murojaat qilmasdan qayta ko'rsatish"""
+    screen = db.get_menu_screen(call.from_user.id, menu_name, call.message.chat.id)
+    if screen is None:
+        return False
+
+    text, markup_key = screen
+    reply_markup = screens.get_markup(markup_key)
+    if reply_markup is None:
+        return False
+
+    await screens.edit_screen(call.message, text, reply_markup=reply_markup)
+    await call.answer()
+    metrics.inc("back_restored")
+    return True
+
+
 async def go_back(call: CallbackQuery):
     """Orqaga qaytish"""
     previous_menu = db.get_previous_menu(call.from_user.id)
 
+    if previous_menu is not None and await restore_menu_screen(call, previous_menu):
+        return True
+
     if previous_menu is None:
         await handle_menu(call, "main")
         return True
@@ -213,7 +361,8 @@ async def save_user_data(user, chat, command: str = None):
 
 async def update_user_activity(user_id: int, chat_id: int, command: str = None):
     """Faqat faollikni yangilash"""
-    await db.save_user_activity(user_id, chat_id, command)
+    with tracing.span("activity.update"):
+        await db.save_user_activity(user_id, chat_id, command)
 
 
 # =================== BOT QO'SHILISHINI CHEKLASH ===================
@@ -224,26 +373,32 @@ async def restrict_bot_join(event: ChatMemberUpdated):
     new_status = event.new_chat_member.status
 
     if new_status == ChatMemberStatus.LEFT:
-        print(f"🚪 Bot chatdan chiqdi: {chat.id}")
+        admins.invalidate(chat.id)
+        log.info(f"🚪 Bot chatdan chiqdi: {chat.id}")
         return
 
     if new_status not in (ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR):
         return
 
-    print(f"🤖 Bot qo'shildi: {chat.id} | type={chat.type}")
+    log.info(f"🤖 Bot qo'shildi: {chat.id} | type={chat.type}")
 
     if chat.type == ChatType.CHANNEL:
         await bot.leave_chat(chat.id)
-        print(f"❌ Kanalga qo'shildi, chiqildi.")
+        log.error(f"❌ Kanalga qo'shildi, chiqildi.")
         return
 
     if chat.type in (ChatType.GROUP, ChatType.SUPERGROUP):
         if not is_allowed_group(chat.id):
-            await bot.leave_chat(chat.id)
-            print(f"❌ Ruxsatsiz guruhdan chiqildi: {chat.id}")
-            return
+            # Botni admin qo'shgan bo'lsa - yangi mahalla guruhi sifatida ro'yxatga olamiz
+            if event.from_user and is_admin(event.from_user.id):
+                await groups.add_group(chat.id, chat.title, event.from_user.id)
+                log.info(f"➕ Admin {event.from_user.id} yangi guruhni qo'shdi: {chat.id}")
+            else:
+                await bot.leave_chat(chat.id)
+                log.error(f"❌ Ruxsatsiz guruhdan chiqildi: {chat.id}")
+                return
 
-        print(f"✅ Ruxsat berilgan guruhga qo'shildi: {chat.id}")
+        log.info(f"✅ Ruxsat berilgan guruhga qo'shildi: {chat.id}")
 
         welcome_text = (
             "<b>Assalomu alaykum 😊</b>\n\n"
@@ -269,7 +424,17 @@ async def restrict_bot_join(event: ChatMemberUpdated):
             except:
                 pass
         except Exception as e:
-            print(f"⚠️ Guruhga xabar yuborishda xatolik: {e}")
+            log.warning(f"⚠️ Guruhga xabar yuborishda xatolik: {e}")
+
+
+@dp.chat_member()
+async def track_group_admins(event: ChatMemberUpdated):
+    """Guruh adminlari o'zgarganda keshni yangilash"""
+    admins.apply_member_update(
+        event.chat.id,
+        event.new_chat_member.user.id,
+        event.new_chat_member.status
+    )
 
 
 # =================== START VA YORDAM ===================
@@ -279,7 +444,7 @@ async def cmd_start(message: Message):
     await save_user_data(message.from_user, message.chat, "start")
 
     is_private = message.chat.type == ChatType.PRIVATE
-    is_admin_user = is_admin(message.from_user.id)
+    is_admin_user = await is_chat_admin(message.from_user.id, message.chat.id)
 
     welcome_text = ""
     if is_private:
@@ -405,7 +570,7 @@ async def cmd_myinfo(message: Message):
             f"📝 <b>Chat turi:</b> {chat.type}"
         )
 
-    if is_admin(user.id):
+    if await is_chat_admin(user.id, chat.id):
         response += "\n👤 <b>Admin statusi:</b> ✅ Ha"
 
     if chat.type == ChatType.PRIVATE:
@@ -449,12 +614,13 @@ async def handle_force_start(call: CallbackQuery):
     await call.answer()
     await save_user_data(call.from_user, call.message.chat, "force_start")
 
-    await call.message.edit_text(
+    await screens.edit_screen(
+        call.message,
         "✅ <b>Bot muvaffaqiyatli ishga tushdi!</b>\n\n"
         "📍 <i>Endi barcha funksiyalardan foydalanishingiz mumkin.</i>\n\n"
         "👇 <b>Tugmalardan foydalaning:</b>",
         reply_markup=create_main_menu(
-            is_admin(call.from_user.id),
+            await is_chat_admin(call.from_user.id, call.message.chat.id),
             call.message.chat.type == ChatType.PRIVATE
         )
     )
@@ -462,35 +628,35 @@ async def handle_force_start(call: CallbackQuery):
 
 
 # =================== ALOQA RAQAMLARI ===================
-@dp.message(Command("aloqa", "contact", "kontakt"))
-async def cmd_contacts(message: Message):
-    """Tezkor aloqa raqamlari"""
-    # Shaxsiy chatda bloklash
-    if message.chat.type == ChatType.PRIVATE:
-        await message.answer(
-            "❌ <b>Bu buyruq faqat guruhda ishlatilishi mumkin!</b>\n\n"
-            "ℹ️ Botni guruhga qo'shing va u yerda ishlating.",
-            reply_markup=InlineKeyboardMarkup(
-                inline_keyboard=[
-                    [InlineKeyboardButton(
-                        text="🤖 Botni guruhga qo'shish",
-                        url=f"https://t.me/{BOT_USERNAME.lstrip('@')}?startgroup=true"
-                    )]
-                ]
-            )
-        )
-        return
+# Guruhdagi oxirgi /aloqa ro'yxati: group_id -> (message_id, yuborilgan vaqt, kontaktlar versiyasi)
+# Bir guruhdagi /aloqa'lar OrderedUpdatesMiddleware navbatida ketma-ket bajariladi - keyingisi
+# oldingisi yozgan yozuvni ko'radi, shuning uchun alohida "hozir chizilmoqda" holati kerak emas
+live_directories: Dict[int, Tuple[int, float, int]] = {}
 
-    await update_user_activity(message.from_user.id, message.chat.id, "aloqa")
 
-    if not is_allowed_chat(message.chat.id):
-        return
+def get_live_directory(group_id: int) -> Optional[int]:
+    """Oyna ichidagi va kontaktlari o'zgarmagan oxirgi ro'yxat xabari"""
+    live = live_directories.get(group_id)
+    if live is None:
+        return None
+
+    message_id, sent_at, version = live
+    if time.monotonic() - sent_at >= CONTACTS_COALESCE_WINDOW or version != db.get_group_version(group_id):
+        live_directories.pop(group_id, None)
+        return None
+    return message_id
 
+
+async def send_directory(message: Message):
+    """Kontaktlar ro'yxatini yuborish va ishora qilish uchun eslab qolish"""
     group_id = message.chat.id
+    version = db.get_group_version(group_id)
     contacts = await db.get_contacts(group_id)
+    stale = db.is_contacts_stale(group_id)
 
     if not contacts:
         await message.answer(
+            DB_UNAVAILABLE_TEXT if stale else
             "📭 <b>Hozircha aloqa raqamlari yo'q.</b>\n\n"
             "Admin yangi raqam qo'shishi mumkin:\n"
             "<code>Xizmat nomi | Raqam</code>",
@@ -519,18 +685,75 @@ async def cmd_contacts(message: Message):
 
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
 
-    await message.answer(
+    sent = await message.answer(
         "🚨 <b>Tezkor aloqa xizmatlari:</b>\n\n"
-        f"<i>Jami {len(contacts)} ta kontakt mavjud</i>",
+        f"<i>Jami {len(contacts)} ta kontakt mavjud</i>"
+        + (STALE_NOTE if stale else ""),
         reply_markup=keyboard
     )
+    metrics.inc("directory_renders")
+
+    # Snapshotdan berilgan ro'yxatga ishora qilinmaydi - keyingi so'rov yangisini olsin
+    if stale or CONTACTS_COALESCE_WINDOW <= 0:
+        return
+    live_directories[group_id] = (sent.message_id, time.monotonic(), version)
+
+
+async def point_to_directory(message: Message, directory_id: int) -> bool:
+    """Yangi ro'yxat o'rniga mavjudiga qisqa javob bilan ishora qilish"""
+    try:
+        await bot.send_message(
+            message.chat.id,
+            "☝️ <b>Aloqa raqamlari shu yerda</b>",
+            reply_to_message_id=directory_id
+        )
+    except TelegramBadRequest:
+        # Ro'yxat xabari o'chirilgan
+        live_directories.pop(message.chat.id, None)
+        return False
+
+    metrics.inc("directory_coalesced")
+    return True
+
+
+@dp.message(Command("aloqa", "contact", "kontakt"))
+async def cmd_contacts(message: Message):
+    """Tezkor aloqa raqamlari"""
+    # Shaxsiy chatda bloklash
+    if message.chat.type == ChatType.PRIVATE:
+        await message.answer(
+            "❌ <b>Bu buyruq faqat guruhda ishlatilishi mumkin!</b>\n\n"
+            "ℹ️ Botni guruhga qo'shing va u yerda ishlating.",
+            reply_markup=InlineKeyboardMarkup(
+                inline_keyboard=[
+                    [InlineKeyboardButton(
+                        text="🤖 Botni guruhga qo'shish",
+                        url=f"https://t.me/{BOT_USERNAME.lstrip('@')}?startgroup=true"
+                    )]
+                ]
+            )
+        )
+        return
+
+    await update_user_activity(message.from_user.id, message.chat.id, "aloqa")
+
+    if not is_allowed_chat(message.chat.id):
+        return
+
+    group_id = message.chat.id
     db.add_to_menu_history(message.from_user.id, "contacts")
 
+    directory_id = get_live_directory(group_id)
+    if directory_id is not None and await point_to_directory(message, directory_id):
+        return
+
+    await send_directory(message)
+
 
 # =================== TOP 8 KONTAKTLAR ===================
 @dp.message(Command("top"))
-async def cmd_top_contacts(message: Message):
-    """Eng ko'p bosilgan 8ta kontakt"""
+async def cmd_top_contacts(message: Message, command: CommandObject):
+    """Eng ko'p bosilgan 8ta kontakt (/top hozir - hozir mashhurlari)"""
     # Shaxsiy chatda bloklash
     if message.chat.type == ChatType.PRIVATE:
         await message.answer(
@@ -553,10 +776,18 @@ async def cmd_top_contacts(message: Message):
         return
 
     group_id = message.chat.id
+
+    if command.args and command.args.strip().lower() in ("hozir", "trend", "trending"):
+        text, keyboard = build_trending_screen(group_id)
+        await message.answer(text, reply_markup=keyboard)
+        db.add_to_menu_history(message.from_user.id, "menu:trending")
+        return
+
     top_contacts = await db.get_top_contacts(8, group_id)
 
     if not top_contacts:
         await message.answer(
+            DB_UNAVAILABLE_TEXT if db.is_top_unavailable(group_id) else
             "📊 <b>Hozircha hech qanday kontakt bosilmagan.</b>\n\n"
             "Kontaktlarni bosing, statistika to'planadi.",
             reply_markup=InlineKeyboardMarkup(
@@ -581,6 +812,9 @@ async def cmd_top_contacts(message: Message):
             )
         ])
 
+    buttons.append([
+        InlineKeyboardButton(text="📈 Hozir mashhur", callback_data="menu:trending")
+    ])
     buttons.append([
         InlineKeyboardButton(text="📞 Barcha kontaktlar", callback_data="menu:contacts"),
         InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back")
@@ -618,7 +852,7 @@ async def cmd_add_contact(message: Message, command: CommandObject):
 
     await update_user_activity(message.from_user.id, message.chat.id, "add")
 
-    if not is_allowed_chat(message.chat.id) or not is_admin(message.from_user.id):
+    if not is_allowed_chat(message.chat.id) or not await is_chat_admin(message.from_user.id, message.chat.id):
         return
 
     if not command.args:
@@ -684,6 +918,8 @@ async def cmd_add_contact(message: Message, command: CommandObject):
 
         group_id = message.chat.id
         success = await db.update_contact(service, phone, group_id)
+        if success:
+            trending.update_phone(group_id, service, phone)
 
         if success:
             await message.answer(
@@ -710,7 +946,7 @@ async def cmd_add_contact(message: Message, command: CommandObject):
             )
 
     except Exception as e:
-        print(f"❌ Saqlash xatosi: {e}")
+        log.error(f"❌ Saqlash xatosi: {e}")
         await message.answer(
             f"❌ <b>Xatolik:</b> {str(e)}\n\n"
             "<i>Iltimos, formatni tekshiring va qayta urinib ko'ring.</i>",
@@ -723,7 +959,7 @@ async def cmd_add_contact(message: Message, command: CommandObject):
 
 
 # =================== MATN ORQALI KONTAKT QO'SHISH ===================
-@dp.message(F.text.contains(" | "), F.from_user.id.in_(ADMIN_IDS))
+@dp.message(F.text.contains(" | "), is_contact_admin_message)
 async def handle_contact_text(message: Message):
     """Admin tomonidan matn orqali kontakt qo'shish"""
     # Shaxsiy chatda bloklash
@@ -782,6 +1018,8 @@ async def handle_contact_text(message: Message):
 
         group_id = message.chat.id
         success = await db.update_contact(service, phone, group_id)
+        if success:
+            trending.update_phone(group_id, service, phone)
 
         if success:
             await message.answer(
@@ -808,7 +1046,7 @@ async def handle_contact_text(message: Message):
             )
 
     except Exception as e:
-        print(f"❌ Saqlash xatosi: {e}")
+        log.error(f"❌ Saqlash xatosi: {e}")
         await message.answer(
             f"❌ <b>Xatolik:</b> {str(e)}\n\n"
             "<i>Iltimos, formatni tekshiring va qayta urinib ko'ring.</i>",
@@ -841,7 +1079,7 @@ async def cmd_delete_contact(message: Message, command: CommandObject):
 
     await update_user_activity(message.from_user.id, message.chat.id, "delete")
 
-    if not is_allowed_chat(message.chat.id) or not is_admin(message.from_user.id):
+    if not is_allowed_chat(message.chat.id) or not await is_chat_admin(message.from_user.id, message.chat.id):
         return
 
     group_id = message.chat.id
@@ -885,6 +1123,8 @@ async def cmd_delete_contact(message: Message, command: CommandObject):
     try:
         service = command.args.strip()
         success = await db.delete_contact(service, group_id)
+        if success:
+            trending.remove_contact(group_id, service)
 
         if success:
             await message.answer(
@@ -917,6 +1157,140 @@ async def cmd_delete_contact(message: Message, command: CommandObject):
         )
 
 
+@dp.message(Command("xabar", "broadcast"))
+async def cmd_broadcast(message: Message, command: CommandObject):
+    """Start bosgan barcha foydalanuvchilarga ommaviy xabar yuborish"""
+    if not is_admin(message.from_user.id):
+        return
+
+    if message.chat.type != ChatType.PRIVATE:
+        await message.answer(
+            "❌ <b>Ommaviy xabar faqat shaxsiy chatda yuboriladi!</b>",
+            reply_to_message_id=message.message_id
+        )
+        return
+
+    await update_user_activity(message.from_user.id, message.chat.id, "broadcast")
+
+    if not command.args:
+        await message.answer(
+            "📢 <b>Ommaviy xabar formati:</b>\n"
+            "<code>/xabar Matn</code>\n\n"
+            "📌 <b>MISOL:</b>\n"
+            "<code>/xabar Ertaga 10:00 dan 14:00 gacha suv bo'lmaydi</code>\n\n"
+            "<i>Xabar botga start bergan barcha foydalanuvchilarga yuboriladi.</i>"
+        )
+        return
+
+    # Komanda o'rniga HTML ko'rinishdagi matn: adminning formatlashi saqlanadi, "<" va "&" esa ekranlanadi
+    text = message.html_text.split(maxsplit=1)[1].strip()
+
+    broadcast_id = await broadcast.start_broadcast(
+        bot,
+        text,
+        message.from_user.id,
+        message.chat.id
+    )
+    if broadcast_id is not None:
+        log.info(f"📢 Ommaviy xabar #{broadcast_id} admin {message.from_user.id} tomonidan boshlandi")
+
+
+@dp.message(Command("metrics", "metrika"))
+async def cmd_metrics(message: Message):
+    """Ichki hisoblagichlarni ko'rsatish (faqat admin)"""
+    if not is_admin(message.from_user.id):
+        return
+
+    await message.answer(metrics.format_metrics())
+
+
+# =================== GURUHLARNI BOSHQARISH ===================
+@dp.message(Command("guruh_qoshish", "addgroup"))
+async def cmd_add_group(message: Message, command: CommandObject):
+    """Guruhni ruxsat berilganlar ro'yxatiga qo'shish (faqat admin)"""
+    if not is_admin(message.from_user.id):
+        return
+
+    if command.args:
+        try:
+            group_id = int(command.args.strip())
+        except ValueError:
+            await message.answer("❌ Guruh ID raqam bo'lishi kerak!\n\n<code>/guruh_qoshish -1001234567890</code>")
+            return
+        title = None
+    elif message.chat.type in (ChatType.GROUP, ChatType.SUPERGROUP):
+        group_id = message.chat.id
+        title = message.chat.title
+    else:
+        await message.answer(
+            "📝 <b>Guruh qo'shish:</b>\n\n"
+            "• Guruhning o'zida: <code>/guruh_qoshish</code>\n"
+            "• Shaxsiy chatda: <code>/guruh_qoshish -1001234567890</code>"
+        )
+        return
+
+    if group_id > 0:
+        await message.answer("❌ Guruh ID manfiy son bo'lishi kerak!")
+        return
+
+    if await groups.add_group(group_id, title, message.from_user.id):
+        await message.answer(f"✅ Guruh qo'shildi: <code>{group_id}</code>")
+    else:
+        await message.answer("❌ <b>Guruh qo'shishda xatolik!</b>")
+
+
+@dp.message(Command("guruh_ochirish", "removegroup"))
+async def cmd_remove_group(message: Message, command: CommandObject):
+    """Guruhni ruxsat berilganlar ro'yxatidan olib tashlash (faqat admin)"""
+    if not is_admin(message.from_user.id):
+        return
+
+    if command.args:
+        try:
+            group_id = int(command.args.strip())
+        except ValueError:
+            await message.answer("❌ Guruh ID raqam bo'lishi kerak!\n\n<code>/guruh_ochirish -1001234567890</code>")
+            return
+    elif message.chat.type in (ChatType.GROUP, ChatType.SUPERGROUP):
+        group_id = message.chat.id
+    else:
+        await message.answer(
+            "📝 <b>Guruh o'chirish:</b>\n\n"
+            "• Guruhning o'zida: <code>/guruh_ochirish</code>\n"
+            "• Shaxsiy chatda: <code>/guruh_ochirish -1001234567890</code>"
+        )
+        return
+
+    if await groups.remove_group(group_id):
+        await message.answer(f"✅ Guruh ro'yxatdan olib tashlandi: <code>{group_id}</code>")
+    else:
+        await message.answer("❌ Guruh topilmadi yoki o'chirishda xatolik!")
+
+
+@dp.message(Command("guruhlar", "groups"))
+async def cmd_list_groups(message: Message):
+    """Ruxsat berilgan guruhlar ro'yxati (faqat admin)"""
+    if not is_admin(message.from_user.id):
+        return
+
+    group_list = await db.get_groups()
+    if not group_list:
+        await message.answer("📭 Hozircha ruxsat berilgan guruhlar yo'q.")
+        return
+
+    lines = []
+    for i, group in enumerate(group_list[:50], 1):
+        title = group.get("title") or "Nomsiz"
+        lines.append(f"{i}. <b>{title}</b>\n   ID: <code>{group['group_id']}</code>")
+
+    response = f"👥 <b>RUXSAT BERILGAN GURUHLAR</b>\n\nJami: {len(group_list)} ta guruh\n\n"
+    if len(group_list) > 50:
+        response += "<i>Faqat birinchi 50 ta guruh ko'rsatilmoqda</i>\n\n"
+    response += "\n\n".join(lines)
+
+    await message.answer(response)
+
+
 # =================== MENU HANDLERLARI ===================
 @dp.callback_query(F.data.startswith("menu:"))
 async def handle_menu_callback(call: CallbackQuery):
@@ -934,18 +1308,21 @@ async def handle_menu_callback(call: CallbackQuery):
 async def handle_menu(call: CallbackQuery, menu_option: str):
     """Menyuni boshqarish"""
     user_id = call.from_user.id
-    is_admin_user = is_admin(user_id)
+    is_admin_user = await is_chat_admin(user_id, call.message.chat.id)
     is_private = call.message.chat.type == ChatType.PRIVATE
 
     await add_menu_to_history(call, f"menu:{menu_option}")
 
     if menu_option == "main":
-        await call.message.edit_text(
+        text = (
             "🤖 <b>Mahalla Tezkor Aloqa Boti</b>\n\n"
             "📍 <i>Mahalla uchun kerakli barcha aloqa raqamlari endi bir joyda!</i>\n\n"
-            "👇 Pastdagi tugmalardan foydalaning:",
-            reply_markup=create_main_menu(is_admin_user, is_private)
+            "👇 Pastdagi tugmalardan foydalaning:"
         )
+        keyboard = create_main_menu(is_admin_user, is_private)
+
+        await screens.edit_screen(call.message, text, reply_markup=keyboard)
+        remember_menu_screen(call, "menu:main", text, keyboard)
 
     elif menu_option == "contacts":
         # Shaxsiy chatda bloklash
@@ -959,18 +1336,23 @@ async def handle_menu(call: CallbackQuery, menu_option: str):
 
         group_id = call.message.chat.id
         contacts = await db.get_contacts(group_id)
+        stale = db.is_contacts_stale(group_id)
 
         if not contacts:
-            await call.message.edit_text(
+            text = DB_UNAVAILABLE_TEXT if stale else (
                 "📭 <b>Hozircha aloqa raqamlari yo'q.</b>\n\n"
                 "Admin yangi raqam qo'shishi mumkin:\n"
-                "<code>Xizmat nomi | Raqam</code>",
-                reply_markup=InlineKeyboardMarkup(
-                    inline_keyboard=[
-                        [InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back")]
-                    ]
-                )
+                "<code>Xizmat nomi | Raqam</code>"
+            )
+            keyboard = InlineKeyboardMarkup(
+                inline_keyboard=[
+                    [InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back")]
+                ]
             )
+
+            await screens.edit_screen(call.message, text, reply_markup=keyboard)
+            if not stale:
+                remember_menu_screen(call, "menu:contacts", text, keyboard, group_id)
             await call.answer()
             return
 
@@ -990,13 +1372,17 @@ async def handle_menu(call: CallbackQuery, menu_option: str):
         ])
 
         keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
-
-        await call.message.edit_text(
+        text = (
             "🚨 <b>Tezkor aloqa xizmatlari:</b>\n\n"
-            f"<i>Jami {len(contacts)} ta kontakt mavjud</i>",
-            reply_markup=keyboard
+            f"<i>Jami {len(contacts)} ta kontakt mavjud</i>"
         )
 
+        if stale:
+            await screens.edit_screen(call.message, text + STALE_NOTE, reply_markup=keyboard)
+        else:
+            await screens.edit_screen(call.message, text, reply_markup=keyboard)
+            remember_menu_screen(call, "menu:contacts", text, keyboard, group_id)
+
     elif menu_option == "top":
         # Shaxsiy chatda bloklash
         if call.message.chat.type == ChatType.PRIVATE:
@@ -1009,18 +1395,24 @@ async def handle_menu(call: CallbackQuery, menu_option: str):
 
         group_id = call.message.chat.id
         top_contacts = await db.get_top_contacts(8, group_id)
+        unavailable = db.is_top_unavailable(group_id)
 
         if not top_contacts:
-            await call.message.edit_text(
+            text = DB_UNAVAILABLE_TEXT if unavailable else (
                 "📊 <b>Hozircha hech qanday kontakt bosilmagan.</b>\n\n"
-                "Kontaktlarni bosing, statistika to'planadi.",
-                reply_markup=InlineKeyboardMarkup(
-                    inline_keyboard=[
-                        [InlineKeyboardButton(text="📞 Kontaktlar ro'yxati", callback_data="menu:contacts")],
-                        [InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back")]
-                    ]
-                )
+                "Kontaktlarni bosing, statistika to'planadi."
+            )
+            keyboard = InlineKeyboardMarkup(
+                inline_keyboard=[
+                    [InlineKeyboardButton(text="📞 Kontaktlar ro'yxati", callback_data="menu:contacts")],
+                    [InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back")]
+                ]
             )
+
+            await screens.edit_screen(call.message, text, reply_markup=keyboard)
+            # Baza xatosidagi bo'sh ekran orqaga qaytish uchun saqlanmaydi
+            if not unavailable:
+                remember_menu_screen(call, "menu:top", text, keyboard, group_id, with_clicks=True)
             await call.answer()
             return
 
@@ -1037,19 +1429,36 @@ async def handle_menu(call: CallbackQuery, menu_option: str):
                 )
             ])
 
+        buttons.append([
+            InlineKeyboardButton(text="📈 Hozir mashhur", callback_data="menu:trending")
+        ])
         buttons.append([
             InlineKeyboardButton(text="📞 Barcha kontaktlar", callback_data="menu:contacts"),
             InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back")
         ])
 
         keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
-
-        await call.message.edit_text(
+        text = (
             "🔥 <b>Eng ko'p qidirilgan 8ta kontakt:</b>\n\n"
-            "<i>Kontaktlar bosilish soni bo'yicha tartiblangan</i>",
-            reply_markup=keyboard
+            "<i>Kontaktlar bosilish soni bo'yicha tartiblangan</i>"
         )
 
+        await screens.edit_screen(call.message, text, reply_markup=keyboard)
+        remember_menu_screen(call, "menu:top", text, keyboard, group_id, with_clicks=True)
+
+    elif menu_option == "trending":
+        # Shaxsiy chatda bloklash
+        if call.message.chat.type == ChatType.PRIVATE:
+            await call.answer(
+                f"❌ Bu funksiya faqat guruhda ishlaydi!\n\n"
+                f"ℹ️ Botni guruhga qo'shing: @{BOT_USERNAME.lstrip('@')}",
+                show_alert=True
+            )
+            return
+
+        text, keyboard = build_trending_screen(call.message.chat.id)
+        await screens.edit_screen(call.message, text, reply_markup=keyboard)
+
     elif menu_option == "about":
         dev_clean = DEV_USERNAME.lstrip('@')
         bot_clean = BOT_USERNAME.lstrip('@')
@@ -1078,7 +1487,8 @@ async def handle_menu(call: CallbackQuery, menu_option: str):
 
         keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
 
-        await call.message.edit_text(about_text, reply_markup=keyboard)
+        await screens.edit_screen(call.message, about_text, reply_markup=keyboard)
+        remember_menu_screen(call, "menu:about", about_text, keyboard)
 
     elif menu_option == "myinfo":
         user = call.from_user
@@ -1133,7 +1543,8 @@ async def handle_menu(call: CallbackQuery, menu_option: str):
             full_response += f"👤 <b>Admin statusi:</b> ✅ Ha"
 
         if chat.type == ChatType.PRIVATE:
-            await call.message.edit_text(
+            await screens.edit_screen(
+                call.message,
                 full_response,
                 reply_markup=InlineKeyboardMarkup(
                     inline_keyboard=[
@@ -1169,15 +1580,19 @@ async def handle_menu(call: CallbackQuery, menu_option: str):
             await call.answer("❌ Siz admin emassiz", show_alert=True)
             return
 
-        await call.message.edit_text(
+        text = (
             "👤 <b>Admin panel</b>\n\n"
             "📋 <b>Admin funksiyalari:</b>\n\n"
             "• Kontakt qo'shish / o'chirish\n"
-            "• Foydalanuvchilar ro'yxati\n"
+            + ("• Foydalanuvchilar ro'yxati\n" if is_admin(user_id) else "")
+            + "• Kontaktlar statistikasi\n"
             "• Kontaktlar ro'yxati\n\n"
-            "👇 <b>Tugmalardan foydalaning:</b>",
-            reply_markup=create_admin_menu()
+            "👇 <b>Tugmalardan foydalaning:</b>"
         )
+        keyboard = create_admin_menu(is_admin(user_id))
+
+        await screens.edit_screen(call.message, text, reply_markup=keyboard)
+        remember_menu_screen(call, "menu:admin", text, keyboard)
 
     await call.answer()
 
@@ -1188,39 +1603,55 @@ async def handle_admin_callback(call: CallbackQuery):
     """Admin harakatlari"""
     await update_user_activity(call.from_user.id, call.message.chat.id, call.data)
 
-    if not is_allowed_chat(call.message.chat.id) or not is_admin(call.from_user.id):
-        await call.answer("❌ Admin emassiz", show_alert=True)
-        return
-
     action = call.data.split(":", 1)[1]
     await handle_admin_actions(call, action)
 
 
+# Barcha mahallalar ma'lumotini ko'rsatadigan amallar - faqat bot adminlari (ADMIN_IDS) uchun
+GLOBAL_ADMIN_ACTIONS = {"users"}
+
+
+async def can_run_admin_action(call: CallbackQuery, action: str) -> bool:
+    """Guruh amallari - shu guruh adminiga, umumiy amallar - faqat bot adminiga"""
+    if action in GLOBAL_ADMIN_ACTIONS:
+        return is_admin(call.from_user.id)
+    return is_allowed_chat(call.message.chat.id) and await is_chat_admin(call.from_user.id, call.message.chat.id)
+
+
 async def handle_admin_actions(call: CallbackQuery, action: str):
     """Admin harakatlarini boshqarish"""
+    # "Orqaga" ham shu yerga keladi - ruxsat har safar tekshiriladi
+    if not await can_run_admin_action(call, action):
+        await call.answer("❌ Admin emassiz", show_alert=True)
+        return
+
     await add_menu_to_history(call, f"admin:{action}")
 
     if action == "add":
-        await call.message.edit_text(
+        text = (
             "📝 <b>Kontakt qo'shish formati:</b>\n"
             "<code>Ism | Raqam</code>\n\n"
             "📌 <b>TO'G'RI MISOLLAR:</b>\n"
             "<code>Tez yordam | 103</code>\n"
             "<code>Elektrik usta | +998901234567</code>\n"
             "<code>Elektrik usta | 998901234567</code>\n"
-            "<code>Elektrik usta | 901234567</code>\n",
-            reply_markup=InlineKeyboardMarkup(
-                inline_keyboard=[
-                    [InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back")]
-                ]
-            )
+            "<code>Elektrik usta | 901234567</code>\n"
+        )
+        keyboard = InlineKeyboardMarkup(
+            inline_keyboard=[
+                [InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back")]
+            ]
         )
 
+        await screens.edit_screen(call.message, text, reply_markup=keyboard)
+        remember_menu_screen(call, "admin:add", text, keyboard)
+
     elif action == "delete":
         group_id = call.message.chat.id
         contacts = await db.get_contacts_with_clicks(group_id)
         if not contacts:
-            await call.message.edit_text(
+            await screens.edit_screen(
+                call.message,
                 "📭 O'chirish uchun kontaktlar yo'q.",
                 reply_markup=InlineKeyboardMarkup(
                     inline_keyboard=[
@@ -1248,17 +1679,50 @@ async def handle_admin_actions(call: CallbackQuery, action: str):
         ])
 
         keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+        text = "🗑️ <b>O'chirish uchun kontaktni tanlang:</b>"
 
-        await call.message.edit_text(
-            "🗑️ <b>O'chirish uchun kontaktni tanlang:</b>",
-            reply_markup=keyboard
+        await screens.edit_screen(call.message, text, reply_markup=keyboard)
+        remember_menu_screen(call, "admin:delete", text, keyboard, group_id)
+
+    elif action == "stats":
+        group_id = call.message.chat.id
+        today_top = await db.get_top_contacts(8, group_id, days=0)
+        today_unavailable = db.is_top_unavailable(group_id)
+        weekly_top = await db.get_top_contacts(8, group_id, days=7)
+        weekly_unavailable = db.is_top_unavailable(group_id)
+
+        def format_top(rows, unavailable):
+            if unavailable:
+                return "<i>⚠️ Baza javob bermayapti - keyinroq urinib ko'ring</i>"
+            if not rows:
+                return "<i>Hozircha bosilmagan</i>"
+            return "\n".join(
+                f"{i}. {service} — <b>{click_count}</b>"
+                for i, (service, phone, click_count) in enumerate(rows, 1)
+            )
+
+        text = (
+            "📊 <b>KONTAKTLAR STATISTIKASI</b>\n\n"
+            f"📅 <b>Bugun:</b>\n{format_top(today_top, today_unavailable)}\n\n"
+            f"🗓️ <b>Oxirgi 7 kun:</b>\n{format_top(weekly_top, weekly_unavailable)}"
+        )
+        keyboard = InlineKeyboardMarkup(
+            inline_keyboard=[
+                [InlineKeyboardButton(text="🔄 Yangilash", callback_data="admin:stats")],
+                [InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back")]
+            ]
         )
 
+        await screens.edit_screen(call.message, text, reply_markup=keyboard)
+        if not (today_unavailable or weekly_unavailable):
+            remember_menu_screen(call, "admin:stats", text, keyboard, group_id, with_clicks=True)
+
     elif action == "users":
         users = await db.get_all_users(50)
 
         if not users:
-            await call.message.edit_text(
+            await screens.edit_screen(
+                call.message,
                 "📭 Hozircha foydalanuvchilar yo'q.",
                 reply_markup=InlineKeyboardMarkup(
                     inline_keyboard=[
@@ -1299,7 +1763,8 @@ async def handle_admin_actions(call: CallbackQuery, action: str):
 
         response += "\n\n".join(user_list)
 
-        await call.message.edit_text(
+        await screens.edit_screen(
+            call.message,
             response,
             reply_markup=InlineKeyboardMarkup(
                 inline_keyboard=[
@@ -1330,49 +1795,59 @@ async def show_contact_details(call: CallbackQuery):
             return
 
         service = data_parts[1]
-        phone = data_parts[2]
-
         group_id = call.message.chat.id
-        await db.increment_click_count(service, group_id)
 
-        whatsapp_url = create_whatsapp_url(phone)
+        # callback_data ni mijoz o'zgartirishi mumkin - faqat guruhda mavjud kontakt va
+        # bazadagi raqam ishlatiladi (soxta raqam reytingga tushmasligi uchun)
+        phone = dict(await db.get_contacts(group_id)).get(service)
+        if phone is None:
+            metrics.inc("contact_click_unknown")
+            await call.answer("❌ Kontakt topilmadi", show_alert=True)
+            return
+
+        with tracing.span("click.increment"):
+            await db.increment_click_count(service, group_id)
+            trending.record_click(group_id, service, phone)
+
+        with tracing.span("render"):
+            whatsapp_url = create_whatsapp_url(phone)
 
-        buttons = [
-            [
-                InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back"),
-                InlineKeyboardButton(text="📞 Boshqa kontaktlar", callback_data="menu:contacts")
+            buttons = [
+                [
+                    InlineKeyboardButton(text="⬅️ Orqaga", callback_data="back"),
+                    InlineKeyboardButton(text="📞 Boshqa kontaktlar", callback_data="menu:contacts")
+                ]
             ]
-        ]
 
-        cleaned = ''.join(c for c in phone if c.isdigit() or c == '+')
-        is_long_uzbek = (cleaned.startswith("+998") and len(cleaned) == 13) or \
-                        (cleaned.startswith("998") and len(cleaned) == 12) or \
-                        (cleaned.isdigit() and len(cleaned) == 9) or \
-                        (cleaned.isdigit() and len(cleaned) == 12)
+            cleaned = ''.join(c for c in phone if c.isdigit() or c == '+')
+            is_long_uzbek = (cleaned.startswith("+998") and len(cleaned) == 13) or \
+                            (cleaned.startswith("998") and len(cleaned) == 12) or \
+                            (cleaned.isdigit() and len(cleaned) == 9) or \
+                            (cleaned.isdigit() and len(cleaned) == 12)
 
-        if is_long_uzbek:
-            buttons.insert(0, [
-                InlineKeyboardButton(text="💬 WhatsApp ga yozish", url=whatsapp_url)
-            ])
+            if is_long_uzbek:
+                buttons.insert(0, [
+                    InlineKeyboardButton(text="💬 WhatsApp ga yozish", url=whatsapp_url)
+                ])
 
-        keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+            keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
 
-        response = (
-            f"👤 <b>{service}</b>\n\n"
-            f"📞 <b>Telefon raqami:</b>\n"
-            f"<a href='tel:{phone}'>{phone}</a>\n\n"
-        )
+            response = (
+                f"👤 <b>{service}</b>\n\n"
+                f"📞 <b>Telefon raqami:</b>\n"
+                f"<a href='tel:{phone}'>{phone}</a>\n\n"
+            )
 
-        if is_long_uzbek:
-            response += "<i>📱 Raqamga qo'ng'iroq qilish yoki nusxalash uchun ustiga bosing va tanlang.</i>"
+            if is_long_uzbek:
+                response += "<i>📱 Raqamga qo'ng'iroq qilish yoki nusxalash uchun ustiga bosing va tanlang.</i>"
 
-        await call.message.edit_text(response, reply_markup=keyboard)
+        await screens.edit_screen(call.message, response, reply_markup=keyboard)
         await call.answer()
 
         await add_menu_to_history(call, f"contact:{service}")
 
     except Exception as e:
-        print(f"❌ Kontakt ko'rsatish xatosi: {e}")
+        log.error(f"❌ Kontakt ko'rsatish xatosi: {e}")
         await call.answer("❌ Xatolik yuz berdi", show_alert=True)
 
 
@@ -1382,7 +1857,7 @@ async def handle_delete(call: CallbackQuery):
     """Kontaktni o'chirish"""
     await update_user_activity(call.from_user.id, call.message.chat.id, "delete_contact")
 
-    if not is_allowed_chat(call.message.chat.id) or not is_admin(call.from_user.id):
+    if not is_allowed_chat(call.message.chat.id) or not await is_chat_admin(call.from_user.id, call.message.chat.id):
         await call.answer("❌ Ruxsat yo'q", show_alert=True)
         return
 
@@ -1393,7 +1868,9 @@ async def handle_delete(call: CallbackQuery):
         success = await db.delete_contact(service, group_id)
 
         if success:
-            await call.message.edit_text(
+            trending.remove_contact(group_id, service)
+            await screens.edit_screen(
+                call.message,
                 f"✅ <b>Kontakt o'chirildi:</b>\n\n"
                 f"<i>Boshqa kontaktlarni ko'rish uchun /aloqa buyrug'idan foydalaning.</i>",
                 reply_markup=InlineKeyboardMarkup(
@@ -1451,11 +1928,12 @@ async def debug_handler(message: Message):
 
     await update_user_activity(message.from_user.id, message.chat.id, "unknown_command")
 
-    print(f"🔴 ISHLANMAGAN BUYRUQ: '{message.text}'")
-    print(f"   👤 User: {message.from_user.id}")
-    print(f"   💬 Chat: {message.chat.id}")
+    log.debug(
+        "🔴 Ishlanmagan buyruq",
+        extra={"text": message.text, "user_id": message.from_user.id, "chat_id": message.chat.id}
+    )
 
-    is_admin_user = is_admin(message.from_user.id)
+    is_admin_user = await is_chat_admin(message.from_user.id, message.chat.id)
     is_private = message.chat.type == ChatType.PRIVATE
 
     commands_list = [
@@ -1468,6 +1946,7 @@ async def debug_handler(message: Message):
         commands_list.extend([
             "• /aloqa - Tezkor aloqa raqamlari",
             "• /top - Mashhur 8ta kontakt",
+            "• /top hozir - Hozir mashhur kontaktlar",
         ])
 
     if is_admin_user and not is_private:
@@ -1489,30 +1968,86 @@ async def debug_handler(message: Message):
 # =================== ASOSIY FUNKSIYA ===================
 async def main():
     """Asosiy bot funksiyasi"""
-    print("=" * 60)
-    print("🤖 MAHALLA ALOQA BOTI ISHGA TUSHMOGDA...")
-    print("=" * 60)
+    started = time.perf_counter()
+    logger.setup(LOG_LEVEL, logger.parse_levels(LOG_LEVELS), LOG_RATE_LIMIT, LOG_RATE_WINDOW, LOG_QUEUE_SIZE)
+    log.info("🤖 MAHALLA ALOQA BOTI ISHGA TUSHMOGDA...")
 
     print_config()
-    print("=" * 60)
 
-    print("🔄 PostgreSQL database ulanmoqda...")
+    snapshot.load()
+    journal.init()
+
+    log.info("🔄 PostgreSQL database ulanmoqda...")
     db_ok = await db.init_db()
     if not db_ok:
-        print("❌ Database bilan muammo! Bot ishlamaydi.")
+        log.error("❌ Database bilan muammo! Bot ishlamaydi.")
+        logger.shutdown()
         return
+    db.start_pool_manager()
+    await groups.load()
+    db.start_rollup_job()
+    db.start_flusher()
+    journal.start(db.apply_journal_segment)
+    tracing.start_exporter()
+    await trending.load()
+    trending.start_persister()
+    db.start_cache_sync()
+    scheduler.start_lag_monitor()
+    db.start_listener()
+
+    if WARMUP_ON_START:
+        await warm_up()
 
     await setup_bot_commands()
+    await broadcast.resume_broadcasts(bot)
 
-    print("✅ Bot tayyor!")
-    print("=" * 60)
+    log.info(f"⏱️ Ishga tushish vaqti: {(time.perf_counter() - started) * 1000:.0f} ms")
+    log.info("✅ Bot tayyor!")
 
     try:
-        await dp.start_polling(bot, skip_updates=True)
+        await dp.start_polling(bot, skip_updates=True, close_bot_session=False)
     except Exception as e:
-        print(f"❌ Bot xatosi: {e}")
+        log.error(f"❌ Bot xatosi: {e}")
     finally:
-        await db.close_db()
+        await shutdown()
+
+
+async def warm_up():
+    """Polling boshlanishidan oldin keshlarni to'ldirish, vaqt va xotirani ko'rsatish"""
+    tracemalloc.start()
+    started = time.perf_counter()
+
+    stats = await db.warm_caches(sorted(groups.allowed_group_ids))
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    log.info(
+        f"🔥 Keshlar isitildi: {stats['groups']} ta guruh, {stats['contacts']} ta kontakt, "
+        f"{stats['top']} ta reyting qatori, {stats['users']} ta foydalanuvchi "
+        f"({elapsed_ms:.0f} ms, {current / 1024 / 1024:.1f} MB, eng ko'pi {peak / 1024 / 1024:.1f} MB)"
+    )
+
+
+async def shutdown():
+    """Tartibli to'xtash: handlerlarni kutish, buferlarni yozish, ulanishlarni yopish"""
+    log.info("🛑 Bot to'xtatilmoqda...")
+
+    cancelled = await inflight.drain(SHUTDOWN_TIMEOUT)
+    if cancelled:
+        log.warning(f"⚠️ {cancelled} ta handler {SHUTDOWN_TIMEOUT:.0f} sekundda tugamadi va bekor qilindi")
+
+    await broadcast.stop_broadcasts()
+    await scheduler.stop_lag_monitor()
+    await db.stop_flusher()
+    await trending.stop_persister()
+    await snapshot.flush()
+    await journal.stop()
+    await tracing.stop_exporter()
+    await db.close_db()
+    await bot.session.close()
+    log.info("✅ Bot to'xtatildi.")
+    logger.shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,229 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter
+)
+
+from config import BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_PAGE_SIZE
+import db
+import logger
+
+log = logger.get_logger("broadcast")
+
+# Ishlayotgan ommaviy xabarlar: broadcast_id -> task
+running_broadcasts: Dict[int, asyncio.Task] = {}
+# To'xtash so'ralgan - joriy bo'lak yuborib, saqlab chiqiladi
+_stopping = False
+
+PROGRESS_INTERVAL = 3.0  # holat xabarini yangilash oralig'i (sekund)
+MAX_ATTEMPTS = 3
+STOP_TIMEOUT = 5.0  # joriy bo'lakni tugatishni kutish (sekund)
+
+
+class RateLimiter:
+    """Sekundiga belgilangan sondan ko'p xabar yubormaslik"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        """Navbatdagi yuborish vaqtini kutish"""
+        async with self._lock:
+            now = time.monotonic()
+            if self._next_at > now:
+                await asyncio.sleep(self._next_at - now)
+                now = self._next_at
+            self._next_at = now + self.interval
+
+    def pause(self, seconds: float):
+        """Telegram cheklovi (retry_after) bo'yicha barcha yuborishlarni to'xtatib turish"""
+        self._next_at = max(self._next_at, time.monotonic() + seconds)
+
+
+async def send_one(bot: Bot, limiter: RateLimiter, user_id: int, text: str) -> str:
+    """Bitta foydalanuvchiga yuborish: 'sent', 'blocked' yoki 'failed'"""
+    for _ in range(MAX_ATTEMPTS):
+        await limiter.wait()
+        try:
+            await bot.send_message(user_id, text)
+            return "sent"
+        except TelegramRetryAfter as e:
+            limiter.pause(e.retry_after)
+        except TelegramForbiddenError:
+            return "blocked"
+        except TelegramBadRequest:
+            return "failed"
+        except TelegramAPIError:
+            await asyncio.sleep(1)
+        except Exception as e:
+            log.warning(f"⚠️ Ommaviy xabar yuborish xatosi ({user_id}): {e}")
+            await asyncio.sleep(1)
+    return "failed"
+
+
+def format_progress(broadcast: dict, finished: bool = False) -> str:
+    """Admin uchun holat matni"""
+    total = broadcast.get("total_count") or 0
+    sent = broadcast["sent_count"]
+    failed = broadcast["failed_count"]
+    blocked = broadcast["blocked_count"]
+    done = sent + failed + blocked
+
+    title = "✅ <b>Ommaviy xabar yuborildi!</b>" if finished else "📢 <b>Ommaviy xabar yuborilmoqda...</b>"
+    return (
+        f"{title}\n\n"
+        f"📊 <b>Jarayon:</b> {done}/{total}\n"
+        f"✅ <b>Yuborildi:</b> {sent}\n"
+        f"🚫 <b>Bloklagan:</b> {blocked}\n"
+        f"❌ <b>Xatolik:</b> {failed}"
+    )
+
+
+async def update_progress_message(bot: Bot, broadcast: dict, finished: bool = False):
+    """Admin chatidagi holat xabarini yangilash"""
+    if not broadcast.get("progress_chat_id") or not broadcast.get("progress_message_id"):
+        return
+
+    try:
+        await bot.edit_message_text(
+            format_progress(broadcast, finished),
+            chat_id=broadcast["progress_chat_id"],
+            message_id=broadcast["progress_message_id"]
+        )
+    except TelegramAPIError:
+        pass
+
+
+async def run_broadcast(bot: Bot, broadcast: dict):
+    """Ommaviy xabarni oxirgi saqlangan joydan davom ettirish"""
+    broadcast_id = broadcast["id"]
+    limiter = RateLimiter(BROADCAST_RATE)
+    last_progress_at = 0.0
+
+    log.info(f"📢 Ommaviy xabar #{broadcast_id} boshlandi (oxirgi: {broadcast['last_user_id']})")
+
+    try:
+        while True:
+            user_ids = await db.get_broadcast_recipients(broadcast["last_user_id"], BROADCAST_PAGE_SIZE)
+
+            if user_ids is None:
+                # Database vaqtincha ishlamayapti - keyinroq davom ettiramiz
+                await asyncio.sleep(5)
+                continue
+
+            if not user_ids:
+                break
+
+            # Sahifa BROADCAST_CONCURRENCY talik bo'laklarda yuboriladi va har bo'lakdan keyin
+            # saqlanadi - to'xtatilganda qayta yuboriladiganlar bitta bo'lakdan oshmaydi
+            for start in range(0, len(user_ids), BROADCAST_CONCURRENCY):
+                chunk = user_ids[start:start + BROADCAST_CONCURRENCY]
+                results = await asyncio.gather(
+                    *(send_one(bot, limiter, user_id, broadcast["text"]) for user_id in chunk)
+                )
+
+                blocked_ids: List[int] = []
+                for user_id, result in zip(chunk, results):
+                    if result == "sent":
+                        broadcast["sent_count"] += 1
+                    elif result == "blocked":
+                        broadcast["blocked_count"] += 1
+                        blocked_ids.append(user_id)
+                    else:
+                        broadcast["failed_count"] += 1
+
+                if blocked_ids:
+                    await db.mark_users_blocked(blocked_ids)
+
+                broadcast["last_user_id"] = chunk[-1]
+                await db.save_broadcast_progress(
+                    broadcast_id,
+                    broadcast["last_user_id"],
+                    broadcast["sent_count"],
+                    broadcast["failed_count"],
+                    broadcast["blocked_count"]
+                )
+
+                if _stopping:
+                    log.info(f"⏸️ Ommaviy xabar #{broadcast_id} to'xtatildi, keyingi ishga tushishda davom etadi")
+                    await update_progress_message(bot, broadcast)
+                    return
+
+                if time.monotonic() - last_progress_at >= PROGRESS_INTERVAL:
+                    last_progress_at = time.monotonic()
+                    await update_progress_message(bot, broadcast)
+
+        await db.save_broadcast_progress(
+            broadcast_id,
+            broadcast["last_user_id"],
+            broadcast["sent_count"],
+            broadcast["failed_count"],
+            broadcast["blocked_count"],
+            status="done"
+        )
+        await update_progress_message(bot, broadcast, finished=True)
+        log.info(f"✅ Ommaviy xabar #{broadcast_id} tugadi: {broadcast['sent_count']} ta yuborildi")
+    except asyncio.CancelledError:
+        log.warning(f"⚠️ Ommaviy xabar #{broadcast_id} bo'lak o'rtasida bekor qilindi")
+        raise
+    finally:
+        running_broadcasts.pop(broadcast_id, None)
+
+
+def spawn_broadcast(bot: Bot, broadcast: dict):
+    """Ommaviy xabarni fon vazifasi sifatida ishga tushirish"""
+    if broadcast["id"] in running_broadcasts:
+        return
+    running_broadcasts[broadcast["id"]] = asyncio.create_task(run_broadcast(bot, broadcast))
+
+
+async def start_broadcast(bot: Bot, text: str, admin_id: int, chat_id: int) -> Optional[int]:
+    """Yangi ommaviy xabar yaratish va yuborishni boshlash"""
+    status_message = await bot.send_message(chat_id, "📢 <b>Ommaviy xabar tayyorlanmoqda...</b>")
+
+    broadcast_id = await db.create_broadcast(text, admin_id, chat_id, status_message.message_id)
+    if broadcast_id is None:
+        await status_message.edit_text("❌ <b>Ommaviy xabar yaratishda xatolik!</b>")
+        return None
+
+    broadcasts = await db.get_running_broadcasts()
+    for broadcast in broadcasts:
+        if broadcast["id"] == broadcast_id:
+            await update_progress_message(bot, broadcast)
+            spawn_broadcast(bot, broadcast)
+            break
+
+    return broadcast_id
+
+
+async def resume_broadcasts(bot: Bot):
+    """Qayta ishga tushganda tugallanmagan ommaviy xabarlarni davom ettirish"""
+    broadcasts = await db.get_running_broadcasts()
+    for broadcast in broadcasts:
+        spawn_broadcast(bot, broadcast)
+
+    if broadcasts:
+        log.info(f"🔄 {len(broadcasts)} ta ommaviy xabar davom ettirilmoqda")
+
+
+async def stop_broadcasts(timeout: float = STOP_TIMEOUT):
+    """Ishlayotgan ommaviy xabarlarni joriy bo'lakdan keyin to'xtatish (holat bazada saqlanadi)"""
+    global _stopping
+    _stopping = True
+    tasks = list(running_broadcasts.values())
+    if not tasks:
+        return
+
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -1,47 +1,168 @@
 import os
 from dotenv import load_dotenv
 
+import logger
+
+log = logger.get_logger("config")
+
 # 1. Avval .env.local ni yuklashga urinib ko'ramiz
+# (xabar logging sozlangandan keyin print_config da chiqariladi)
 if os.path.exists(".env.local"):
     load_dotenv(".env.local")
-    print("📁 .env.local faylidan sozlamalar yuklandi")
+    ENV_SOURCE = "📁 .env.local faylidan sozlamalar yuklandi"
 elif os.path.exists(".env"):
     load_dotenv(".env")
-    print("📁 .env faylidan sozlamalar yuklandi")
+    ENV_SOURCE = "📁 .env faylidan sozlamalar yuklandi"
 else:
-    print("⚠️  Hech qanday .env fayli topilmadi")
+    ENV_SOURCE = None
 
 # Asosiy sozlamalar - faqat .env faylidan o'qiladi
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_IDS_STR = os.getenv("ADMIN_IDS", "").strip()
 ALLOWED_GROUP_IDS_STR = os.getenv("ALLOWED_GROUP_IDS", "").strip()
 DATABASE_URL = os.getenv("DATABASE_URL")  # Faqat .env dan
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")  # Ixtiyoriy: o'qish uchun replika
 DEV_NAME = os.getenv("DEV_NAME", "developer_name")
 DEV_USERNAME = os.getenv("DEV_USERNAME", "developer_username")
 BOT_USERNAME = os.getenv("BOT_USERNAME", "MahallaYordamBot")
 
+# Database pool sozlamalari
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))  # yozish pooli
+DB_READ_POOL_MAX_SIZE = int(os.getenv("DB_READ_POOL_MAX_SIZE", "10"))  # tezkor o'qishlar
+DB_HEAVY_POOL_MAX_SIZE = int(os.getenv("DB_HEAVY_POOL_MAX_SIZE", "2"))  # og'ir admin/statistika so'rovlari
+DB_REPLICA_LAG_WINDOW = float(os.getenv("DB_REPLICA_LAG_WINDOW", "10"))  # o'zgargan guruh shuncha sekund primary'dan o'qiladi
+DB_HEALTH_INTERVAL = float(os.getenv("DB_HEALTH_INTERVAL", "30"))  # sekund
+DB_CONN_MAX_LIFETIME = float(os.getenv("DB_CONN_MAX_LIFETIME", "1800"))  # 0 - yangilanmaydi
+DB_CONN_IDLE_LIFETIME = float(os.getenv("DB_CONN_IDLE_LIFETIME", "300"))
+DB_FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "2"))  # faollik/click buferini yozish oralig'i
+
+# Click jurnali: yig'ish oralig'i va saqlash muddatlari
+CLICK_ROLLUP_INTERVAL = float(os.getenv("CLICK_ROLLUP_INTERVAL", "60"))  # sekund
+CLICK_RAW_RETENTION_DAYS = int(os.getenv("CLICK_RAW_RETENTION_DAYS", "14"))
+CLICK_HOURLY_RETENTION_DAYS = int(os.getenv("CLICK_HOURLY_RETENTION_DAYS", "30"))
+
+# "Hozir mashhur" reytingi
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24"))
+TRENDING_PERSIST_INTERVAL = float(os.getenv("TRENDING_PERSIST_INTERVAL", "300"))  # sekund
+
+# Guruh adminlari keshi (sekund)
+GROUP_ADMIN_CACHE_TTL = float(os.getenv("GROUP_ADMIN_CACHE_TTL", "600"))
+
+# Sekin bazadan himoya: interaktiv so'rov muddati, circuit breaker va kontaktlar snapshoti
+DB_QUERY_TIMEOUT = float(os.getenv("DB_QUERY_TIMEOUT", "3"))  # sekund
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))  # sekund
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "contacts_snapshot.json")
+
+# Baza ishlamaganda yozuvlar saqlanadigan mahalliy jurnal (har bir instansiya uchun alohida papka)
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "journal")
+JOURNAL_MAX_BYTES = int(os.getenv("JOURNAL_MAX_BYTES", str(50 * 1024 * 1024)))
+JOURNAL_FSYNC_INTERVAL = float(os.getenv("JOURNAL_FSYNC_INTERVAL", "1"))  # sekund
+JOURNAL_REPLAY_INTERVAL = float(os.getenv("JOURNAL_REPLAY_INTERVAL", "10"))  # sekund
+
+# Ishga tushishda keshlarni oldindan to'ldirish (0 - o'chirilgan)
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "1") == "1"
+WARMUP_ACTIVE_DAYS = int(os.getenv("WARMUP_ACTIVE_DAYS", "7"))  # shu kunlar ichida faol foydalanuvchilar
+
+# Loglar: umumiy daraja, kategoriyalar bo'yicha darajalar ("db=WARNING,aiogram=INFO"),
+# bir joydan chiqadigan xabarlar limiti (oynada) va navbat hajmi
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "20"))
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "60"))  # sekund
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Tracing: update'larning qancha qismi kuzatiladi (0 - o'chirilgan) va OTLP/JSON fayl
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.otlp.jsonl")
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", "5"))  # sekund
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "20000"))  # yozilmagan spanlar chegarasi
+
+# Bot API HTTP sessiyasi: ulanishlar soni, keep-alive, DNS kesh, timeoutlar
+# ("sendMessage=10,getChat=5" - metod bo'yicha) va tarmoq xatosida qayta urinishlar
+BOT_API_POOL_SIZE = int(os.getenv("BOT_API_POOL_SIZE", "100"))
+BOT_API_KEEPALIVE = float(os.getenv("BOT_API_KEEPALIVE", "60"))  # sekund
+BOT_API_DNS_TTL = int(os.getenv("BOT_API_DNS_TTL", "600"))  # sekund
+BOT_API_CONNECT_TIMEOUT = float(os.getenv("BOT_API_CONNECT_TIMEOUT", "5"))  # sekund
+BOT_API_TIMEOUT = float(os.getenv("BOT_API_TIMEOUT", "30"))  # sekund
+BOT_API_TIMEOUTS = os.getenv("BOT_API_TIMEOUTS", "")
+BOT_API_RETRIES = int(os.getenv("BOT_API_RETRIES", "2"))
+BOT_API_RETRY_BASE = float(os.getenv("BOT_API_RETRY_BASE", "0.5"))  # sekund
+BOT_API_SLOW_MS = int(os.getenv("BOT_API_SLOW_MS", "2000"))
+
+# Update'lar navbati: bir chat (yoki xabar - "message") update'lari ketma-ket,
+# bir vaqtda ishlaydigan handlerlar soni esa umumiy chegaralanadi
+UPDATE_ORDER_KEY = os.getenv("UPDATE_ORDER_KEY", "chat")
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "100"))
+
+# Yuklama oshganda past ustuvorlikdagi update'larni (guruhdagi oddiy xabarlar) tashlash:
+# navbat chuqurligi yoki loop kechikishi chegarasi, shunda ham o'tkaziladigan ulush
+SHED_QUEUE_DEPTH = int(os.getenv("SHED_QUEUE_DEPTH", "200"))
+SHED_LOOP_LAG_MS = int(os.getenv("SHED_LOOP_LAG_MS", "200"))
+SHED_SAMPLE_RATE = float(os.getenv("SHED_SAMPLE_RATE", "0.1"))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))  # sekund
+
+# Flood himoyasi: "soni/sekund" ko'rinishidagi limitlar. Qoidalar buyruq yoki callback
+# prefiksi bo'yicha (foydalanuvchiga), guruh limiti esa guruhdagi barcha buyruq/tugmalarga
+THROTTLE_RULES = os.getenv("THROTTLE_RULES", "/aloqa=3/10,/top=3/10,admin:users=2/10,admin:stats=2/10")
+THROTTLE_USER_LIMIT = os.getenv("THROTTLE_USER_LIMIT", "10/10")
+THROTTLE_GROUP_LIMIT = os.getenv("THROTTLE_GROUP_LIMIT", "120/60")
+THROTTLE_MAX_KEYS = int(os.getenv("THROTTLE_MAX_KEYS", "50000"))
+
+# Band guruhda /aloqa: shu oyna ichida yangi ro'yxat yuborilmaydi, oxirgisiga ishora qilinadi (0 - o'chirilgan)
+CONTACTS_COALESCE_WINDOW = float(os.getenv("CONTACTS_COALESCE_WINDOW", "60"))  # sekund
+
+# Kontaktlar/reyting keshi: maksimal yashash vaqti va versiya tekshiruvi oralig'i (sekund)
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))
+CACHE_VERSION_CHECK_INTERVAL = float(os.getenv("CACHE_VERSION_CHECK_INTERVAL", "30"))
+
+# To'xtashda ishlayotgan handlerlarni kutish vaqti (sekund)
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "10"))
+
+# Ommaviy xabar yuborish sozlamalari
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))  # sekundiga xabarlar
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE", "200"))
+
+# Chizilgan ekranlar keshi (bir xil edit_text chaqiruvlarini o'tkazib yuborish uchun)
+SCREEN_CACHE_SIZE = int(os.getenv("SCREEN_CACHE_SIZE", "10000"))
+
+# Profil xeshlari keshi (o'zgarmagan profilni qayta yozmaslik uchun)
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "50000"))
+
+# Faollik yozish oralig'i: bitta foydalanuvchi/chat uchun N sekundda bir marta
+# (message_count aniq qoladi - oraliqdagi xabarlar keyingi yozuvga qo'shiladi)
+ACTIVITY_GRANULARITY = float(os.getenv("ACTIVITY_GRANULARITY", "300"))
+ACTIVITY_TRACK_SIZE = int(os.getenv("ACTIVITY_TRACK_SIZE", "100000"))
+
 # Admin ID larini listga o'tkazish
 ADMIN_IDS = []
 if ADMIN_IDS_STR:
     ADMIN_IDS = [int(admin_id.strip()) for admin_id in ADMIN_IDS_STR.split(",") if admin_id.strip()]
 
-# Gruh ID larini listga o'tkazish
+# Gruh ID larini listga o'tkazish (boshlang'ich ro'yxat - keyin groups jadvalidan boshqariladi)
 ALLOWED_GROUP_IDS = []
 if ALLOWED_GROUP_IDS_STR:
-    ALLOWED_GROUP_IDS = [group_id.strip() for group_id in ALLOWED_GROUP_IDS_STR.split(",") if group_id.strip()]
+    ALLOWED_GROUP_IDS = [int(group_id.strip()) for group_id in ALLOWED_GROUP_IDS_STR.split(",") if group_id.strip()]
 
 
 # Sozlamalarni chiqarish funksiyasi
 def print_config():
     """Sozlamalarni ekranga chiqarish"""
+    if ENV_SOURCE:
+        log.info(ENV_SOURCE)
+    else:
+        log.warning("⚠️  Hech qanday .env fayli topilmadi")
+
     lines = []
 
     lines.append("⚙️ Sozlamalar yuklandi:")
     lines.append(f"   🤖 Bot: @{BOT_USERNAME}")
-    lines.append(f"   👥 Ruxsat berilgan guruhlar: {ALLOWED_GROUP_IDS}")
+    lines.append(f"   👥 Boshlang'ich guruhlar (.env): {ALLOWED_GROUP_IDS}")
     lines.append(f"   👤 Adminlar: {ADMIN_IDS}")
     lines.append(f"   🗄️  Database URL mavjud: {'✅ HA' if DATABASE_URL else '❌ YOQ'}")
+    lines.append(f"   🔀 O'qish replikasi: {'✅ HA' if DATABASE_REPLICA_URL else '❌ YOQ'}")
 
-    # Barcha xabarlarni bir vaqtda chiqaramiz
-    for line in lines:
-        print(line)
\ No newline at end of file
+    # Barcha xabarlar bitta yozuvda
+    log.info("\n".join(lines))
\ No newline at end of file
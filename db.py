@@ -1,92 +1,503 @@
+import asyncio
 import asyncpg
-from config import DATABASE_URL
-from typing import Dict, List, Optional, Tuple
-from datetime import datetime
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from config import (
+    DATABASE_URL,
+    DATABASE_REPLICA_URL,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_READ_POOL_MAX_SIZE,
+    DB_HEAVY_POOL_MAX_SIZE,
+    DB_REPLICA_LAG_WINDOW,
+    DB_HEALTH_INTERVAL,
+    DB_CONN_MAX_LIFETIME,
+    DB_CONN_IDLE_LIFETIME,
+    DB_FLUSH_INTERVAL,
+    CLICK_ROLLUP_INTERVAL,
+    CLICK_RAW_RETENTION_DAYS,
+    CLICK_HOURLY_RETENTION_DAYS,
+    CACHE_TTL,
+    CACHE_VERSION_CHECK_INTERVAL,
+    PROFILE_CACHE_SIZE,
+    ACTIVITY_GRANULARITY,
+    ACTIVITY_TRACK_SIZE,
+    DB_QUERY_TIMEOUT,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT,
+    WARMUP_ACTIVE_DAYS
+)
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from datetime import date, datetime, timedelta
 
-# Database obyekti
+import journal
+import logger
+import metrics
+import snapshot
+import tracing
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_LOCK_ID = 727001  # pg_advisory_lock kaliti (bir vaqtda faqat bitta worker migratsiya qiladi)
+# Click yozuvchilar shared, yig'ish exclusive oladi: id lar commit tartibida ko'rinmaydi,
+# shuning uchun kursor faqat barcha yozuvchilar tugagan nuqtagacha suriladi
+CLICK_WRITE_LOCK_ID = 727002
+
+log = logger.get_logger("db")
+
+# Database obyekti (yozish pooli; o'qish va og'ir so'rovlar _pools da alohida)
 pool: asyncpg.Pool | None = None
+_pools: Dict[str, asyncpg.Pool] = {}  # "write" / "read" / "heavy" -> pool
+_pool_waiting: Dict[str, int] = {"write": 0, "read": 0, "heavy": 0}  # ulanish kutayotganlar
+_primary_until: Dict[int, float] = {}  # group_id -> shu vaqtgacha primary'dan o'qiladi
+SLOW_ACQUIRE_MS = 50  # bundan uzoq kutilgan acquire pool to'lganini bildiradi
+CLICK_ROLLUP_BATCH = 50000  # bitta yig'ishda olinadigan click qatorlari
+_stale_groups: set = set()  # kontaktlari snapshotdan berilgan guruhlar
+_top_unavailable: set = set()  # reytingi olinmagan guruhlar (None - umumiy reyting)
+
+# Baza ishlamayotganini bildiradigan xatolar (bunday yozuvlar jurnalga tushadi)
+OUTAGE_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.TooManyConnectionsError
+)
+_pool_init_task: Optional[asyncio.Task] = None  # Bitta umumiy pool yaratish vazifasi
+_pool_manager_task: Optional[asyncio.Task] = None
+_connection_opened_at: Dict[int, float] = {}  # id(conn) -> ochilgan vaqt
+_flusher_task: Optional[asyncio.Task] = None
+_flusher_stop: Optional[asyncio.Event] = None
+_rollup_task: Optional[asyncio.Task] = None
+_listener_task: Optional[asyncio.Task] = None
+# LISTEN kanallari: kanal -> (payload callback, qayta ulanganda chaqiriladigan callback)
+_channel_handlers: Dict[str, Tuple[Callable[[str], Awaitable[None]],
+                                   Optional[Callable[[], Awaitable[None]]]]] = {}
+# Ishlayotgan NOTIFY handlerlari (loop vazifalarga faqat kuchsiz havola saqlaydi)
+_notify_tasks: set = set()
+
+# Yig'ib boriladigan yozuvlar (fon vazifasi bitta so'rov bilan yozadi)
+_activity_buffer: Dict[Tuple[int, int], List] = {}  # (user_id, chat_id) -> [soni, oxirgi buyruq]
+_click_buffer: Dict[Tuple[str, int], int] = {}  # (service, group_id) -> soni
 user_menu_history: Dict[int, List[str]] = {}  # Foydalanuvchi menyu tarixi
+# Tarixdagi menyular uchun chizilgan ekranlar:
+# menyu -> (chat_id, matn, markup kaliti, group_id, versiya, with_clicks); with_clicks bo'lsa versiya - (kontaktlar, clicklar)
+user_menu_screens: Dict[int, Dict[str, Tuple[int, str, bytes, Optional[int],
+                                             Union[int, Tuple[int, int], None], bool]]] = {}
+group_versions: Dict[int, int] = {}  # Guruh kontaktlari versiyasi (cache_versions jadvalidan)
+click_versions: Dict[int, int] = {}  # Guruh clicklari versiyasi (faqat reyting keshlari uchun)
+
+# Guruh kontaktlari va reyting keshlari: (versiya, keshlangan vaqt, ma'lumot)
+_contacts_cache: Dict[int, Tuple[int, float, List[Tuple[str, str]]]] = {}
+_top_cache: Dict[int, Dict[Tuple[int, Optional[int]], Tuple[Tuple[int, int], float, List[Tuple[str, str, int]]]]] = {}
+_cache_sync_task: Optional[asyncio.Task] = None
+
+# (user_id, chat_id) -> bazaga oxirgi yozilgan profil xeshi
+_profile_hashes: "OrderedDict[Tuple[int, int], bytes]" = OrderedDict()
+# (user_id, chat_id) -> faollik oxirgi marta bazaga yozilgan vaqt (monotonic)
+_activity_written_at: "OrderedDict[Tuple[int, int], float]" = OrderedDict()
+
+
+def load_migrations() -> List[Tuple[int, str, str]]:
+    """migrations/ papkasidagi NNN_nomi.sql fayllarini tartib bilan o'qish"""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = re.match(r"^(\d+)_(\w+)\.sql$", filename)
+        if not match:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, filename), encoding="utf-8") as f:
+            migrations.append((int(match.group(1)), match.group(2), f.read()))
+    return migrations
+
+
+async def get_schema_version(conn: asyncpg.Connection) -> int:
+    """Bazadagi sxema versiyasi (jadval bo'lmasa 0)"""
+    try:
+        return await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    except asyncpg.UndefinedTableError:
+        return 0
+
+
+async def apply_migrations(conn: asyncpg.Connection) -> int:
+    """Qo'llanmagan migratsiyalarni bir martadan qo'llash"""
+    migrations = load_migrations()
+    latest = migrations[-1][0] if migrations else 0
+
+    # Tezkor yo'l: sxema yangi bo'lsa faqat bitta SELECT
+    if await get_schema_version(conn) >= latest:
+        return 0
+
+    applied = 0
+    await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+    try:
+        await conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT NOW()
+        )
+        """)
+
+        current = await get_schema_version(conn)
+        for version, name, sql in migrations:
+            if version <= current:
+                continue
+
+            async with conn.transaction():
+                await conn.execute(sql)
+                await conn.execute(
+                    "INSERT INTO schema_version (version, name) VALUES ($1, $2)",
+                    version, name
+                )
+            applied += 1
+            log.info(f"🧱 Migratsiya qo'llandi: {version:03d}_{name}")
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+
+    return applied
+
+
+async def _on_connection_open(conn: asyncpg.Connection):
+    """Yangi ulanish ochilganda"""
+    _connection_opened_at[id(conn)] = time.monotonic()
+    conn.add_termination_listener(_on_connection_close)
+    metrics.inc("db_connections_opened")
+
+
+def _on_connection_close(conn: asyncpg.Connection):
+    """Ulanish yopilganda uning umrini hisobga olish"""
+    opened_at = _connection_opened_at.pop(id(conn), None)
+    metrics.inc("db_connections_closed")
+    if opened_at is not None:
+        metrics.inc("db_connection_lifetime_total_s", int(time.monotonic() - opened_at))
 
 
 async def init_db():
-    """Ma'lumotlar bazasini ishga tushirish"""
+    """Ma'lumotlar bazasini ishga tushirish (bir vaqtda faqat bitta pool yaratiladi)"""
+    global _pool_init_task
+    if pool is not None:
+        return True
+
+    if _pool_init_task is None:
+        _pool_init_task = asyncio.create_task(_create_pool())
+
+    task = _pool_init_task
+    ok = await asyncio.shield(task)
+    if not ok and _pool_init_task is task:
+        # Keyingi chaqiruv qayta urinib ko'rishi uchun
+        _pool_init_task = None
+    return ok
+
+
+async def _create_pool():
+    """Pool yaratish va sxemani tekshirish"""
     global pool
+    new_pool = None
     try:
         if not DATABASE_URL:
-            print("❌ DATABASE_URL topilmadi! .env.local faylida DATABASE_URL ni kiriting")
+            log.error("❌ DATABASE_URL topilmadi! .env.local faylida DATABASE_URL ni kiriting")
             return False
 
-        print("🔄 PostgreSQL database ulanmoqda...")
-        pool = await asyncpg.create_pool(
-            DATABASE_URL,
-            min_size=1,
-            max_size=10,
-            timeout=60,
-            command_timeout=60
-        )
+        log.info("🔄 PostgreSQL database ulanmoqda...")
+        started = time.perf_counter()
+        new_pool = await _open_pool(DATABASE_URL, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE)
+        metrics.inc("db_pool_created")
 
-        async with pool.acquire() as conn:
-            # Asosiy kontaklar jadvali
-            await conn.execute("""
-            CREATE TABLE IF NOT EXISTS contacts (
-                id SERIAL PRIMARY KEY,
-                service TEXT NOT NULL,
-                phone TEXT NOT NULL,
-                click_count INTEGER DEFAULT 0,
-                group_id BIGINT NOT NULL,
-                created_at TIMESTAMP DEFAULT NOW(),
-                updated_at TIMESTAMP DEFAULT NOW(),
-                UNIQUE(service, group_id)
-            )
-            """)
+        async with new_pool.acquire() as conn:
+            await apply_migrations(conn)
+            try:
+                # Fon vazifasi ishlamay qolsa ham bugungi bo'lim tayyor turadi
+                await ensure_click_partitions(conn)
+            except Exception as e:
+                log.warning(f"⚠️ Click bo'limlarini yaratish xatosi: {e}")
 
-            # Foydalanuvchilar jadvali
-            await conn.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                user_id BIGINT NOT NULL,
-                first_name VARCHAR(255),
-                last_name VARCHAR(255),
-                username VARCHAR(255),
-                language_code VARCHAR(10),
-                is_bot BOOLEAN DEFAULT FALSE,
-                is_premium BOOLEAN DEFAULT FALSE,
-                chat_id BIGINT,
-                chat_type VARCHAR(50),
-                started_at TIMESTAMP DEFAULT NOW(),
-                last_activity TIMESTAMP DEFAULT NOW(),
-                message_count INTEGER DEFAULT 0,
-                last_command TEXT,
-                UNIQUE(user_id, chat_id)
-            )
+            # COUNT(*) o'rniga statistikadagi taxminiy qatorlar soni
+            rows = await conn.fetch("""
+                SELECT relname, GREATEST(reltuples, 0)::BIGINT AS estimate
+                FROM pg_class
+                WHERE oid IN ('contacts'::regclass, 'users'::regclass)
             """)
+            estimates = {r["relname"]: r["estimate"] for r in rows}
 
-            # Indexlar
-            await conn.execute("""
-            CREATE INDEX IF NOT EXISTS idx_contacts_click_count 
-            ON contacts(click_count DESC)
-            """)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        log.info(
+            f"✅ PostgreSQL database ulandi. ~{estimates.get('contacts', 0)} ta kontakt, "
+            f"~{estimates.get('users', 0)} ta foydalanuvchi mavjud ({elapsed_ms:.0f} ms)"
+        )
 
-            await conn.execute("""
-            CREATE INDEX IF NOT EXISTS idx_contacts_group_id 
-            ON contacts(group_id)
-            """)
+        read_pools = await _open_read_pools()
+        _pools.update(read_pools, write=new_pool)
+        pool = new_pool
+        return True
+    except Exception as e:
+        log.error(f"❌ Database xatosi: {e}")
+        if new_pool is not None:
+            new_pool.terminate()
+        return False
 
-            await conn.execute("""
-            CREATE INDEX IF NOT EXISTS idx_users_user_id 
-            ON users(user_id)
-            """)
 
-            contacts_count = await conn.fetchval("SELECT COUNT(*) FROM contacts")
-            users_count = await conn.fetchval("SELECT COUNT(*) FROM users")
-            print(f"✅ PostgreSQL database ulandi. {contacts_count} ta kontakt, {users_count} ta foydalanuvchi mavjud")
+async def _open_pool(dsn: str, min_size: int, max_size: int) -> asyncpg.Pool:
+    """Bitta pool ochish (barcha turlar uchun umumiy sozlamalar)"""
+    return await asyncpg.create_pool(
+        dsn,
+        min_size=min(min_size, max_size),
+        max_size=max_size,
+        max_inactive_connection_lifetime=DB_CONN_IDLE_LIFETIME,
+        timeout=60,
+        command_timeout=60,
+        init=_on_connection_open
+    )
+
+
+async def _open_read_pools() -> Dict[str, asyncpg.Pool]:
+    """O'qish va og'ir so'rovlar poollari (replika bo'lsa unga, ishlamasa primary'ga)"""
+    opened: Dict[str, asyncpg.Pool] = {}
+    dsn = DATABASE_REPLICA_URL or DATABASE_URL
+    try:
+        opened["read"] = await _open_pool(dsn, DB_POOL_MIN_SIZE, DB_READ_POOL_MAX_SIZE)
+        opened["heavy"] = await _open_pool(dsn, 0, DB_HEAVY_POOL_MAX_SIZE)
+        if DATABASE_REPLICA_URL:
+            log.info("🔀 O'qish so'rovlari replikaga yo'naltirildi")
+        return opened
+    except Exception as e:
+        for opened_pool in opened.values():
+            opened_pool.terminate()
+        if not DATABASE_REPLICA_URL:
+            raise
+
+        log.warning(f"⚠️ Replikaga ulanib bo'lmadi, o'qishlar primary'da: {e}")
+        metrics.inc("db_replica_failures")
+        return {
+            "read": await _open_pool(DATABASE_URL, DB_POOL_MIN_SIZE, DB_READ_POOL_MAX_SIZE),
+            "heavy": await _open_pool(DATABASE_URL, 0, DB_HEAVY_POOL_MAX_SIZE)
+        }
+
 
+class CircuitBreaker:
+    """Ketma-ket xatolardan keyin bazaga so'rovlarni vaqtincha to'xtatish"""
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # Sinov so'rovi boshlangan vaqt; natijasi kelmasa (bekor qilingan) reset_timeout dan keyin eskiradi
+        self._probe_at: Optional[float] = None
+
+    @property
+    def _probing(self) -> bool:
+        return self._probe_at is not None and time.monotonic() - self._probe_at < self.reset_timeout
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self._probing else "open"
+
+    def allow(self) -> bool:
+        """So'rov yuborish mumkinmi (ochiq holatda vaqti kelganda bitta sinov so'rovi)"""
+        if self.opened_at is None:
+            return True
+        if not self._probing and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._probe_at = time.monotonic()
+            return True
+        metrics.inc("db_circuit_rejected")
+        return False
+
+    def release_probe(self):
+        """Sinov so'rovi natijasiz tugadi (bekor qilindi) - keyingi so'rov qayta sinaydi"""
+        self._probe_at = None
+
+    def record_success(self):
+        if self.opened_at is not None:
+            log.info("✅ Database tiklandi, so'rovlar qayta yoqildi")
+        self.failures = 0
+        self.opened_at = None
+        self._probe_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or (self.opened_at is None and self.failures >= self.threshold):
+            if self.opened_at is None:
+                log.warning(f"⚠️ Database javob bermayapti, {self.reset_timeout:.0f} s davomida snapshot ishlatiladi")
+            self.opened_at = time.monotonic()
+            self._probe_at = None
+            metrics.inc("db_circuit_opened")
+
+
+breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+metrics.register_gauge("db_circuit_open", lambda: int(breaker.opened_at is not None))
+
+
+@asynccontextmanager
+async def _acquire(name: str, kind: str = "write",
+                   timeout: float = None) -> AsyncIterator[asyncpg.Connection]:
+    """Turga mos pooldan ulanish olish (kutish vaqti metrikaga, name - trace'dagi span nomi)"""
+    target = _pools.get(kind, pool)
+    if target is None:
+        raise ConnectionError("Database pool mavjud emas")
+
+    with tracing.span(f"db {name}", tracing.KIND_CLIENT, **{"db.pool": kind}) as span:
+        _pool_waiting[kind] += 1
+        started = time.perf_counter()
+        try:
+            conn = await target.acquire(timeout=timeout)
+        finally:
+            _pool_waiting[kind] -= 1
+
+        waited_ms = int((time.perf_counter() - started) * 1000)
+        metrics.inc(f"db_{kind}_acquires")
+        metrics.inc(f"db_{kind}_wait_ms", waited_ms)
+        if waited_ms >= SLOW_ACQUIRE_MS:
+            metrics.inc(f"db_{kind}_slow_acquires")
+        span.set("db.acquire_ms", waited_ms)
+
+        try:
+            yield conn
+        finally:
+            await target.release(conn)
+
+
+def _pool_in_use(kind: str) -> int:
+    """Pooldagi band ulanishlar soni"""
+    target = _pools.get(kind)
+    return target.get_size() - target.get_idle_size() if target is not None else 0
+
+
+for _kind in _pool_waiting:
+    metrics.register_gauge(f"db_{_kind}_in_use", lambda kind=_kind: _pool_in_use(kind))
+    metrics.register_gauge(f"db_{_kind}_waiting", lambda kind=_kind: _pool_waiting[kind])
+
+
+def _read_kind(group_id: Optional[int]) -> str:
+    """Yaqinda o'zgargan guruhni replika kechikishi tufayli primary'dan o'qish"""
+    if group_id is not None and time.monotonic() < _primary_until.get(group_id, 0):
+        return "write"
+    return "read"
+
+
+async def _check_pool_health(target: asyncpg.Pool, kind: str = "write") -> bool:
+    """Pooldan ulanish olib SELECT 1 bajarish"""
+    try:
+        async with target.acquire(timeout=5) as conn:
+            await conn.fetchval("SELECT 1", timeout=5)
         return True
     except Exception as e:
-        print(f"❌ Database xatosi: {e}")
+        metrics.inc("db_health_failures")
+        log.warning(f"⚠️ Database health check xatosi ({kind}): {e}")
         return False
 
 
+async def _pool_manager():
+    """Pool holatini kuzatish: health check, qayta ulanish va ulanishlarni yangilash"""
+    last_recycle = time.monotonic()
+
+    while True:
+        await asyncio.sleep(DB_HEALTH_INTERVAL)
+        if pool is None:
+            continue
+
+        for kind, target in list(_pools.items()):
+            if await _check_pool_health(target, kind):
+                continue
+
+            # Postgres qayta ishga tushgan bo'lishi mumkin - eski ulanishlarni tashlab,
+            # backoff bilan qayta ulanamiz
+            delay = 1.0
+            while True:
+                target.expire_connections()
+                metrics.inc("db_reconnect_attempts")
+                if await _check_pool_health(target, kind):
+                    metrics.inc("db_reconnects")
+                    log.info(f"✅ Database bilan aloqa tiklandi ({kind})")
+                    break
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+                delay = min(delay * 2, 60.0)
+            last_recycle = time.monotonic()
+
+        if DB_CONN_MAX_LIFETIME and time.monotonic() - last_recycle >= DB_CONN_MAX_LIFETIME:
+            # Bo'shagan ulanishlar yopilib, keyingi acquire'da yangisi ochiladi
+            for target in _pools.values():
+                target.expire_connections()
+            metrics.inc("db_pool_recycles")
+            last_recycle = time.monotonic()
+
+
+def start_pool_manager():
+    """Pool kuzatuvchisini fon vazifasi sifatida ishga tushirish"""
+    global _pool_manager_task
+    if _pool_manager_task is None or _pool_manager_task.done():
+        _pool_manager_task = asyncio.create_task(_pool_manager())
+
+
+def profile_fingerprint(first_name, last_name, username, language_code,
+                        is_premium, chat_type) -> bytes:
+    """Profil maydonlari uchun qisqa xesh"""
+    raw = "\x1f".join(
+        "" if value is None else str(value)
+        for value in (first_name, last_name, username, language_code, is_premium, chat_type)
+    )
+    return hashlib.blake2b(raw.encode(), digest_size=8).digest()
+
+
+def _remember_profile(key: Tuple[int, int], fingerprint: bytes):
+    """Profil xeshini LRU keshga yozish"""
+    _profile_hashes[key] = fingerprint
+    _profile_hashes.move_to_end(key)
+
+    while len(_profile_hashes) > PROFILE_CACHE_SIZE:
+        _profile_hashes.popitem(last=False)
+
+
+async def _upsert_user(conn: asyncpg.Connection, user_id: int, first_name: str, last_name: str,
+                       username: str, language_code: str, is_bot: bool, is_premium: bool,
+                       chat_id: Optional[int], chat_type: str, command: str):
+    """Profil, faollik va blok holatini bitta ulanishda yozish"""
+    await conn.execute("""
+        INSERT INTO users 
+        (user_id, first_name, last_name, username, language_code, 
+         is_bot, is_premium, chat_id, chat_type)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+        ON CONFLICT (user_id, chat_id) 
+        DO UPDATE SET
+            first_name = COALESCE(EXCLUDED.first_name, users.first_name),
+            last_name = COALESCE(EXCLUDED.last_name, users.last_name),
+            username = COALESCE(EXCLUDED.username, users.username),
+            language_code = COALESCE(EXCLUDED.language_code, users.language_code),
+            is_premium = EXCLUDED.is_premium,
+            chat_type = EXCLUDED.chat_type
+        WHERE (users.first_name, users.last_name, users.username,
+               users.language_code, users.is_premium, users.chat_type)
+            IS DISTINCT FROM
+              (COALESCE(EXCLUDED.first_name, users.first_name),
+               COALESCE(EXCLUDED.last_name, users.last_name),
+               COALESCE(EXCLUDED.username, users.username),
+               COALESCE(EXCLUDED.language_code, users.language_code),
+               EXCLUDED.is_premium, EXCLUDED.chat_type)
+    """, user_id, first_name, last_name, username, language_code,
+                       is_bot, is_premium, chat_id, chat_type)
+
+    if chat_id is not None:
+        await conn.execute("""
+            INSERT INTO user_activity (user_id, chat_id, last_activity, message_count, last_command)
+            VALUES ($1, $2, NOW(), 1, $3)
+            ON CONFLICT (user_id, chat_id) DO UPDATE SET
+                last_activity = NOW(),
+                message_count = user_activity.message_count + 1,
+                last_command = EXCLUDED.last_command
+        """, user_id, chat_id, command)
+
+    # Qayta start bosgan foydalanuvchi endi bloklanmagan
+    if chat_type == "private":
+        await conn.execute("DELETE FROM blocked_users WHERE user_id = $1", user_id)
+
+
 async def save_user(
         user_id: int,
         first_name: str = None,
@@ -99,61 +510,81 @@ async def save_user(
         chat_type: str = None,
         command: str = None
 ) -> bool:
-    """Foydalanuvchi ma'lumotlarini saqlash yoki yangilash"""
+    """Foydalanuvchi ma'lumotlarini saqlash (profil faqat o'zgarganda yoziladi)"""
+    key = (user_id, chat_id)
+    fingerprint = profile_fingerprint(first_name, last_name, username, language_code,
+                                      is_premium, chat_type)
+
+    unchanged = chat_id is not None and _profile_hashes.get(key) == fingerprint
+
+    if unchanged:
+        # Profil o'zgarmagan - faqat faollik buferi
+        _profile_hashes.move_to_end(key)
+        metrics.inc("profile_upserts_skipped")
+        await save_user_activity(user_id, chat_id, command)
+
+        if chat_type != "private":
+            return True
+
     try:
         if not pool:
             await init_db()
 
-        async with pool.acquire() as conn:
-            await conn.execute("""
-                INSERT INTO users 
-                (user_id, first_name, last_name, username, language_code, 
-                 is_bot, is_premium, chat_id, chat_type, last_activity, message_count, last_command)
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, NOW(), 1, $10)
-                ON CONFLICT (user_id, chat_id) 
-                DO UPDATE SET
-                    first_name = COALESCE(EXCLUDED.first_name, users.first_name),
-                    last_name = COALESCE(EXCLUDED.last_name, users.last_name),
-                    username = COALESCE(EXCLUDED.username, users.username),
-                    language_code = COALESCE(EXCLUDED.language_code, users.language_code),
-                    is_premium = EXCLUDED.is_premium,
-                    chat_type = EXCLUDED.chat_type,
-                    last_activity = NOW(),
-                    last_command = EXCLUDED.last_command,
-                    message_count = users.message_count + 1
-            """, user_id, first_name, last_name, username, language_code,
+        if unchanged:
+            # Qayta start bosgan foydalanuvchi endi bloklanmagan
+            async with _acquire("save_user") as conn:
+                await conn.execute("DELETE FROM blocked_users WHERE user_id = $1", user_id)
+            return True
+
+        async with _acquire("save_user") as conn:
+            await _upsert_user(conn, user_id, first_name, last_name, username, language_code,
                                is_bot, is_premium, chat_id, chat_type, command)
 
-            return True
+        if chat_id is not None:
+            _remember_profile(key, fingerprint)
+            _mark_activity_written([key])
+        return True
     except Exception as e:
-        print(f"❌ Foydalanuvchi saqlash xatosi: {e}")
+        _profile_hashes.pop(key, None)
+        log.error(f"❌ Foydalanuvchi saqlash xatosi: {e}")
+        if isinstance(e, OUTAGE_ERRORS) and not unchanged:
+            return journal.append("user", [user_id, first_name, last_name, username, language_code,
+                                           is_bot, is_premium, chat_id, chat_type, command])
         return False
 
 
 async def save_user_activity(user_id: int, chat_id: int = None, command: str = None):
-    """Faqat faollikni yangilash"""
-    try:
-        if not pool:
-            await init_db()
+    """Faqat faollikni yangilash (buferga yoziladi, fon vazifasi bazaga yozadi)"""
+    if chat_id is None:
+        return
 
-        async with pool.acquire() as conn:
-            if command:
-                await conn.execute("""
-                    UPDATE users 
-                    SET last_activity = NOW(), 
-                        message_count = message_count + 1,
-                        last_command = $3
-                    WHERE user_id = $1 AND chat_id = $2
-                """, user_id, chat_id, command)
-            else:
-                await conn.execute("""
-                    UPDATE users 
-                    SET last_activity = NOW(), 
-                        message_count = message_count + 1
-                    WHERE user_id = $1 AND chat_id = $2
-                """, user_id, chat_id)
-    except Exception as e:
-        print(f"⚠️ Faollik yangilash xatosi: {e}")
+    entry = _activity_buffer.get((user_id, chat_id))
+    if entry is None:
+        _activity_buffer[(user_id, chat_id)] = [1, command]
+    else:
+        entry[0] += 1
+        if command:
+            entry[1] = command
+
+
+async def _flush_activity(conn: asyncpg.Connection, activity: Dict[Tuple[int, int], List]):
+    """Yig'ilgan faollikni user_activity jadvaliga bitta so'rov bilan yozish"""
+    await conn.execute("""
+        INSERT INTO user_activity (user_id, chat_id, last_activity, message_count, last_command)
+        SELECT d.user_id, d.chat_id, NOW(), d.cnt, d.cmd
+        FROM unnest($1::BIGINT[], $2::BIGINT[], $3::INTEGER[], $4::TEXT[])
+             AS d(user_id, chat_id, cnt, cmd)
+        JOIN users u ON u.user_id = d.user_id AND u.chat_id = d.chat_id
+        ON CONFLICT (user_id, chat_id) DO UPDATE SET
+            last_activity = NOW(),
+            message_count = user_activity.message_count + EXCLUDED.message_count,
+            last_command = COALESCE(EXCLUDED.last_command, user_activity.last_command)
+    """,
+        [key[0] for key in activity],
+        [key[1] for key in activity],
+        [value[0] for value in activity.values()],
+        [value[1] for value in activity.values()]
+    )
 
 
 async def get_user_stats(user_id: int, chat_id: int = None):
@@ -162,25 +593,29 @@ async def get_user_stats(user_id: int, chat_id: int = None):
         if not pool:
             await init_db()
 
-        async with pool.acquire() as conn:
+        async with _acquire("get_user_stats", "read") as conn:
             if chat_id:
                 row = await conn.fetchrow("""
                     SELECT 
-                        user_id, first_name, last_name, username, chat_id, chat_type,
-                        started_at, last_activity, message_count, last_command
-                    FROM users 
-                    WHERE user_id = $1 AND chat_id = $2
-                    ORDER BY last_activity DESC
+                        u.user_id, u.first_name, u.last_name, u.username, u.chat_id, u.chat_type,
+                        u.started_at, a.last_activity, COALESCE(a.message_count, 0) AS message_count,
+                        a.last_command
+                    FROM users u
+                    LEFT JOIN user_activity a ON a.user_id = u.user_id AND a.chat_id = u.chat_id
+                    WHERE u.user_id = $1 AND u.chat_id = $2
+                    ORDER BY a.last_activity DESC NULLS LAST
                     LIMIT 1
                 """, user_id, chat_id)
             else:
                 row = await conn.fetchrow("""
                     SELECT 
-                        user_id, first_name, last_name, username, chat_id, chat_type,
-                        started_at, last_activity, message_count, last_command
-                    FROM users 
-                    WHERE user_id = $1
-                    ORDER BY last_activity DESC
+                        u.user_id, u.first_name, u.last_name, u.username, u.chat_id, u.chat_type,
+                        u.started_at, a.last_activity, COALESCE(a.message_count, 0) AS message_count,
+                        a.last_command
+                    FROM users u
+                    LEFT JOIN user_activity a ON a.user_id = u.user_id AND a.chat_id = u.chat_id
+                    WHERE u.user_id = $1
+                    ORDER BY a.last_activity DESC NULLS LAST
                     LIMIT 1
                 """, user_id)
 
@@ -188,7 +623,7 @@ async def get_user_stats(user_id: int, chat_id: int = None):
                 return dict(row)
             return None
     except Exception as e:
-        print(f"❌ Foydalanuvchi statistikasi xatosi: {e}")
+        log.error(f"❌ Foydalanuvchi statistikasi xatosi: {e}")
         return None
 
 
@@ -198,47 +633,83 @@ async def get_all_users(limit: int = 100):
         if not pool:
             await init_db()
 
-        async with pool.acquire() as conn:
+        async with _acquire("get_all_users", "heavy") as conn:
             rows = await conn.fetch("""
                 SELECT 
-                    user_id,
-                    MAX(first_name) as first_name,
-                    MAX(last_name) as last_name,
-                    MAX(username) as username,
-                    COUNT(DISTINCT chat_id) as total_chats,
-                    MAX(last_activity) as last_seen,
-                    SUM(message_count) as total_messages,
-                    MAX(CASE WHEN chat_type = 'private' THEN 1 ELSE 0 END) as has_private
-                FROM users 
-                GROUP BY user_id
-                ORDER BY last_seen DESC
+                    u.user_id,
+                    MAX(u.first_name) as first_name,
+                    MAX(u.last_name) as last_name,
+                    MAX(u.username) as username,
+                    COUNT(DISTINCT u.chat_id) as total_chats,
+                    MAX(a.last_activity) as last_seen,
+                    COALESCE(SUM(a.message_count), 0) as total_messages,
+                    MAX(CASE WHEN u.chat_type = 'private' THEN 1 ELSE 0 END) as has_private
+                FROM users u
+                LEFT JOIN user_activity a ON a.user_id = u.user_id AND a.chat_id = u.chat_id
+                GROUP BY u.user_id
+                ORDER BY last_seen DESC NULLS LAST
                 LIMIT $1
             """, limit)
 
             return [dict(r) for r in rows]
     except Exception as e:
-        print(f"❌ Foydalanuvchilarni olish xatosi: {e}")
+        log.error(f"❌ Foydalanuvchilarni olish xatosi: {e}")
         return []
 
 
+def is_contacts_stale(group_id: int) -> bool:
+    """Oxirgi get_contacts javobi snapshotdan berilganmi (eskirgan bo'lishi mumkin)"""
+    return group_id in _stale_groups
+
+
+def is_top_unavailable(group_id: Optional[int]) -> bool:
+    """Oxirgi get_top_contacts javobi baza xatosi tufayli bo'shmi (haqiqiy bo'sh reyting emas)"""
+    return group_id in _top_unavailable
+
+
+def _contacts_from_snapshot(group_id: int) -> List[Tuple[str, str]]:
+    """Baza javob bermaganda oxirgi ma'lum kontaktlarni berish"""
+    _stale_groups.add(group_id)
+    metrics.inc("contacts_served_stale")
+    return snapshot.get(group_id) or []
+
+
 async def get_contacts(group_id: int) -> List[Tuple[str, str]]:
-    """Barcha kontaktlarni olish"""
+    """Barcha kontaktlarni olish (keshdan, versiya o'zgarmagan bo'lsa)"""
+    cached = _cache_lookup(_contacts_cache, group_id, group_id)
+    if cached is not None:
+        _stale_groups.discard(group_id)
+        return cached
+
+    if not breaker.allow():
+        return _contacts_from_snapshot(group_id)
+
     try:
         if not pool:
             await init_db()
 
-        async with pool.acquire() as conn:
+        version = get_group_version(group_id)
+        async with _acquire("get_contacts", _read_kind(group_id), timeout=DB_QUERY_TIMEOUT) as conn:
             rows = await conn.fetch("""
                 SELECT service, phone 
                 FROM contacts 
                 WHERE group_id = $1
                 ORDER BY LOWER(service)
-            """, group_id)
+            """, group_id, timeout=DB_QUERY_TIMEOUT)
 
-            return [(r["service"], r["phone"]) for r in rows]
+        breaker.record_success()
+        contacts = [(r["service"], r["phone"]) for r in rows]
+        _contacts_cache[group_id] = (version, time.monotonic(), contacts)
+        _stale_groups.discard(group_id)
+        snapshot.update(group_id, contacts)
+        return contacts
+    except asyncio.CancelledError:
+        breaker.release_probe()
+        raise
     except Exception as e:
-        print(f"❌ Kontaktlarni olish xatosi: {e}")
-        return []
+        breaker.record_failure()
+        log.error(f"❌ Kontaktlarni olish xatosi: {e!r}")
+        return _contacts_from_snapshot(group_id)
 
 
 async def get_contacts_with_clicks(group_id: int) -> List[Tuple[str, str, int]]:
@@ -247,17 +718,23 @@ async def get_contacts_with_clicks(group_id: int) -> List[Tuple[str, str, int]]:
         if not pool:
             await init_db()
 
-        async with pool.acquire() as conn:
+        async with _acquire("get_contacts_with_clicks", _read_kind(group_id)) as conn:
             rows = await conn.fetch("""
-                SELECT service, phone, click_count
-                FROM contacts 
-                WHERE group_id = $1
-                ORDER BY LOWER(service)
+                SELECT c.service, c.phone, COALESCE(r.clicks, 0)::INTEGER AS click_count
+                FROM contacts c
+                LEFT JOIN (
+                    SELECT service, SUM(clicks) AS clicks
+                    FROM contact_click_rollups
+                    WHERE bucket = 'day' AND group_id = $1
+                    GROUP BY service
+                ) r ON r.service = c.service
+                WHERE c.group_id = $1
+                ORDER BY LOWER(c.service)
             """, group_id)
 
             return [(r["service"], r["phone"], r["click_count"]) for r in rows]
     except Exception as e:
-        print(f"❌ Kontaktlarni olish xatosi: {e}")
+        log.error(f"❌ Kontaktlarni olish xatosi: {e}")
         return []
 
 
@@ -267,26 +744,23 @@ async def update_contact(service: str, phone: str, group_id: int) -> bool:
         if not pool:
             await init_db()
 
-        async with pool.acquire() as conn:
-            exists = await conn.fetchval(
-                "SELECT 1 FROM contacts WHERE service = $1 AND group_id = $2",
-                service, group_id
-            )
-
-            if exists:
-                await conn.execute("""
-                    UPDATE contacts 
-                    SET phone = $3, updated_at = NOW() 
-                    WHERE service = $1 AND group_id = $2
-                """, service, group_id, phone)
-            else:
+        async with _acquire("update_contact") as conn:
+            async with conn.transaction():
                 await conn.execute("""
                     INSERT INTO contacts (service, phone, group_id) 
                     VALUES ($1, $2, $3)
+                    ON CONFLICT (service, group_id) DO UPDATE SET
+                        phone = EXCLUDED.phone,
+                        updated_at = NOW()
                 """, service, phone, group_id)
-            return True
+                versions = await _bump_cache_versions(conn, [group_id])
+
+        _apply_cache_versions(versions)
+        return True
     except Exception as e:
-        print(f"❌ Kontakt saqlash xatosi: {e}")
+        log.error(f"❌ Kontakt saqlash xatosi: {e}")
+        if isinstance(e, OUTAGE_ERRORS):
+            return journal.append("contact_update", [service, phone, group_id])
         return False
 
 
@@ -296,65 +770,1015 @@ async def delete_contact(service: str, group_id: int) -> bool:
         if not pool:
             await init_db()
 
-        async with pool.acquire() as conn:
-            result = await conn.execute(
-                "DELETE FROM contacts WHERE service = $1 AND group_id = $2",
-                service, group_id
-            )
-            return "DELETE 1" in result
+        async with _acquire("delete_contact") as conn:
+            async with conn.transaction():
+                result = await conn.execute(
+                    "DELETE FROM contacts WHERE service = $1 AND group_id = $2",
+                    service, group_id
+                )
+                if "DELETE 1" not in result:
+                    return False
+                versions = await _bump_cache_versions(conn, [group_id])
+
+        _apply_cache_versions(versions)
+        return True
     except Exception as e:
-        print(f"❌ Kontakt o'chirish xatosi: {e}")
+        log.error(f"❌ Kontakt o'chirish xatosi: {e}")
+        if isinstance(e, OUTAGE_ERRORS):
+            return journal.append("contact_delete", [service, group_id])
         return False
 
 
 async def increment_click_count(service: str, group_id: int) -> bool:
-    """Kontakt click sonini oshirish"""
+    """Kontakt click sonini oshirish (buferga yoziladi, fon vazifasi bazaga yozadi)"""
+    key = (service, group_id)
+    _click_buffer[key] = _click_buffer.get(key, 0) + 1
+    return True
+
+
+async def _flush_clicks(conn: asyncpg.Connection, clicks: Dict[Tuple[str, int], int],
+                       clicked_at: float = None):
+    """Yig'ilgan clicklarni jurnalga bitta INSERT bilan yozish (clicked_at - unix vaqt, tranzaksiya ichida)"""
+    await conn.execute("SELECT pg_advisory_xact_lock_shared($1)", CLICK_WRITE_LOCK_ID)
+    await conn.execute("""
+        INSERT INTO contact_clicks (service, group_id, clicks, clicked_at)
+        SELECT service, group_id, clicks, COALESCE(to_timestamp($4)::TIMESTAMP, NOW())
+        FROM unnest($1::TEXT[], $2::BIGINT[], $3::INTEGER[]) AS d(service, group_id, clicks)
+    """,
+        [key[0] for key in clicks],
+        [key[1] for key in clicks],
+        list(clicks.values()),
+        clicked_at
+    )
+
+
+def _click_partition_name(day: date) -> str:
+    """Kunlik bo'lim nomi"""
+    return f"contact_clicks_p{day:%Y%m%d}"
+
+
+async def ensure_click_partitions(conn: asyncpg.Connection, days_ahead: int = 2):
+    """Bugungi va keyingi kunlar uchun bo'limlar mavjudligini ta'minlash"""
+    today = await conn.fetchval("SELECT CURRENT_DATE")
+    for offset in range(days_ahead + 1):
+        day = today + timedelta(days=offset)
+        name = _click_partition_name(day)
+        if await conn.fetchval("SELECT to_regclass($1)", name) is not None:
+            continue
+
+        start, end = day.isoformat(), (day + timedelta(days=1)).isoformat()
+        async with conn.transaction():
+            # Shu kunning DEFAULT bo'limga tushgan qatorlari bo'lsa, bo'lim yaratib bo'lmaydi -
+            # ular vaqtincha chetga olinib, yangi bo'limga qaytariladi
+            moved = await conn.fetchval("""
+                SELECT EXISTS (
+                    SELECT 1 FROM contact_clicks_default
+                    WHERE clicked_at >= $1::DATE AND clicked_at < $2::DATE
+                )
+            """, day, day + timedelta(days=1))
+            if moved:
+                await conn.execute("""
+                    CREATE TEMP TABLE moved_clicks (LIKE contact_clicks) ON COMMIT DROP
+                """)
+                await conn.execute("""
+                    WITH taken AS (
+                        DELETE FROM contact_clicks_default
+                        WHERE clicked_at >= $1::DATE AND clicked_at < $2::DATE
+                        RETURNING *
+                    )
+                    INSERT INTO moved_clicks SELECT * FROM taken
+                """, day, day + timedelta(days=1))
+
+            await conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {name} PARTITION OF contact_clicks
+                FOR VALUES FROM ('{start}') TO ('{end}')
+            """)
+            if moved:
+                await conn.execute("INSERT INTO contact_clicks SELECT * FROM moved_clicks")
+        log.info(f"🧱 Click bo'limi yaratildi: {name}")
+
+
+async def drop_old_click_partitions(conn: asyncpg.Connection) -> int:
+    """Saqlash muddati o'tgan bo'limlarni o'chirish"""
+    rows = await conn.fetch("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'contact_clicks'::regclass
+    """)
+    today = await conn.fetchval("SELECT CURRENT_DATE")
+    cutoff = today - timedelta(days=CLICK_RAW_RETENTION_DAYS)
+
+    dropped = 0
+    for row in rows:
+        match = re.match(r"^contact_clicks_p(\d{8})$", row["relname"])
+        if not match:
+            continue
+        if datetime.strptime(match.group(1), "%Y%m%d").date() < cutoff:
+            await conn.execute(f"DROP TABLE IF EXISTS {row['relname']}")
+            dropped += 1
+
+    await conn.execute("DELETE FROM contact_clicks_default WHERE clicked_at < $1::DATE", cutoff)
+
+    await conn.execute("""
+        DELETE FROM contact_click_rollups
+        WHERE bucket = 'hour' AND bucket_start < NOW() - make_interval(days => $1)
+    """, CLICK_HOURLY_RETENTION_DAYS)
+
+    return dropped
+
+
+async def rollup_clicks() -> int:
+    """Jurnaldagi yangi clicklarni soatlik va kunlik yig'indilarga qo'shish"""
     try:
         if not pool:
             await init_db()
 
-        async with pool.acquire() as conn:
-            await conn.execute("""
-                UPDATE contacts 
-                SET click_count = click_count + 1 
-                WHERE service = $1 AND group_id = $2
-            """, service, group_id)
-            return True
+        async with _acquire("rollup_clicks") as conn:
+            async with conn.transaction():
+                # Yozayotgan tranzaksiya bo'lsa kutilmaydi (kutish yangi yozuvchilarni ham to'xtatadi) -
+                # keyingi safar yig'iladi. Qulf olingach, ketma-ketlikdagi barcha id lar commit bo'lgan
+                if not await conn.fetchval("SELECT pg_try_advisory_xact_lock($1)", CLICK_WRITE_LOCK_ID):
+                    metrics.inc("click_rollups_deferred")
+                    return 0
+                safe_id = await conn.fetchval(
+                    "SELECT COALESCE(pg_sequence_last_value('contact_clicks_id_seq'), 0)"
+                )
+
+            async with conn.transaction():
+                # FOR UPDATE - bir vaqtda faqat bitta worker yig'adi
+                last_id = await conn.fetchval(
+                    "SELECT last_click_id FROM click_rollup_state WHERE id = 1 FOR UPDATE"
+                )
+                upper_id = min(safe_id, last_id + CLICK_ROLLUP_BATCH)
+                if upper_id <= last_id:
+                    return 0
+
+                row = await conn.fetchrow("""
+                    WITH taken AS (
+                        SELECT group_id, service, clicks, clicked_at
+                        FROM contact_clicks
+                        WHERE id > $1 AND id <= $2
+                    ),
+                    hourly AS (
+                        INSERT INTO contact_click_rollups (bucket, bucket_start, group_id, service, clicks)
+                        SELECT 'hour', date_trunc('hour', clicked_at), group_id, service, SUM(clicks)
+                        FROM taken
+                        GROUP BY 2, 3, 4
+                        ON CONFLICT (bucket, group_id, bucket_start, service)
+                        DO UPDATE SET clicks = contact_click_rollups.clicks + EXCLUDED.clicks
+                        RETURNING group_id
+                    ),
+                    daily AS (
+                        INSERT INTO contact_click_rollups (bucket, bucket_start, group_id, service, clicks)
+                        SELECT 'day', date_trunc('day', clicked_at), group_id, service, SUM(clicks)
+                        FROM taken
+                        GROUP BY 2, 3, 4
+                        ON CONFLICT (bucket, group_id, bucket_start, service)
+                        DO UPDATE SET clicks = contact_click_rollups.clicks + EXCLUDED.clicks
+                        RETURNING group_id
+                    )
+                    SELECT
+                        (SELECT COUNT(*) FROM taken) AS taken,
+                        ARRAY(SELECT DISTINCT group_id FROM hourly) AS group_ids
+                """, last_id, upper_id)
+                await conn.execute(
+                    "UPDATE click_rollup_state SET last_click_id = $1 WHERE id = 1", upper_id
+                )
+                if not row["taken"]:
+                    return 0
+
+                versions = await _bump_cache_versions(conn, list(row["group_ids"]), clicks=True)
+
+        _apply_cache_versions(versions)
+        metrics.inc("click_rollups")
+        return row["taken"]
+    except Exception as e:
+        log.warning(f"⚠️ Clicklarni yig'ish xatosi: {e}")
+        return 0
+
+
+async def maintain_click_partitions():
+    """Bo'limlarni oldindan yaratish va eskilarini o'chirish"""
+    try:
+        if not pool:
+            await init_db()
+
+        async with _acquire("maintain_click_partitions") as conn:
+            await ensure_click_partitions(conn)
+            dropped = await drop_old_click_partitions(conn)
+            if dropped:
+                log.info(f"🧹 {dropped} ta eski click bo'limi o'chirildi")
+    except Exception as e:
+        log.warning(f"⚠️ Click bo'limlarini yangilash xatosi: {e}")
+
+
+async def _rollup_job():
+    """Clicklarni muntazam yig'ish va bo'limlarni soatiga bir marta yangilash"""
+    last_maintenance = 0.0
+    while True:
+        if time.monotonic() - last_maintenance >= 3600:
+            await maintain_click_partitions()
+            last_maintenance = time.monotonic()
+
+        await rollup_clicks()
+        await asyncio.sleep(CLICK_ROLLUP_INTERVAL)
+
+
+def start_rollup_job():
+    """Click yig'uvchini fon vazifasi sifatida ishga tushirish"""
+    global _rollup_task
+    if _rollup_task is None or _rollup_task.done():
+        _rollup_task = asyncio.create_task(_rollup_job())
+
+
+def _restore_buffers(activity: Dict[Tuple[int, int], List], clicks: Dict[Tuple[str, int], int]):
+    """Yozib bo'lmagan ma'lumotlarni buferga qaytarish"""
+    for key, (count, command) in activity.items():
+        entry = _activity_buffer.get(key)
+        if entry is None:
+            _activity_buffer[key] = [count, command]
+        else:
+            entry[0] += count
+            entry[1] = entry[1] or command
+
+    for key, count in clicks.items():
+        _click_buffer[key] = _click_buffer.get(key, 0) + count
+
+
+def _mark_activity_written(keys):
+    """Faollik yozilgan vaqtni eslab qolish (eng eskilari chiqarib yuboriladi)"""
+    now = time.monotonic()
+    for key in keys:
+        _activity_written_at[key] = now
+        _activity_written_at.move_to_end(key)
+
+    # Chiqarilgan foydalanuvchining keyingi faolligi darhol yoziladi - hisob yo'qolmaydi
+    while len(_activity_written_at) > ACTIVITY_TRACK_SIZE:
+        _activity_written_at.popitem(last=False)
+
+
+def _take_due_activity(force: bool = False) -> Dict[Tuple[int, int], List]:
+    """Yozish vaqti kelgan faollikni buferdan olish (qolganlari yig'ilib turadi)"""
+    global _activity_buffer
+    if force or ACTIVITY_GRANULARITY <= 0:
+        activity, _activity_buffer = _activity_buffer, {}
+        return activity
+
+    now = time.monotonic()
+    due = {}
+    for key in list(_activity_buffer):
+        written_at = _activity_written_at.get(key)
+        if written_at is None or now - written_at >= ACTIVITY_GRANULARITY:
+            due[key] = _activity_buffer.pop(key)
+    return due
+
+
+async def apply_journal_segment(segment_id: str, records: List[dict]) -> bool:
+    """Jurnal segmentini bitta tranzaksiyada qo'llash (qayta qo'llansa o'tkazib yuboriladi)"""
+    try:
+        if not pool:
+            await init_db()
+
+        # Raw bo'limi o'chirilgan kunlarga yozib bo'lmaydi - eng eski saqlanadigan kunga suriladi
+        oldest_click_at = time.time() - (CLICK_RAW_RETENTION_DAYS - 1) * 86400
+        activity: Dict[Tuple[int, int], List] = {}
+        versions: Dict[int, int] = {}
+
+        async with _acquire("apply_journal_segment") as conn:
+            async with conn.transaction():
+                inserted = await conn.fetchval("""
+                    INSERT INTO journal_segments (segment_id) VALUES ($1)
+                    ON CONFLICT (segment_id) DO NOTHING
+                    RETURNING 1
+                """, segment_id)
+                if not inserted:
+                    metrics.inc("journal_segments_skipped")
+                    return True
+
+                changed_groups = set()
+                for record in records:
+                    op, data = record["op"], record["data"]
+                    if op == "activity":
+                        for user_id, chat_id, count, command in data:
+                            entry = activity.setdefault((user_id, chat_id), [0, None])
+                            entry[0] += count
+                            entry[1] = command or entry[1]
+                    elif op == "clicks":
+                        await _flush_clicks(
+                            conn,
+                            {(service, group_id): count for service, group_id, count in data},
+                            clicked_at=max(record["at"], oldest_click_at)
+                        )
+                    elif op == "user":
+                        await _upsert_user(conn, *data)
+                    elif op == "contact_update":
+                        service, phone, group_id = data
+                        # Keyinroq boshqa joyda qilingan o'zgarishni eski yozuv bilan bosib ketmaslik
+                        await conn.execute("""
+                            INSERT INTO contacts (service, phone, group_id, updated_at)
+                            VALUES ($1, $2, $3, to_timestamp($4)::TIMESTAMP)
+                            ON CONFLICT (service, group_id) DO UPDATE SET
+                                phone = EXCLUDED.phone,
+                                updated_at = EXCLUDED.updated_at
+                            WHERE contacts.updated_at < EXCLUDED.updated_at
+                        """, service, phone, group_id, record["at"])
+                        changed_groups.add(group_id)
+                    elif op == "contact_delete":
+                        service, group_id = data
+                        await conn.execute("""
+                            DELETE FROM contacts
+                            WHERE service = $1 AND group_id = $2
+                              AND updated_at <= to_timestamp($3)::TIMESTAMP
+                        """, service, group_id, record["at"])
+                        changed_groups.add(group_id)
+                    else:
+                        raise ValueError(f"Noma'lum jurnal yozuvi: {op}")
+
+                if activity:
+                    await _flush_activity(conn, activity)
+                versions = await _bump_cache_versions(conn, list(changed_groups))
+
+                await conn.execute(
+                    "DELETE FROM journal_segments WHERE applied_at < NOW() - INTERVAL '30 days'"
+                )
+
+        _apply_cache_versions(versions)
+        log.info(f"📓 Jurnal segmenti bazaga yozildi: {segment_id} ({len(records)} ta yozuv)")
+        return True
+    except OUTAGE_ERRORS as e:
+        log.warning(f"⚠️ Jurnalni yozib bo'lmadi, keyinroq qayta urinamiz: {e}")
+        return False
+
+
+async def flush_buffers(force: bool = False) -> bool:
+    """Buferdagi faollik va clicklarni bazaga yozish (force - hammasini darhol)"""
+    global _click_buffer
+    activity = _take_due_activity(force)
+    if not activity and not _click_buffer:
+        return True
+
+    clicks, _click_buffer = _click_buffer, {}
+
+    try:
+        if not pool:
+            await init_db()
+
+        async with _acquire("flush_buffers") as conn:
+            async with conn.transaction():
+                if activity:
+                    await _flush_activity(conn, activity)
+                if clicks:
+                    await _flush_clicks(conn, clicks)
+
+        _mark_activity_written(activity)
+        metrics.inc("flushed_activity", len(activity))
+        metrics.inc("flushed_clicks", len(clicks))
+        return True
     except Exception as e:
-        print(f"❌ Click count oshirish xatosi: {e}")
+        log.warning(f"⚠️ Buferni yozish xatosi: {e}")
+        if isinstance(e, OUTAGE_ERRORS):
+            # Baza qaytgach jurnaldan yoziladi; jurnal to'lgan bo'lsa xotirada qoladi
+            if activity and journal.append("activity", [[*key, *value] for key, value in activity.items()]):
+                activity = {}
+            if clicks and journal.append("clicks", [[*key, count] for key, count in clicks.items()]):
+                clicks = {}
+        _restore_buffers(activity, clicks)
         return False
 
 
-async def get_top_contacts(limit: int = 8, group_id: int = None) -> List[Tuple[str, str, int]]:
-    """Eng ko'p bosilgan kontaktlarni olish"""
+async def _flusher(stop: asyncio.Event):
+    """Buferlarni muntazam yozib turish (yozish o'rtasida bekor qilinmaydi)"""
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=DB_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        await flush_buffers()
+
+
+def start_flusher():
+    """Bufer yozuvchisini fon vazifasi sifatida ishga tushirish"""
+    global _flusher_task, _flusher_stop
+    if _flusher_task is None or _flusher_task.done():
+        _flusher_stop = asyncio.Event()
+        _flusher_task = asyncio.create_task(_flusher(_flusher_stop))
+
+
+async def stop_flusher():
+    """Bufer yozuvchisini to'xtatib, qolganlarini yozish"""
+    if _flusher_task is not None:
+        _flusher_stop.set()
+        await _flusher_task
+
+    await flush_buffers(force=True)
+
+
+async def get_top_contacts(limit: int = 8, group_id: int = None,
+                           days: int = None) -> List[Tuple[str, str, int]]:
+    """Eng ko'p bosilgan kontaktlarni olish (kunlik yig'indilardan, days - oxirgi N kun)"""
+    if group_id is not None:
+        cached = _cache_lookup(_top_cache.get(group_id, {}), (limit, days), group_id, with_clicks=True)
+        if cached is not None:
+            _top_unavailable.discard(group_id)
+            return cached
+
+        if not breaker.allow():
+            _top_unavailable.add(group_id)
+            return []
+
     try:
         if not pool:
             await init_db()
 
-        async with pool.acquire() as conn:
+        version = get_group_version(group_id, with_clicks=True) if group_id is not None else 0
+        kind = "heavy" if group_id is None else _read_kind(group_id)
+        timeout = None if group_id is None else DB_QUERY_TIMEOUT
+        async with _acquire("get_top_contacts", kind, timeout=timeout) as conn:
             if group_id is None:
-                rows = await conn.fetch(f"""
-                    SELECT service, phone, click_count
-                    FROM contacts 
-                    WHERE click_count > 0
+                rows = await conn.fetch("""
+                    SELECT c.service, c.phone, SUM(r.clicks)::INTEGER AS click_count
+                    FROM contact_click_rollups r
+                    JOIN contacts c ON c.group_id = r.group_id AND c.service = r.service
+                    WHERE r.bucket = 'day'
+                      AND ($2::INTEGER IS NULL
+                           OR r.bucket_start >= date_trunc('day', NOW()) - make_interval(days => $2))
+                    GROUP BY c.group_id, c.service, c.phone
+                    HAVING SUM(r.clicks) > 0
                     ORDER BY click_count DESC
                     LIMIT $1
-                """, limit)
+                """, limit, days)
             else:
-                rows = await conn.fetch(f"""
-                    SELECT service, phone, click_count
-                    FROM contacts 
-                    WHERE group_id = $1 AND click_count > 0
+                rows = await conn.fetch("""
+                    SELECT c.service, c.phone, SUM(r.clicks)::INTEGER AS click_count
+                    FROM contact_click_rollups r
+                    JOIN contacts c ON c.group_id = r.group_id AND c.service = r.service
+                    WHERE r.bucket = 'day' AND r.group_id = $1
+                      AND ($3::INTEGER IS NULL
+                           OR r.bucket_start >= date_trunc('day', NOW()) - make_interval(days => $3))
+                    GROUP BY c.service, c.phone
+                    HAVING SUM(r.clicks) > 0
                     ORDER BY click_count DESC
                     LIMIT $2
-                """, group_id, limit)
+                """, group_id, limit, days, timeout=timeout)
+                breaker.record_success()
 
-            return [(r["service"], r["phone"], r["click_count"]) for r in rows]
+            top_contacts = [(r["service"], r["phone"], r["click_count"]) for r in rows]
+            _top_unavailable.discard(group_id)
+            if group_id is not None:
+                _top_cache.setdefault(group_id, {})[(limit, days)] = (version, time.monotonic(), top_contacts)
+            return top_contacts
+    except asyncio.CancelledError:
+        if group_id is not None:
+            breaker.release_probe()
+        raise
+    except Exception as e:
+        if group_id is not None:
+            breaker.record_failure()
+        _top_unavailable.add(group_id)
+        log.error(f"❌ Top kontaktlarni olish xatosi: {e!r}")
+        return []
+
+
+async def load_trending_scores() -> List[Tuple[int, str, str, float, float]]:
+    """Saqlangan trending ballarini olish"""
+    try:
+        if not pool:
+            await init_db()
+
+        async with _acquire("load_trending_scores", "heavy") as conn:
+            rows = await conn.fetch("""
+                SELECT group_id, service, phone, score, score_at
+                FROM contact_trending
+            """)
+            return [(r["group_id"], r["service"], r["phone"], r["score"], r["score_at"]) for r in rows]
+    except Exception as e:
+        log.error(f"❌ Trending ballarini olish xatosi: {e}")
+        return []
+
+
+async def save_trending_scores(rows: List[Tuple[int, str, str, float, float]],
+                               removed: List[Tuple[int, str]] = None,
+                               decay_rate: float = 0.0) -> Optional[List[Tuple[int, str, float, float]]]:
+    """Trending ballarini bitta so'rov bilan saqlash.
+    Bir nechta worker bir qatorga yozadi - bazadagi ball yozilayotgan vaqtga keltirilib,
+    kattasi qoldiriladi. Birlashtirilgan (group_id, service, ball, vaqt) lar qaytariladi, xatoda None"""
+    try:
+        if not pool:
+            await init_db()
+
+        merged = []
+        async with _acquire("save_trending_scores") as conn:
+            async with conn.transaction():
+                if rows:
+                    merged = await conn.fetch("""
+                        INSERT INTO contact_trending AS t (group_id, service, phone, score, score_at)
+                        SELECT * FROM unnest($1::BIGINT[], $2::TEXT[], $3::TEXT[],
+                                             $4::DOUBLE PRECISION[], $5::DOUBLE PRECISION[])
+                        ON CONFLICT (group_id, service) DO UPDATE SET
+                            phone = EXCLUDED.phone,
+                            score = GREATEST(
+                                EXCLUDED.score,
+                                t.score * exp(-$6::DOUBLE PRECISION * (EXCLUDED.score_at - t.score_at))
+                            ),
+                            score_at = EXCLUDED.score_at
+                        RETURNING group_id, service, score, score_at
+                    """, *[list(column) for column in zip(*rows)], decay_rate)
+
+                if removed:
+                    await conn.execute("""
+                        DELETE FROM contact_trending t
+                        USING unnest($1::BIGINT[], $2::TEXT[]) AS d(group_id, service)
+                        WHERE t.group_id = d.group_id AND t.service = d.service
+                    """, [key[0] for key in removed], [key[1] for key in removed])
+            return [(r["group_id"], r["service"], r["score"], r["score_at"]) for r in merged]
+    except Exception as e:
+        log.error(f"❌ Trending ballarini saqlash xatosi: {e}")
+        return None
+
+
+async def get_group_ids() -> Optional[List[int]]:
+    """Ruxsat berilgan guruhlar ID lari"""
+    try:
+        if not pool:
+            await init_db()
+
+        async with _acquire("get_group_ids") as conn:
+            rows = await conn.fetch("SELECT group_id FROM groups WHERE removed_at IS NULL")
+            return [r["group_id"] for r in rows]
+    except Exception as e:
+        log.error(f"❌ Guruhlarni olish xatosi: {e}")
+        return None
+
+
+async def get_groups() -> List[dict]:
+    """Ruxsat berilgan guruhlar ro'yxati"""
+    try:
+        if not pool:
+            await init_db()
+
+        async with _acquire("get_groups", "read") as conn:
+            rows = await conn.fetch("""
+                SELECT group_id, title, added_by, added_at
+                FROM groups
+                WHERE removed_at IS NULL
+                ORDER BY added_at
+            """)
+            return [dict(r) for r in rows]
+    except Exception as e:
+        log.error(f"❌ Guruhlarni olish xatosi: {e}")
+        return []
+
+
+async def add_groups(group_ids: List[int], title: str = None, added_by: int = None) -> bool:
+    """Guruh(lar)ni ruxsat berilganlar ro'yxatiga qo'shish"""
+    if not group_ids:
+        return True
+
+    try:
+        if not pool:
+            await init_db()
+
+        async with _acquire("add_groups") as conn:
+            await conn.execute("""
+                INSERT INTO groups (group_id, title, added_by)
+                SELECT unnest($1::BIGINT[]), $2, $3
+                ON CONFLICT (group_id) DO UPDATE SET
+                    title = COALESCE(EXCLUDED.title, groups.title),
+                    removed_at = NULL
+            """, group_ids, title, added_by)
+            return True
+    except Exception as e:
+        log.error(f"❌ Guruh qo'shish xatosi: {e}")
+        return False
+
+
+async def seed_groups(group_ids: List[int]) -> bool:
+    """.env dagi guruhlarni jadvalga qo'shish (mavjud va o'chirilganlariga tegmaydi)"""
+    if not group_ids:
+        return True
+
+    try:
+        if not pool:
+            await init_db()
+
+        async with _acquire("seed_groups") as conn:
+            existing = await conn.fetch(
+                "SELECT group_id FROM groups WHERE group_id = ANY($1::BIGINT[])", group_ids
+            )
+            missing = sorted(set(group_ids) - {r["group_id"] for r in existing})
+            if missing:
+                await conn.execute("""
+                    INSERT INTO groups (group_id)
+                    SELECT unnest($1::BIGINT[])
+                    ON CONFLICT (group_id) DO NOTHING
+                """, missing)
+            return True
+    except Exception as e:
+        log.error(f"❌ Guruhlarni yozish xatosi: {e}")
+        return False
+
+
+async def remove_group(group_id: int) -> bool:
+    """Guruhni ruxsat berilganlar ro'yxatidan olib tashlash"""
+    try:
+        if not pool:
+            await init_db()
+
+        async with _acquire("remove_group") as conn:
+            # Yozuv o'chirilmaydi - aks holda seed_groups uni keyingi ishga tushishda qaytaradi
+            result = await conn.execute(
+                "UPDATE groups SET removed_at = NOW() WHERE group_id = $1 AND removed_at IS NULL", group_id
+            )
+            return "UPDATE 1" in result
+    except Exception as e:
+        log.error(f"❌ Guruh o'chirish xatosi: {e}")
+        return False
+
+
+def register_channel(channel: str, on_notify: Callable[[str], Awaitable[None]],
+                     on_reconnect: Callable[[], Awaitable[None]] = None):
+    """LISTEN kanali uchun handler qo'shish (start_listener dan oldin)"""
+    _channel_handlers[channel] = (on_notify, on_reconnect)
+
+
+def _dispatch_notification(conn, pid, channel: str, payload: str):
+    """NOTIFY kelganda handlerni fon vazifasida ishga tushirish"""
+    handler = _channel_handlers.get(channel)
+    if handler is not None:
+        metrics.inc(f"notify_{channel}")
+        task = asyncio.create_task(handler[0](payload))
+        _notify_tasks.add(task)
+        task.add_done_callback(_notify_task_done)
+
+
+def _notify_task_done(task: asyncio.Task):
+    """Tugagan handlerni ro'yxatdan olish va xatosini yozish"""
+    _notify_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        metrics.inc("notify_handler_errors")
+        log.error(f"❌ NOTIFY handler xatosi: {task.exception()!r}")
+
+
+async def _listener_loop():
+    """Alohida ulanishda LISTEN qilish, uzilsa backoff bilan qayta ulanish"""
+    delay = 1.0
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(DATABASE_URL)
+            for channel in _channel_handlers:
+                await conn.add_listener(channel, _dispatch_notification)
+            metrics.inc("db_listener_connects")
+            delay = 1.0
+
+            # Uzilish vaqtida o'tkazib yuborilgan xabarlar o'rniga to'liq yangilash
+            for _, on_reconnect in _channel_handlers.values():
+                if on_reconnect is not None:
+                    await on_reconnect()
+
+            while not conn.is_closed():
+                await asyncio.sleep(DB_HEALTH_INTERVAL)
+                await conn.execute("SELECT 1", timeout=5)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning(f"⚠️ LISTEN ulanishi uzildi: {e}")
+        finally:
+            if conn is not None and not conn.is_closed():
+                conn.terminate()
+
+        await asyncio.sleep(delay + random.uniform(0, delay / 2))
+        delay = min(delay * 2, 60.0)
+
+
+def start_listener():
+    """LISTEN ulanishini fon vazifasi sifatida ishga tushirish"""
+    global _listener_task
+    if _channel_handlers and (_listener_task is None or _listener_task.done()):
+        _listener_task = asyncio.create_task(_listener_loop())
+
+
+async def create_broadcast(text: str, created_by: int, progress_chat_id: int,
+                           progress_message_id: int) -> Optional[int]:
+    """Yangi ommaviy xabar yaratish"""
+    try:
+        if not pool:
+            await init_db()
+
+        async with _acquire("create_broadcast") as conn:
+            total = await conn.fetchval("""
+                SELECT COUNT(DISTINCT u.user_id)
+                FROM users u
+                WHERE u.chat_type = 'private'
+                  AND NOT EXISTS (SELECT 1 FROM blocked_users b WHERE b.user_id = u.user_id)
+            """)
+            return await conn.fetchval("""
+                INSERT INTO broadcasts 
+                (text, created_by, total_count, progress_chat_id, progress_message_id)
+                VALUES ($1, $2, $3, $4, $5)
+                RETURNING id
+            """, text, created_by, total, progress_chat_id, progress_message_id)
+    except Exception as e:
+        log.error(f"❌ Ommaviy xabar yaratish xatosi: {e}")
+        return None
+
+
+async def get_running_broadcasts() -> List[dict]:
+    """Tugallanmagan ommaviy xabarlarni olish"""
+    try:
+        if not pool:
+            await init_db()
+
+        async with _acquire("get_running_broadcasts") as conn:
+            rows = await conn.fetch("""
+                SELECT * FROM broadcasts 
+                WHERE status = 'running'
+                ORDER BY id
+            """)
+            return [dict(r) for r in rows]
     except Exception as e:
-        print(f"❌ Top kontaktlarni olish xatosi: {e}")
+        log.error(f"❌ Ommaviy xabarlarni olish xatosi: {e}")
         return []
 
 
+async def get_broadcast_recipients(after_user_id: int, limit: int = 500) -> Optional[List[int]]:
+    """Shaxsiy chatdagi foydalanuvchilarni keyset bo'yicha olish"""
+    try:
+        if not pool:
+            await init_db()
+
+        async with _acquire("get_broadcast_recipients", "heavy") as conn:
+            rows = await conn.fetch("""
+                SELECT DISTINCT u.user_id
+                FROM users u
+                WHERE u.chat_type = 'private'
+                  AND u.user_id > $1
+                  AND NOT EXISTS (SELECT 1 FROM blocked_users b WHERE b.user_id = u.user_id)
+                ORDER BY u.user_id
+                LIMIT $2
+            """, after_user_id, limit)
+
+            return [r["user_id"] for r in rows]
+    except Exception as e:
+        log.error(f"❌ Qabul qiluvchilarni olish xatosi: {e}")
+        return None
+
+
+async def save_broadcast_progress(broadcast_id: int, last_user_id: int, sent: int,
+                                  failed: int, blocked: int, status: str = "running") -> bool:
+    """Ommaviy xabar holatini saqlash"""
+    try:
+        if not pool:
+            await init_db()
+
+        async with _acquire("save_broadcast_progress") as conn:
+            await conn.execute("""
+                UPDATE broadcasts 
+                SET last_user_id = $2,
+                    sent_count = $3,
+                    failed_count = $4,
+                    blocked_count = $5,
+                    status = $6,
+                    finished_at = CASE WHEN $6 = 'running' THEN NULL ELSE NOW() END
+                WHERE id = $1
+            """, broadcast_id, last_user_id, sent, failed, blocked, status)
+            return True
+    except Exception as e:
+        log.error(f"❌ Ommaviy xabar holatini saqlash xatosi: {e}")
+        return False
+
+
+async def mark_users_blocked(user_ids: List[int]) -> bool:
+    """Botni bloklagan foydalanuvchilarni belgilash"""
+    if not user_ids:
+        return True
+
+    try:
+        if not pool:
+            await init_db()
+
+        async with _acquire("mark_users_blocked") as conn:
+            await conn.execute("""
+                INSERT INTO blocked_users (user_id)
+                SELECT unnest($1::BIGINT[])
+                ON CONFLICT (user_id) DO NOTHING
+            """, user_ids)
+            return True
+    except Exception as e:
+        log.error(f"❌ Bloklanganlarni saqlash xatosi: {e}")
+        return False
+
+
+def get_group_version(group_id: int, with_clicks: bool = False):
+    """Guruh kontaktlarining joriy versiyasi (with_clicks - click sonlari ko'rsatiladigan
+    ma'lumotlar uchun (kontaktlar, clicklar) juftligi)"""
+    if with_clicks:
+        return group_versions.get(group_id, 0), click_versions.get(group_id, 0)
+    return group_versions.get(group_id, 0)
+
+
+def set_group_version(group_id: int, version: int, clicks_version: int = 0):
+    """Yangiroq versiya kelganda guruh keshlarini tashlab yuborish"""
+    if version > group_versions.get(group_id, 0):
+        group_versions[group_id] = version
+        if DATABASE_REPLICA_URL:
+            _primary_until[group_id] = time.monotonic() + DB_REPLICA_LAG_WINDOW
+        _contacts_cache.pop(group_id, None)
+        _top_cache.pop(group_id, None)
+        metrics.inc("cache_invalidations")
+
+    if clicks_version > click_versions.get(group_id, 0):
+        click_versions[group_id] = clicks_version
+        _top_cache.pop(group_id, None)
+        metrics.inc("click_cache_invalidations")
+
+
+def _apply_cache_versions(versions: Dict[int, Tuple[int, int]]):
+    """Bazadan qaytgan (kontaktlar, clicklar) versiyalarini qo'llash"""
+    for group_id, (version, clicks_version) in versions.items():
+        set_group_version(group_id, version, clicks_version)
+
+
+def _cache_lookup(cache: dict, key, group_id: int, with_clicks: bool = False):
+    """Keshdagi qiymat (versiya mos va TTL o'tmagan bo'lsa)"""
+    entry = cache.get(key)
+    if entry is None:
+        metrics.inc("cache_misses")
+        return None
+
+    version, cached_at, value = entry
+    if version != get_group_version(group_id, with_clicks) or time.monotonic() - cached_at > CACHE_TTL:
+        cache.pop(key, None)
+        metrics.inc("cache_misses")
+        return None
+
+    metrics.inc("cache_hits")
+    return value
+
+
+async def _bump_cache_versions(conn: asyncpg.Connection, group_ids: List[int],
+                               clicks: bool = False) -> Dict[int, Tuple[int, int]]:
+    """Guruhlar kontaktlar (clicks=True bo'lsa - clicklar) versiyasini oshirish va boshqa
+    workerlarga NOTIFY yuborish (tranzaksiya ichida chaqiriladi - NOTIFY commitdan keyin yetib boradi)"""
+    if not group_ids:
+        return {}
+
+    rows = await conn.fetch("""
+        INSERT INTO cache_versions (group_id, version, clicks_version)
+        SELECT group_id, CASE WHEN $2 THEN 0 ELSE 1 END, CASE WHEN $2 THEN 1 ELSE 0 END
+        FROM unnest($1::BIGINT[]) AS group_id
+        ON CONFLICT (group_id) DO UPDATE
+        SET version = cache_versions.version + EXCLUDED.version,
+            clicks_version = cache_versions.clicks_version + EXCLUDED.clicks_version
+        RETURNING group_id, version, clicks_version
+    """, group_ids, clicks)
+    versions = {r["group_id"]: (r["version"], r["clicks_version"]) for r in rows}
+
+    await conn.execute(
+        "SELECT pg_notify('cache_invalidate', payload) FROM unnest($1::TEXT[]) AS payload",
+        [
+            json.dumps({"group_id": group_id, "version": version, "clicks_version": clicks_version})
+            for group_id, (version, clicks_version) in versions.items()
+        ]
+    )
+    return versions
+
+
+async def _on_cache_notify(payload: str):
+    """Boshqa workerdan kelgan invalidatsiya"""
+    try:
+        data = json.loads(payload)
+        set_group_version(int(data["group_id"]), int(data["version"]), int(data.get("clicks_version", 0)))
+    except (ValueError, KeyError, TypeError) as e:
+        log.warning(f"⚠️ Noto'g'ri cache_invalidate xabari: {payload!r} ({e})")
+
+
+async def sync_cache_versions():
+    """O'tkazib yuborilgan NOTIFY lar uchun versiyalarni bazadan tekshirish"""
+    group_ids = list(set(_contacts_cache) | set(_top_cache) | set(group_versions))
+    if not group_ids:
+        return
+
+    try:
+        if not pool:
+            await init_db()
+
+        async with _acquire("sync_cache_versions") as conn:
+            rows = await conn.fetch("""
+                SELECT group_id, version, clicks_version
+                FROM cache_versions
+                WHERE group_id = ANY($1::BIGINT[])
+            """, group_ids)
+        _apply_cache_versions({r["group_id"]: (r["version"], r["clicks_version"]) for r in rows})
+    except Exception as e:
+        log.warning(f"⚠️ Kesh versiyalarini tekshirish xatosi: {e}")
+
+
+async def warm_caches(group_ids: List[int], top_limit: int = 8) -> Dict[str, int]:
+    """Ishga tushishda barcha guruhlar kontaktlari, reytingi va faol foydalanuvchilarni
+    bir nechta oqimli so'rov bilan yuklash"""
+    stats = {"groups": len(group_ids), "contacts": 0, "top": 0, "users": 0}
+    try:
+        if not pool:
+            await init_db()
+
+        async with _acquire("warm_caches", "heavy") as conn:
+            # Barcha so'rovlar bitta snapshotdan - kesh versiyasi ma'lumotga mos keladi
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                rows = await conn.fetch("""
+                    SELECT group_id, version, clicks_version
+                    FROM cache_versions
+                    WHERE group_id = ANY($1::BIGINT[])
+                """, group_ids)
+                versions = {group_id: (0, 0) for group_id in group_ids}
+                versions.update((r["group_id"], (r["version"], r["clicks_version"])) for r in rows)
+                _apply_cache_versions(versions)
+
+                now = time.monotonic()
+                contacts: Dict[int, List[Tuple[str, str]]] = {group_id: [] for group_id in group_ids}
+                async for r in conn.cursor("""
+                    SELECT group_id, service, phone
+                    FROM contacts
+                    WHERE group_id = ANY($1::BIGINT[])
+                    ORDER BY group_id, LOWER(service)
+                """, group_ids, prefetch=1000):
+                    contacts[r["group_id"]].append((r["service"], r["phone"]))
+                    stats["contacts"] += 1
+
+                for group_id, rows in contacts.items():
+                    _contacts_cache[group_id] = (versions[group_id][0], now, rows)
+                    snapshot.update(group_id, rows)
+
+                top: Dict[int, List[Tuple[str, str, int]]] = {group_id: [] for group_id in group_ids}
+                async for r in conn.cursor("""
+                    SELECT group_id, service, phone, click_count
+                    FROM (
+                        SELECT c.group_id, c.service, c.phone, SUM(r.clicks)::INTEGER AS click_count,
+                               ROW_NUMBER() OVER (PARTITION BY c.group_id ORDER BY SUM(r.clicks) DESC) AS rn
+                        FROM contact_click_rollups r
+                        JOIN contacts c ON c.group_id = r.group_id AND c.service = r.service
+                        WHERE r.bucket = 'day' AND r.group_id = ANY($1::BIGINT[])
+                        GROUP BY c.group_id, c.service, c.phone
+                        HAVING SUM(r.clicks) > 0
+                    ) ranked
+                    WHERE rn <= $2
+                    ORDER BY group_id, click_count DESC
+                """, group_ids, top_limit, prefetch=1000):
+                    top[r["group_id"]].append((r["service"], r["phone"], r["click_count"]))
+                    stats["top"] += 1
+
+                for group_id, rows in top.items():
+                    _top_cache.setdefault(group_id, {})[(top_limit, None)] = (versions[group_id], now, rows)
+
+                # Eng so'nggi faollar oxirida - LRU da ular saqlanib qoladi
+                async for r in conn.cursor("""
+                    SELECT u.user_id, u.chat_id, u.first_name, u.last_name, u.username,
+                           u.language_code, u.is_premium, u.chat_type
+                    FROM user_activity a
+                    JOIN users u ON u.user_id = a.user_id AND u.chat_id = a.chat_id
+                    WHERE a.last_activity > NOW() - make_interval(days => $1)
+                    ORDER BY a.last_activity
+                """, WARMUP_ACTIVE_DAYS, prefetch=1000):
+                    _remember_profile(
+                        (r["user_id"], r["chat_id"]),
+                        profile_fingerprint(r["first_name"], r["last_name"], r["username"],
+                                            r["language_code"], r["is_premium"], r["chat_type"])
+                    )
+                    stats["users"] += 1
+
+        return stats
+    except Exception as e:
+        log.warning(f"⚠️ Keshlarni oldindan yuklash xatosi: {e}")
+        return stats
+
+
+async def _cache_sync_loop():
+    """Versiyalarni muntazam tekshirish (NOTIFY uchun zaxira)"""
+    while True:
+        await asyncio.sleep(CACHE_VERSION_CHECK_INTERVAL)
+        await sync_cache_versions()
+
+
+def start_cache_sync():
+    """Kesh invalidatsiyasini yoqish (start_listener dan oldin chaqiriladi)"""
+    global _cache_sync_task
+    register_channel("cache_invalidate", _on_cache_notify, on_reconnect=sync_cache_versions)
+    if _cache_sync_task is None or _cache_sync_task.done():
+        _cache_sync_task = asyncio.create_task(_cache_sync_loop())
+
+
+def _prune_menu_screens(user_id: int):
+    """Tarixda qolmagan menyular ekranlarini o'chirish"""
+    screens = user_menu_screens.get(user_id)
+    if not screens:
+        return
+
+    history = user_menu_history.get(user_id, [])
+    for menu in [m for m in screens if m not in history]:
+        del screens[menu]
+
+
 def add_to_menu_history(user_id: int, menu: str):
     """Foydalanuvchi menyu tarixiga qo'shish"""
     if user_id not in user_menu_history:
@@ -365,12 +1789,38 @@ def add_to_menu_history(user_id: int, menu: str):
 
     if len(user_menu_history[user_id]) > 10:
         user_menu_history[user_id] = user_menu_history[user_id][-10:]
+        _prune_menu_screens(user_id)
+
+
+def save_menu_screen(user_id: int, menu: str, chat_id: int, text: str,
+                     markup_key: bytes, group_id: int = None, with_clicks: bool = False):
+    """Tarixdagi menyu uchun chizilgan ekranni saqlash (with_clicks - click sonlari ko'rsatilgan ekran)"""
+    version = get_group_version(group_id, with_clicks) if group_id is not None else None
+    user_menu_screens.setdefault(user_id, {})[menu] = (chat_id, text, markup_key, group_id, version, with_clicks)
+
+
+def get_menu_screen(user_id: int, menu: str, chat_id: int) -> Optional[Tuple[str, bytes]]:
+    """Saqlangan ekranni olish (guruh ma'lumotlari o'zgarmagan bo'lsa)"""
+    screen = user_menu_screens.get(user_id, {}).get(menu)
+    if screen is None:
+        return None
+
+    saved_chat_id, text, markup_key, group_id, version, with_clicks = screen
+    if saved_chat_id != chat_id:
+        return None
+
+    if group_id is not None and get_group_version(group_id, with_clicks) != version:
+        del user_menu_screens[user_id][menu]
+        return None
+
+    return text, markup_key
 
 
 def get_previous_menu(user_id: int) -> Optional[str]:
     """Oldingi menyuni olish"""
     if user_id in user_menu_history and len(user_menu_history[user_id]) > 1:
         user_menu_history[user_id].pop()
+        _prune_menu_screens(user_id)
         if user_menu_history[user_id]:
             return user_menu_history[user_id][-1]
     return None
@@ -386,8 +1836,12 @@ def get_current_menu(user_id: int) -> Optional[str]:
 async def close_db():
     """Database ulanishini yopish"""
     try:
+        for task in (_pool_manager_task, _rollup_task, _listener_task, _cache_sync_task):
+            if task is not None:
+                task.cancel()
+
         if pool:
-            await pool.close()
-            print("✅ PostgreSQL pool yopildi.")
+            await asyncio.gather(*(target.close() for target in _pools.values()))
+            log.info("✅ PostgreSQL poollar yopildi.")
     except Exception as e:
-        print(f"❌ Database yopish xatosi: {e}")
\ No newline at end of file
+        log.error(f"❌ Database yopish xatosi: {e}")
\ No newline at end of file
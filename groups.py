@@ -0,0 +1,51 @@
+from typing import Optional
+
+from config import ALLOWED_GROUP_IDS
+import db
+import logger
+
+log = logger.get_logger("groups")
+
+# Ruxsat berilgan guruhlar - har bir update'da O(1) tekshiruv uchun
+allowed_group_ids: frozenset = frozenset(ALLOWED_GROUP_IDS)
+
+
+def is_allowed(chat_id: int) -> bool:
+    """Guruh ruxsat berilganmi"""
+    return chat_id in allowed_group_ids
+
+
+async def reload(payload: Optional[str] = None):
+    """Guruhlar ro'yxatini bazadan qayta yuklash"""
+    global allowed_group_ids
+    group_ids = await db.get_group_ids()
+    if group_ids is None:
+        return
+
+    allowed_group_ids = frozenset(group_ids)
+    log.info(f"👥 Guruhlar ro'yxati yangilandi: {len(allowed_group_ids)} ta guruh")
+
+
+async def load():
+    """.env dagi guruhlarni jadvalga qo'shish va ro'yxatni yuklash"""
+    await db.seed_groups(ALLOWED_GROUP_IDS)
+    await reload()
+    db.register_channel("groups_changed", reload, on_reconnect=reload)
+
+
+async def add_group(group_id: int, title: str = None, added_by: int = None) -> bool:
+    """Guruhni qo'shish (boshqa workerlar NOTIFY orqali yangilanadi)"""
+    global allowed_group_ids
+    success = await db.add_groups([group_id], title, added_by)
+    if success:
+        allowed_group_ids = allowed_group_ids | {group_id}
+    return success
+
+
+async def remove_group(group_id: int) -> bool:
+    """Guruhni o'chirish (boshqa workerlar NOTIFY orqali yangilanadi)"""
+    global allowed_group_ids
+    success = await db.remove_group(group_id)
+    if success:
+        allowed_group_ids = allowed_group_ids - {group_id}
+    return success
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from config import (
+    JOURNAL_DIR,
+    JOURNAL_MAX_BYTES,
+    JOURNAL_FSYNC_INTERVAL,
+    JOURNAL_REPLAY_INTERVAL
+)
+import logger
+import metrics
+
+log = logger.get_logger("journal")
+
+# Baza ishlamaganda yozilmay qolgan yozuvlar: JSONL segmentlar, diskka to'plab fsync qilinadi.
+# Segmentlar bazaga butunligicha bitta tranzaksiyada qo'llanadi (segment_id bo'yicha idempotent).
+ApplySegment = Callable[[str, List[dict]], Awaitable[bool]]
+
+_pending: List[str] = []  # hali diskka yozilmagan qatorlar
+_active_id: Optional[str] = None  # hozir yozilayotgan segment
+_disk_bytes = 0  # barcha segmentlar hajmi (yozilmaganlari bilan)
+_seq = 0
+_full_warned = False
+_io_lock: Optional[asyncio.Lock] = None
+_stop: Optional[asyncio.Event] = None
+_tasks: List[asyncio.Task] = []
+
+metrics.register_gauge("journal_bytes", lambda: _disk_bytes)
+metrics.register_gauge("journal_pending", lambda: len(_pending))
+
+
+def _segment_path(segment_id: str) -> str:
+    return os.path.join(JOURNAL_DIR, f"{segment_id}.jsonl")
+
+
+def _new_segment_id() -> str:
+    """Vaqt bo'yicha tartiblanadigan noyob segment nomi"""
+    global _seq
+    _seq += 1
+    return f"{int(time.time() * 1000):013d}-{os.getpid()}-{_seq:06d}"
+
+
+def _closed_segments() -> List[str]:
+    """Yozib bo'lingan (qo'llashga tayyor) segmentlar, eng eskisi birinchi"""
+    if not os.path.isdir(JOURNAL_DIR):
+        return []
+    return sorted(
+        name[:-len(".jsonl")] for name in os.listdir(JOURNAL_DIR)
+        if name.endswith(".jsonl") and name[:-len(".jsonl")] != _active_id
+    )
+
+
+def init():
+    """Jurnal papkasini tayyorlash va qolgan segmentlarni hisoblash"""
+    global _disk_bytes, _io_lock
+    os.makedirs(JOURNAL_DIR, exist_ok=True)
+    _io_lock = asyncio.Lock()
+
+    segments = _closed_segments()
+    _disk_bytes = sum(os.path.getsize(_segment_path(s)) for s in segments)
+    if segments:
+        log.info(f"📓 Jurnalda {len(segments)} ta segment bazaga yozilishini kutmoqda ({_disk_bytes} bayt)")
+
+
+def append(op: str, data) -> bool:
+    """Yozuvni jurnalga qo'shish (disk chegarasi to'lsa False)"""
+    global _disk_bytes, _full_warned
+    line = json.dumps(
+        {"op": op, "at": time.time(), "data": data},
+        ensure_ascii=False,
+        separators=(",", ":")
+    ) + "\n"
+    size = len(line.encode())
+
+    if _disk_bytes + size > JOURNAL_MAX_BYTES:
+        metrics.inc("journal_dropped")
+        if not _full_warned:
+            _full_warned = True
+            log.warning(f"⚠️ Jurnal to'ldi ({JOURNAL_MAX_BYTES} bayt), yangi yozuvlar saqlanmaydi")
+        return False
+
+    _pending.append(line)
+    _disk_bytes += size
+    metrics.inc("journal_records")
+    return True
+
+
+def _append_lines(path: str, payload: str):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _read_segment(path: str) -> List[dict]:
+    """Segmentni o'qish (oxirgi chala yozilgan qator tashlab yuboriladi)"""
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                metrics.inc("journal_corrupt_lines")
+    return records
+
+
+async def sync():
+    """To'plangan qatorlarni bitta write + fsync bilan diskka yozish"""
+    global _pending, _active_id
+    if not _pending:
+        return
+    if _io_lock is None:
+        init()
+
+    async with _io_lock:
+        lines, _pending = _pending, []
+        if _active_id is None:
+            _active_id = _new_segment_id()
+        try:
+            await asyncio.to_thread(_append_lines, _segment_path(_active_id), "".join(lines))
+            metrics.inc("journal_fsyncs")
+        except Exception as e:
+            _pending[:0] = lines
+            log.warning(f"⚠️ Jurnalni diskka yozish xatosi: {e}")
+
+
+async def _apply_segments(apply: ApplySegment) -> bool:
+    """Yopilgan segmentlarni tartib bilan qo'llash (baza ishlamasa to'xtaydi)"""
+    global _disk_bytes
+    for segment_id in _closed_segments():
+        path = _segment_path(segment_id)
+        size = os.path.getsize(path)
+        records = await asyncio.to_thread(_read_segment, path)
+        try:
+            if records and not await apply(segment_id, records):
+                metrics.inc("journal_replay_failures")
+                return False
+        except Exception as e:
+            # Qayta urinish foyda bermaydigan xato - segment chetga olinadi, navbat to'xtab qolmaydi
+            log.error(f"❌ Jurnal segmenti {segment_id} qo'llanmadi, chetga olindi: {e}")
+            metrics.inc("journal_segments_quarantined")
+            os.replace(path, f"{path}.bad")
+        else:
+            metrics.inc("journal_replayed", len(records))
+            os.remove(path)
+
+        _disk_bytes = max(_disk_bytes - size, 0)
+    return True
+
+
+async def replay(apply: ApplySegment):
+    """Eski segmentlarni, keyin joriy segmentni yopib qo'llash"""
+    global _active_id
+    if not await _apply_segments(apply):
+        return
+
+    await sync()
+    if _active_id is None:
+        return
+
+    async with _io_lock:
+        _active_id = None
+    await _apply_segments(apply)
+
+
+async def _sync_loop(stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=JOURNAL_FSYNC_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        await sync()
+
+
+async def _replay_loop(stop: asyncio.Event, apply: ApplySegment):
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=JOURNAL_REPLAY_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        if stop.is_set():
+            break
+        try:
+            await replay(apply)
+        except Exception as e:
+            log.warning(f"⚠️ Jurnalni qayta yozish xatosi: {e}")
+
+
+def start(apply: ApplySegment):
+    """fsync va qayta yozish fon vazifalarini ishga tushirish"""
+    global _stop, _tasks
+    if _io_lock is None:
+        init()
+    if _tasks:
+        return
+    _stop = asyncio.Event()
+    _tasks = [
+        asyncio.create_task(_sync_loop(_stop)),
+        asyncio.create_task(_replay_loop(_stop, apply))
+    ]
+
+
+async def stop():
+    """Fon vazifalarini to'xtatib, qolgan yozuvlarni diskka yozish"""
+    global _tasks
+    if _stop is not None:
+        _stop.set()
+    if _tasks:
+        await asyncio.gather(*_tasks, return_exceptions=True)
+        _tasks = []
+    if _io_lock is not None:
+        await sync()
@@ -0,0 +1,130 @@
+import json
+import logging
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+import metrics
+
+ROOT = "mahalla"  # loyiha loggerlari: mahalla.db, mahalla.bot, ...
+
+# LogRecord ning o'z maydonlari - qolganlari (extra=...) JSON ga qo'shiladi
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+def get_logger(category: str) -> logging.Logger:
+    """Kategoriya bo'yicha logger (darajasi LOG_LEVELS orqali alohida sozlanadi)"""
+    return logging.getLogger(f"{ROOT}.{category}")
+
+
+class JsonFormatter(logging.Formatter):
+    """Bitta qatorli JSON yozuv"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        category = record.name[len(ROOT) + 1:] if record.name.startswith(f"{ROOT}.") else record.name
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "category": category,
+            "msg": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Bir joydan chiqayotgan xabarlarni oynada limit bilan cheklash
+    (navbatga tushishidan oldin - toshqinda loop sekinlashmaydi)"""
+
+    def __init__(self, limit: int, window: float):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        # (logger, qator) -> [oyna boshi, shu oynadagi soni, o'tkazib yuborilganlar]
+        self._sites: Dict[Tuple[str, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0:
+            return True
+
+        key = (record.name, record.lineno)
+        now = time.monotonic()
+        site = self._sites.get(key)
+        if site is None or now - site[0] >= self.window:
+            suppressed = site[2] if site is not None else 0
+            self._sites[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+
+        site[1] += 1
+        if site[1] <= self.limit:
+            return True
+
+        site[2] += 1
+        metrics.inc("log_suppressed")
+        return False
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Navbat to'lsa kutmasdan tashlab yuboradi; formatlash listener oqimida bo'ladi"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("log_dropped")
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """'db=WARNING,aiogram=INFO' -> {'db': 'WARNING', 'aiogram': 'INFO'}"""
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            category, level = item.split("=", 1)
+            levels[category.strip()] = level.strip().upper()
+    return levels
+
+
+def setup(level: str = "INFO", category_levels: Dict[str, str] = None,
+          rate_limit: int = 20, rate_window: float = 60.0, queue_size: int = 10000):
+    """Barcha loglarni navbat orqali fon oqimida JSON ko'rinishida chiqarish"""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter(rate_limit, rate_window))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
+
+    for category, category_level in (category_levels or {}).items():
+        name = category if category.startswith(("aiogram", "asyncio", ROOT)) else f"{ROOT}.{category}"
+        logging.getLogger(name).setLevel(category_level)
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown():
+    """Navbatdagi qolgan yozuvlarni chiqarib, fon oqimini to'xtatish"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,38 @@
+from collections import Counter
+from typing import Callable, Dict
+
+# Ichki hisoblagichlar (tejalgan API chaqiruvlar, tashlab yuborilgan update'lar va h.k.)
+counters: Counter = Counter()
+# Joriy qiymatlar (pool bandligi va h.k.) - o'qilganda hisoblanadi
+gauges: Dict[str, Callable[[], int]] = {}
+
+
+def inc(name: str, value: int = 1):
+    """Hisoblagichni oshirish"""
+    counters[name] += value
+
+
+def register_gauge(name: str, getter: Callable[[], int]):
+    """Joriy qiymat beruvchi funksiyani ro'yxatga olish"""
+    gauges[name] = getter
+
+
+def snapshot() -> Dict[str, int]:
+    """Barcha hisoblagichlar va joriy qiymatlar nusxasi"""
+    data = dict(counters)
+    for name, getter in gauges.items():
+        try:
+            data[name] = getter()
+        except Exception:
+            continue
+    return dict(sorted(data.items()))
+
+
+def format_metrics() -> str:
+    """Admin uchun hisoblagichlar matni"""
+    data = snapshot()
+    if not data:
+        return "📈 <b>Metrikalar:</b>\n\n<i>Hozircha ma'lumot yo'q</i>"
+
+    lines = [f"• <code>{name}</code>: {value}" for name, value in data.items()]
+    return "📈 <b>Metrikalar:</b>\n\n" + "\n".join(lines)
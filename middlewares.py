@@ -0,0 +1,412 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.types import CallbackQuery, Message, TelegramObject, Update
+
+from config import (
+    ADMIN_IDS,
+    UPDATE_ORDER_KEY,
+    MAX_CONCURRENT_UPDATES,
+    SHED_QUEUE_DEPTH,
+    SHED_LOOP_LAG_MS,
+    SHED_SAMPLE_RATE,
+    LOOP_LAG_INTERVAL,
+    THROTTLE_RULES,
+    THROTTLE_USER_LIMIT,
+    THROTTLE_GROUP_LIMIT,
+    THROTTLE_MAX_KEYS
+)
+import logger
+import metrics
+import tracing
+
+log = logger.get_logger("middlewares")
+
+
+class InflightMiddleware(BaseMiddleware):
+    """Ishlayotgan update'larni kuzatish - to'xtashda ularni kutish uchun"""
+
+    def __init__(self):
+        self.accepting = True
+        self.tasks: Set[asyncio.Task] = set()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not self.accepting:
+            metrics.inc("updates_rejected_shutdown")
+            return None
+
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            return await handler(event, data)
+        finally:
+            self.tasks.discard(task)
+
+    async def drain(self, timeout: float) -> int:
+        """Yangi update qabul qilishni to'xtatib, ishlayotganlarini kutish.
+        Vaqt tugaganda bekor qilingan handlerlar sonini qaytaradi."""
+        self.accepting = False
+        current = asyncio.current_task()
+        pending = {task for task in self.tasks if task is not current}
+        if not pending:
+            return 0
+
+        _, pending = await asyncio.wait(pending, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        return len(pending)
+
+
+# Update ustuvorliklari (kichik son - oldinroq)
+PRIORITY_HIGH = 0  # tugmalar va buyruqlar
+PRIORITY_MEDIUM = 1  # admin amallari, shaxsiy chat
+PRIORITY_LOW = 2  # guruhdagi oddiy xabarlar va a'zolik hodisalari (faqat faollik hisobi)
+
+
+def classify(update: Update) -> int:
+    """Update ustuvorligini aniqlash"""
+    if update.callback_query is not None:
+        return PRIORITY_HIGH
+
+    message = update.message
+    if message is not None:
+        text = message.text or ""
+        if text.startswith("/"):
+            return PRIORITY_HIGH
+        if message.chat.type == "private" or " | " in text:
+            return PRIORITY_MEDIUM
+        if message.from_user is not None and message.from_user.id in ADMIN_IDS:
+            return PRIORITY_MEDIUM
+        return PRIORITY_LOW
+
+    if update.my_chat_member is not None:
+        return PRIORITY_MEDIUM
+    return PRIORITY_LOW
+
+
+class PrioritySemaphore:
+    """Bo'shagan joy eng yuqori ustuvorlikdagi (teng bo'lsa - birinchi kelgan) kutuvchiga beriladi"""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: List[tuple] = []  # (ustuvorlik, tartib raqami, future)
+        self._seq = itertools.count()
+        self.waiting = 0
+
+    async def acquire(self, priority: int):
+        if self._value > 0 and not self.waiting:
+            self._value -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self.waiting += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                self.waiting -= 1
+            else:
+                # Joy berilgan, lekin kutuvchi bekor qilingan - keyingisiga o'tkaziladi
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.waiting -= 1
+                future.set_result(None)
+                return
+        self._value += 1
+
+
+class OrderedUpdatesMiddleware(BaseMiddleware):
+    """Bir chat (yoki bitta xabar) update'larini kelgan tartibida ketma-ket bajarish.
+    Boshqa chatlar parallel ishlaydi, umumiy bandlik ustuvorlikli semafor bilan chegaralanadi;
+    navbat to'lganda yoki loop sekinlashganda past ustuvorlikdagi update'lar tashlab yuboriladi."""
+
+    def __init__(self, key_by: str = UPDATE_ORDER_KEY, max_concurrent: int = MAX_CONCURRENT_UPDATES):
+        self.key_by = key_by
+        self.semaphore = PrioritySemaphore(max_concurrent)
+        self.running = 0
+        self.loop_lag_ms = 0
+        # kalit -> [qulf, shu kalitdagi update'lar soni]; oxirgisi tugaganda o'chiriladi
+        self._queues: Dict[Hashable, list] = {}
+        self._lag_task: Optional[asyncio.Task] = None
+        metrics.register_gauge("updates_running", lambda: self.running)
+        metrics.register_gauge("update_queues", lambda: len(self._queues))
+        metrics.register_gauge("update_queue_depth", lambda: self.semaphore.waiting)
+        metrics.register_gauge("loop_lag_ms", lambda: self.loop_lag_ms)
+
+    def _key(self, event: TelegramObject, data: Dict[str, Any]) -> Optional[Hashable]:
+        chat = data.get("event_chat")
+        if chat is None:
+            return None
+        if self.key_by == "message" and isinstance(event, Update) and event.callback_query:
+            message = event.callback_query.message
+            if message is not None:
+                return chat.id, message.message_id
+        return chat.id
+
+    def overloaded(self) -> bool:
+        """Navbat chuqurligi yoki loop kechikishi chegaradan oshganmi"""
+        return self.semaphore.waiting >= SHED_QUEUE_DEPTH or self.loop_lag_ms >= SHED_LOOP_LAG_MS
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        priority = classify(event) if isinstance(event, Update) else PRIORITY_HIGH
+        if priority == PRIORITY_LOW:
+            if self.overloaded():
+                if random.random() >= SHED_SAMPLE_RATE:
+                    metrics.inc("updates_shed")
+                    return None
+                metrics.inc("updates_sampled")
+            # Faollik hisobiga tartib kerak emas - chat navbatini band qilmaydi
+            return await self._run(handler, event, data, priority, time.perf_counter())
+
+        key = self._key(event, data)
+        if key is None:
+            return await self._run(handler, event, data, priority, time.perf_counter())
+
+        # asyncio.Lock navbati FIFO - update'lar qulfga kelgan tartibida kiradi
+        entry = self._queues.get(key)
+        if entry is None:
+            entry = self._queues[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        started = time.perf_counter()
+        try:
+            async with entry[0]:
+                return await self._run(handler, event, data, priority, started)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._queues[key]
+
+    async def _run(self, handler, event, data, priority: int, started: float):
+        await self.semaphore.acquire(priority)
+        self.running += 1
+        try:
+            waited_ms = int((time.perf_counter() - started) * 1000)
+            if waited_ms:
+                metrics.inc("update_wait_ms", waited_ms)
+            span = tracing.current_span()
+            if span is not None:
+                span.set("update.wait_ms", waited_ms)
+                span.set("update.priority", priority)
+            return await handler(event, data)
+        finally:
+            self.running -= 1
+            self.semaphore.release()
+
+    async def _measure_lag(self):
+        """Loop kechikishi: uyg'onish rejalashtirilgandan qancha kech bo'ldi"""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LOOP_LAG_INTERVAL
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lag_ms = max(int((loop.time() - expected) * 1000), 0)
+
+    def start_lag_monitor(self):
+        """Loop kechikishini o'lchashni boshlash"""
+        if self._lag_task is None or self._lag_task.done():
+            self._lag_task = asyncio.create_task(self._measure_lag())
+
+    async def stop_lag_monitor(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            await asyncio.gather(self._lag_task, return_exceptions=True)
+            self._lag_task = None
+
+
+def parse_limit(spec: str) -> Tuple[float, float]:
+    """'3/10' -> (3 ta, 10 sekundda)"""
+    count, _, period = spec.strip().partition("/")
+    return float(count), float(period or 1)
+
+
+def parse_throttle_rules(spec: str) -> Dict[str, Tuple[float, float]]:
+    """'/aloqa=3/10,admin:users=2/10' -> {'/aloqa': (3.0, 10.0), 'admin:users': (2.0, 10.0)}"""
+    rules = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, limit = item.split("=", 1)
+        try:
+            rules[name.strip().lower()] = parse_limit(limit)
+        except ValueError:
+            log.warning(f"⚠️ Noto'g'ri throttle qoidasi: {item.strip()}")
+    return rules
+
+
+THROTTLE_OTHER = "other"
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Buyruq va tugmalar uchun token bucket: foydalanuvchi (qoida bo'yicha) va guruh limiti.
+    Update darajasida, navbat (OrderedUpdatesMiddleware) oldidan ishlaydi - ortiqcha update
+    chat navbatini ham, semaforni ham band qilmaydi.
+    Limitdan oshgan callback faqat call.answer oladi, buyruq jimgina tashlanadi."""
+
+    def __init__(self, rules: Optional[Dict[str, Tuple[float, float]]] = None,
+                 user_limit: str = THROTTLE_USER_LIMIT, group_limit: str = THROTTLE_GROUP_LIMIT,
+                 max_keys: int = THROTTLE_MAX_KEYS):
+        self.rules = parse_throttle_rules(THROTTLE_RULES) if rules is None else rules
+        self.user_limit = parse_limit(user_limit)
+        self.group_limit = parse_limit(group_limit)
+        self.max_keys = max_keys
+        # Bucket to'lib qolgandan keyin saqlashning ma'nosi yo'q - shuncha vaqt tegilmaganlari o'chiriladi
+        self.idle_after = max(period for _, period in [self.user_limit, self.group_limit, *self.rules.values()])
+        # kalit -> [tokenlar, oxirgi yangilanish]; oxirgi ishlatilgani oxirida
+        self._buckets: "OrderedDict[Hashable, list]" = OrderedDict()
+        metrics.register_gauge("throttle_buckets", lambda: len(self._buckets))
+
+    def _rule_for(self, event: TelegramObject) -> Optional[str]:
+        """Buyruq ('/aloqa') yoki callback prefiksi ('admin:users', keyin 'admin'); oddiy xabar - None.
+        Qoidasi yo'q buyruq va callbacklar bitta umumiy 'other' qoidasiga tushadi
+        (/x1, /x2 ... har biri alohida bucket va metrika ochmasligi uchun)"""
+        if isinstance(event, Update):
+            event = event.callback_query or event.message
+        if isinstance(event, CallbackQuery):
+            parts = (event.data or "").lower().split(":")
+            for size in range(len(parts), 0, -1):
+                prefix = ":".join(parts[:size])
+                if prefix in self.rules:
+                    return prefix
+            return THROTTLE_OTHER
+
+        text = (event.text or "") if isinstance(event, Message) else ""
+        if text.startswith("/"):
+            command = text.split(maxsplit=1)[0].split("@", 1)[0].lower()
+            return command if command in self.rules else THROTTLE_OTHER
+        return None
+
+    def _take(self, key: Hashable, limit: Tuple[float, float], now: float) -> bool:
+        count, period = limit
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [count, now]
+        else:
+            bucket[0] = min(count, bucket[0] + (now - bucket[1]) * count / period)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def _evict(self, now: float):
+        """Uzoq tegilmagan (allaqachon to'lgan) va chegaradan ortiq bucketlarni o'chirish"""
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_keys and now - bucket[1] < self.idle_after:
+                break
+            del self._buckets[key]
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        rule = self._rule_for(event)
+        user = data.get("event_from_user")
+        if rule is None or user is None:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        self._evict(now)
+        allowed = self._take(("user", user.id, rule), self.rules.get(rule, self.user_limit), now)
+        chat = data.get("event_chat")
+        if allowed and chat is not None and chat.type != "private":
+            allowed = self._take(("group", chat.id), self.group_limit, now)
+
+        if allowed:
+            return await handler(event, data)
+
+        metrics.inc("throttled")
+        metrics.inc(f"throttled_{rule.lstrip('/').replace(':', '_')}")
+        call = event.callback_query if isinstance(event, Update) else event
+        if isinstance(call, CallbackQuery):
+            try:
+                await call.answer("⏳ Juda tez! Biroz kuting")
+            except Exception:
+                pass
+        return None
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Har bir update uchun ildiz span (sampling shu yerda hal qilinadi)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        name = f"update {event.event_type}" if isinstance(event, Update) else "update"
+        with tracing.span(name, tracing.KIND_SERVER) as span:
+            if isinstance(event, Update):
+                span.set("update.id", event.update_id)
+            return await handler(event, data)
+
+
+class HandlerSpanMiddleware(BaseMiddleware):
+    """Tanlangan handler nomi bilan span (xabar va callback uchun)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "handler")
+        with tracing.span(f"handler {name}") as span:
+            if isinstance(event, CallbackQuery):
+                span.set("callback.prefix", (event.data or "").split(":", 1)[0])
+                chat = event.message.chat if event.message else None
+            elif isinstance(event, Message):
+                chat = event.chat
+            else:
+                chat = None
+            if chat is not None:
+                span.set("chat.id", chat.id)
+            return await handler(event, data)
+
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    """Telegram API chaqiruvlari uchun span"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod
+    ) -> Response:
+        if tracing.current_span() is None:
+            # Update'dan tashqaridagi chaqiruvlar (getUpdates, fon vazifalari) kuzatilmaydi
+            return await make_request(bot, method)
+
+        with tracing.span(f"telegram {type(method).__name__}", tracing.KIND_CLIENT):
+            return await make_request(bot, method)
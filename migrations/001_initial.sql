@@ -0,0 +1,35 @@
+-- Asosiy kontaktlar jadvali
+CREATE TABLE IF NOT EXISTS contacts (
+    id SERIAL PRIMARY KEY,
+    service TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    click_count INTEGER DEFAULT 0,
+    group_id BIGINT NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW(),
+    UNIQUE(service, group_id)
+);
+
+-- Foydalanuvchilar jadvali
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    first_name VARCHAR(255),
+    last_name VARCHAR(255),
+    username VARCHAR(255),
+    language_code VARCHAR(10),
+    is_bot BOOLEAN DEFAULT FALSE,
+    is_premium BOOLEAN DEFAULT FALSE,
+    chat_id BIGINT,
+    chat_type VARCHAR(50),
+    started_at TIMESTAMP DEFAULT NOW(),
+    last_activity TIMESTAMP DEFAULT NOW(),
+    message_count INTEGER DEFAULT 0,
+    last_command TEXT,
+    UNIQUE(user_id, chat_id)
+);
+
+-- Indexlar
+CREATE INDEX IF NOT EXISTS idx_contacts_click_count ON contacts(click_count DESC);
+CREATE INDEX IF NOT EXISTS idx_contacts_group_id ON contacts(group_id);
+CREATE INDEX IF NOT EXISTS idx_users_user_id ON users(user_id);
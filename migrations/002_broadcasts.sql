@@ -0,0 +1,24 @@
+-- Ommaviy xabarlar jadvali
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id SERIAL PRIMARY KEY,
+    text TEXT NOT NULL,
+    created_by BIGINT NOT NULL,
+    status VARCHAR(20) DEFAULT 'running',
+    last_user_id BIGINT DEFAULT 0,
+    total_count INTEGER DEFAULT 0,
+    sent_count INTEGER DEFAULT 0,
+    failed_count INTEGER DEFAULT 0,
+    blocked_count INTEGER DEFAULT 0,
+    progress_chat_id BIGINT,
+    progress_message_id BIGINT,
+    created_at TIMESTAMP DEFAULT NOW(),
+    finished_at TIMESTAMP
+);
+
+-- Botni bloklagan foydalanuvchilar
+CREATE TABLE IF NOT EXISTS blocked_users (
+    user_id BIGINT PRIMARY KEY,
+    blocked_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_users_private ON users(user_id) WHERE chat_type = 'private';
@@ -0,0 +1,40 @@
+-- Clicklar jurnali (faqat qo'shiladi), kunlik bo'limlarga ajratilgan
+CREATE TABLE IF NOT EXISTS contact_clicks (
+    id BIGSERIAL,
+    group_id BIGINT NOT NULL,
+    service TEXT NOT NULL,
+    clicks INTEGER NOT NULL DEFAULT 1,
+    clicked_at TIMESTAMP NOT NULL DEFAULT NOW()
+) PARTITION BY RANGE (clicked_at);
+
+CREATE INDEX IF NOT EXISTS idx_contact_clicks_id ON contact_clicks(id);
+
+-- Soatlik va kunlik yig'indilar
+CREATE TABLE IF NOT EXISTS contact_click_rollups (
+    bucket VARCHAR(10) NOT NULL,
+    bucket_start TIMESTAMP NOT NULL,
+    group_id BIGINT NOT NULL,
+    service TEXT NOT NULL,
+    clicks INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, group_id, bucket_start, service)
+);
+
+-- Jurnalning qaysi qismigacha yig'ilgani
+CREATE TABLE IF NOT EXISTS click_rollup_state (
+    id INTEGER PRIMARY KEY DEFAULT 1,
+    last_click_id BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO click_rollup_state (id, last_click_id) VALUES (1, 0)
+ON CONFLICT (id) DO NOTHING;
+
+-- Eski umumiy hisoblagichni 1970-01-01 kunlik bo'lagiga ko'chirish
+-- (umumiy reytingda hisobga olinadi, "shu hafta"da emas)
+INSERT INTO contact_click_rollups (bucket, bucket_start, group_id, service, clicks)
+SELECT 'day', TIMESTAMP '1970-01-01', group_id, service, click_count
+FROM contacts
+WHERE click_count > 0
+ON CONFLICT DO NOTHING;
+
+-- click_count endi yangilanmaydi
+DROP INDEX IF EXISTS idx_contacts_click_count;
@@ -0,0 +1,9 @@
+-- "Hozir mashhur" reytingi: vaqt o'tishi bilan kamayadigan ball
+CREATE TABLE IF NOT EXISTS contact_trending (
+    group_id BIGINT NOT NULL,
+    service TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    score DOUBLE PRECISION NOT NULL,
+    score_at DOUBLE PRECISION NOT NULL,  -- ball hisoblangan vaqt (unix sekund)
+    PRIMARY KEY (group_id, service)
+);
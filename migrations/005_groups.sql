@@ -0,0 +1,20 @@
+-- Ruxsat berilgan guruhlar (admin buyruqlari orqali boshqariladi)
+CREATE TABLE IF NOT EXISTS groups (
+    group_id BIGINT PRIMARY KEY,
+    title TEXT,
+    added_by BIGINT,
+    added_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Har qanday o'zgarishda barcha workerlarga xabar berish
+CREATE OR REPLACE FUNCTION notify_groups_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('groups_changed', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS groups_changed ON groups;
+CREATE TRIGGER groups_changed
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON groups
+FOR EACH STATEMENT EXECUTE FUNCTION notify_groups_changed();
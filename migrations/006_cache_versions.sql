@@ -0,0 +1,5 @@
+-- Guruh ma'lumotlari versiyasi: workerlardagi keshlarni yangilash uchun
+CREATE TABLE IF NOT EXISTS cache_versions (
+    group_id BIGINT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
@@ -0,0 +1,21 @@
+-- Tez-tez yangilanadigan hisoblagichlar alohida tor jadvalda
+-- (fillfactor 70 - HOT yangilanishlar uchun sahifada bo'sh joy qoladi)
+CREATE TABLE IF NOT EXISTS user_activity (
+    user_id BIGINT NOT NULL,
+    chat_id BIGINT NOT NULL,
+    last_activity TIMESTAMP DEFAULT NOW(),
+    message_count INTEGER DEFAULT 0,
+    last_command TEXT,
+    PRIMARY KEY (user_id, chat_id)
+) WITH (fillfactor = 70);
+
+INSERT INTO user_activity (user_id, chat_id, last_activity, message_count, last_command)
+SELECT user_id, chat_id, last_activity, COALESCE(message_count, 0), last_command
+FROM users
+WHERE chat_id IS NOT NULL
+ON CONFLICT (user_id, chat_id) DO NOTHING;
+
+ALTER TABLE users
+    DROP COLUMN IF EXISTS last_activity,
+    DROP COLUMN IF EXISTS message_count,
+    DROP COLUMN IF EXISTS last_command;
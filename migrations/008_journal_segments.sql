@@ -0,0 +1,5 @@
+-- Bazaga qo'llangan mahalliy jurnal segmentlari (qayta qo'llashdan himoya)
+CREATE TABLE IF NOT EXISTS journal_segments (
+    segment_id TEXT PRIMARY KEY,
+    applied_at TIMESTAMP DEFAULT NOW()
+);
@@ -0,0 +1,2 @@
+-- Kunlik bo'lim hali yaratilmagan bo'lsa ham yozuvlar yo'qolmasin
+CREATE TABLE IF NOT EXISTS contact_clicks_default PARTITION OF contact_clicks DEFAULT;
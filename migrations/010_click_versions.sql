@@ -0,0 +1,2 @@
+-- Clicklar yig'ilganda faqat reyting keshlari yangilanadi (kontaktlar keshi va ekranlar emas)
+ALTER TABLE cache_versions ADD COLUMN IF NOT EXISTS clicks_version BIGINT NOT NULL DEFAULT 0;
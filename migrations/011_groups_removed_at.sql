@@ -0,0 +1,2 @@
+-- O'chirilgan guruhlar yozuvi saqlanadi - .env dagi guruhlar qayta ishga tushganda qaytib kelmasligi uchun
+ALTER TABLE groups ADD COLUMN IF NOT EXISTS removed_at TIMESTAMP;
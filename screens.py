@@ -0,0 +1,77 @@
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, Message
+
+from config import SCREEN_CACHE_SIZE
+import metrics
+import tracing
+
+# (chat_id, message_id) -> oxirgi chizilgan ekran xeshi
+rendered_screens: "OrderedDict[Tuple[int, int], bytes]" = OrderedDict()
+# Markup kaliti -> tugmalar (orqaga qaytishda qayta qurmaslik uchun)
+markup_cache: "OrderedDict[bytes, InlineKeyboardMarkup]" = OrderedDict()
+
+
+def screen_fingerprint(text: str, reply_markup: Optional[InlineKeyboardMarkup] = None) -> bytes:
+    """Matn va tugmalar uchun qisqa xesh"""
+    digest = hashlib.blake2b(text.encode(), digest_size=8)
+    if reply_markup is not None:
+        digest.update(reply_markup.model_dump_json(exclude_none=True).encode())
+    return digest.digest()
+
+
+def store_markup(reply_markup: InlineKeyboardMarkup) -> bytes:
+    """Tugmalarni keshga qo'yish va qisqa kalitini qaytarish"""
+    key = hashlib.blake2b(
+        reply_markup.model_dump_json(exclude_none=True).encode(),
+        digest_size=8
+    ).digest()
+    markup_cache[key] = reply_markup
+    markup_cache.move_to_end(key)
+
+    while len(markup_cache) > SCREEN_CACHE_SIZE:
+        markup_cache.popitem(last=False)
+
+    return key
+
+
+def get_markup(key: bytes) -> Optional[InlineKeyboardMarkup]:
+    """Kalit bo'yicha tugmalarni olish"""
+    return markup_cache.get(key)
+
+
+def remember_screen(chat_id: int, message_id: int, fingerprint: bytes):
+    """Xabarda hozir nima ko'rsatilayotganini eslab qolish"""
+    key = (chat_id, message_id)
+    rendered_screens[key] = fingerprint
+    rendered_screens.move_to_end(key)
+
+    while len(rendered_screens) > SCREEN_CACHE_SIZE:
+        rendered_screens.popitem(last=False)
+
+
+async def edit_screen(message: Message, text: str,
+                      reply_markup: Optional[InlineKeyboardMarkup] = None) -> bool:
+    """Xabarni tahrirlash - ekran o'zgarmagan bo'lsa API chaqirilmaydi"""
+    key = (message.chat.id, message.message_id)
+    fingerprint = screen_fingerprint(text, reply_markup)
+
+    if rendered_screens.get(key) == fingerprint:
+        rendered_screens.move_to_end(key)
+        metrics.inc("edit_skipped")
+        return False
+
+    with tracing.span("screen.edit"):
+        try:
+            await message.edit_text(text, reply_markup=reply_markup)
+            metrics.inc("edit_sent")
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
+            metrics.inc("edit_not_modified")
+
+    remember_screen(message.chat.id, message.message_id, fingerprint)
+    return True
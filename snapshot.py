@@ -0,0 +1,90 @@
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import SNAPSHOT_PATH
+import logger
+import metrics
+
+log = logger.get_logger("snapshot")
+
+# Oxirgi muvaffaqiyatli o'qilgan kontaktlar: group_id -> [(service, phone)]
+# (Postgres sekinlashganda ma'lumotnoma shu yerdan beriladi)
+contacts: Dict[int, List[Tuple[str, str]]] = {}
+saved_at: float = 0.0
+_write_task: Optional[asyncio.Task] = None
+_dirty = False
+
+
+def load():
+    """Diskdagi snapshotni xotiraga yuklash"""
+    global saved_at
+    if not os.path.exists(SNAPSHOT_PATH):
+        return
+
+    try:
+        with open(SNAPSHOT_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        for group_id, rows in data.get("groups", {}).items():
+            contacts[int(group_id)] = [(service, phone) for service, phone in rows]
+        saved_at = float(data.get("saved_at", 0))
+        log.info(f"💾 Kontaktlar snapshoti yuklandi: {len(contacts)} ta guruh")
+    except Exception as e:
+        log.warning(f"⚠️ Snapshotni o'qish xatosi: {e}")
+
+
+def get(group_id: int) -> Optional[List[Tuple[str, str]]]:
+    """Guruhning saqlangan kontaktlari"""
+    return contacts.get(group_id)
+
+
+def update(group_id: int, rows: List[Tuple[str, str]]):
+    """Bazadan yangi o'qilgan kontaktlarni saqlash (o'zgargan bo'lsa diskka yoziladi)"""
+    global _write_task, _dirty
+    if contacts.get(group_id) == rows:
+        return
+
+    contacts[group_id] = list(rows)
+    _dirty = True
+    if _write_task is None or _write_task.done():
+        _write_task = asyncio.create_task(_writer())
+
+
+def _write_file(payload: str):
+    """Faylni atomar almashtirish (yarim yozilgan snapshot qolmasligi uchun)"""
+    tmp_path = f"{SNAPSHOT_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, SNAPSHOT_PATH)
+
+
+async def _writer():
+    """Yig'ilgan o'zgarishlarni fon oqimida diskka yozish"""
+    global _dirty, saved_at
+    while _dirty:
+        _dirty = False
+        saved_at = time.time()
+        payload = json.dumps(
+            {
+                "saved_at": saved_at,
+                "groups": {str(group_id): rows for group_id, rows in contacts.items()}
+            },
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        try:
+            await asyncio.to_thread(_write_file, payload)
+            metrics.inc("snapshot_writes")
+        except Exception as e:
+            log.warning(f"⚠️ Snapshotni yozish xatosi: {e}")
+
+
+async def flush():
+    """Yozilayotgan snapshotni kutish (to'xtashda)"""
+    if _write_task is not None and not _write_task.done():
+        await _write_task
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# config modul import qilinganda o'qiladi - testlar haqiqiy bazaga ulanmaydi
+os.environ.setdefault("BOT_TOKEN", "123:test")
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,33 @@
+import asyncio
+
+from aiohttp import ClientConnectorError, ClientPayloadError, ServerDisconnectedError, ServerTimeoutError
+from aiohttp.client_reqrep import ConnectionKey
+
+from api_session import is_retryable
+
+
+def _connector_error():
+    key = ConnectionKey("api.telegram.org", 443, True, None, None, None, None)
+    return ClientConnectorError(key, OSError(111, "Connection refused"))
+
+
+def test_connect_errors_are_retried_for_every_method():
+    assert is_retryable(_connector_error(), "sendMessage")
+    assert is_retryable(_connector_error(), "getChat")
+
+
+def test_disconnect_after_send_is_not_retried_for_unsafe_methods():
+    assert not is_retryable(ServerDisconnectedError(), "sendMessage")
+    assert not is_retryable(ServerDisconnectedError(), "editMessageText")
+    assert is_retryable(ServerDisconnectedError(), "getChatMember")
+
+
+def test_timeouts_only_retried_for_safe_methods():
+    assert not is_retryable(asyncio.TimeoutError(), "sendMessage")
+    assert not is_retryable(ServerTimeoutError(), "answerCallbackQuery")
+    assert is_retryable(asyncio.TimeoutError(), "getChat")
+    assert not is_retryable(asyncio.TimeoutError(), "getUpdates")
+
+
+def test_other_client_errors_are_not_retried():
+    assert not is_retryable(ClientPayloadError(), "getChat")
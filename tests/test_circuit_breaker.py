@@ -0,0 +1,99 @@
+import asyncio
+from unittest import mock
+
+import db
+
+
+def _open_breaker():
+    breaker = db.CircuitBreaker(threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    return breaker
+
+
+def test_opens_after_threshold_and_allows_single_probe():
+    clock = [1000.0]
+    with mock.patch.object(db.time, "monotonic", lambda: clock[0]):
+        breaker = _open_breaker()
+        assert not breaker.allow()
+
+        clock[0] += 30
+        assert breaker.allow()
+        assert breaker.state == "half-open"
+        assert not breaker.allow()
+
+        breaker.record_success()
+        assert breaker.state == "closed"
+        assert breaker.allow()
+
+
+def test_failed_probe_reopens():
+    clock = [1000.0]
+    with mock.patch.object(db.time, "monotonic", lambda: clock[0]):
+        breaker = _open_breaker()
+        clock[0] += 30
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert not breaker.allow()
+
+
+def test_released_probe_allows_next_probe():
+    clock = [1000.0]
+    with mock.patch.object(db.time, "monotonic", lambda: clock[0]):
+        breaker = _open_breaker()
+        clock[0] += 30
+        assert breaker.allow()
+        breaker.release_probe()
+        assert breaker.allow()
+
+
+def test_abandoned_probe_expires():
+    clock = [1000.0]
+    with mock.patch.object(db.time, "monotonic", lambda: clock[0]):
+        breaker = _open_breaker()
+        clock[0] += 30
+        assert breaker.allow()
+        clock[0] += 10
+        assert not breaker.allow()
+        clock[0] += 20
+        assert breaker.allow()
+
+
+def test_cancelled_probe_query_does_not_wedge_breaker():
+    clock = [1000.0]
+
+    class HangingAcquire:
+        async def __aenter__(self):
+            await asyncio.sleep(3600)
+
+        async def __aexit__(self, *exc):
+            return False
+
+    async def run():
+        task = asyncio.create_task(db.get_contacts(-100))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    with mock.patch.object(db.time, "monotonic", lambda: clock[0]):
+        breaker = _open_breaker()
+        clock[0] += 30
+        with mock.patch.object(db, "breaker", breaker), \
+                mock.patch.object(db, "pool", object()), \
+                mock.patch.object(db, "_acquire", lambda *a, **k: HangingAcquire()):
+            asyncio.run(run())
+        assert breaker.state == "open"
+        assert breaker.allow()
+
+
+def test_open_breaker_marks_top_unavailable():
+    clock = [1000.0]
+    with mock.patch.object(db.time, "monotonic", lambda: clock[0]):
+        breaker = _open_breaker()
+        with mock.patch.object(db, "breaker", breaker), \
+                mock.patch.object(db, "_top_unavailable", set()):
+            assert asyncio.run(db.get_top_contacts(8, -100)) == []
+            assert db.is_top_unavailable(-100)
+            assert not db.is_top_unavailable(-200)
@@ -0,0 +1,80 @@
+import asyncio
+from unittest import mock
+
+import db
+
+
+class FakeConnection:
+    async def fetch(self, *args):
+        return []
+
+
+class FakeAcquire:
+    async def __aenter__(self):
+        return FakeConnection()
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakePool:
+    def acquire(self):
+        return FakeAcquire()
+
+    def terminate(self):
+        pass
+
+
+def _reset():
+    db.pool = None
+    db._pool_init_task = None
+    db._pools.clear()
+
+
+def test_init_db_creates_single_pool_set_under_concurrency():
+    _reset()
+    created = []
+
+    async def create_pool(dsn, **kwargs):
+        await asyncio.sleep(0.01)
+        created.append(FakePool())
+        return created[-1]
+
+    async def run():
+        with mock.patch.object(db.asyncpg, "create_pool", mock.AsyncMock(side_effect=create_pool)) as create, \
+                mock.patch.object(db, "apply_migrations", mock.AsyncMock(return_value=0)):
+            results = await asyncio.gather(*(db.init_db() for _ in range(500)))
+            return results, create.await_count
+
+    results, calls = asyncio.run(run())
+
+    assert all(results)
+    # Bitta init: write + read + heavy poollari bir martadan
+    assert calls == 3
+    assert db.pool is created[0]
+    assert db._pools["write"] is created[0]
+    _reset()
+
+
+def test_init_db_retries_after_failure():
+    _reset()
+    attempts = []
+
+    async def create_pool(dsn, **kwargs):
+        attempts.append(dsn)
+        if len(attempts) == 1:
+            raise OSError("connection refused")
+        return FakePool()
+
+    async def run():
+        with mock.patch.object(db.asyncpg, "create_pool", mock.AsyncMock(side_effect=create_pool)), \
+                mock.patch.object(db, "apply_migrations", mock.AsyncMock(return_value=0)):
+            first = await asyncio.gather(*(db.init_db() for _ in range(50)))
+            second = await db.init_db()
+            return first, second
+
+    first, second = asyncio.run(run())
+
+    assert not any(first)
+    assert second is True
+    _reset()
@@ -0,0 +1,101 @@
+import asyncio
+import os
+
+import pytest
+
+import journal
+
+
+@pytest.fixture(autouse=True)
+def journal_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, "JOURNAL_DIR", str(tmp_path))
+    monkeypatch.setattr(journal, "_pending", [])
+    monkeypatch.setattr(journal, "_active_id", None)
+    monkeypatch.setattr(journal, "_disk_bytes", 0)
+    monkeypatch.setattr(journal, "_full_warned", False)
+    monkeypatch.setattr(journal, "_io_lock", None)
+    return tmp_path
+
+
+def _files(path):
+    return sorted(os.listdir(path))
+
+
+def test_replay_applies_records_in_order_and_removes_segments(journal_dir):
+    applied = []
+
+    async def apply(segment_id, records):
+        applied.extend((record["op"], record["data"]) for record in records)
+        return True
+
+    async def run():
+        journal.init()
+        journal.append("clicks", [["Gaz", -100, 1]])
+        await journal.sync()
+        journal.append("activity", [[1, -100, 2, None]])
+        await journal.replay(apply)
+
+    asyncio.run(run())
+
+    assert applied == [("clicks", [["Gaz", -100, 1]]), ("activity", [[1, -100, 2, None]])]
+    assert _files(journal_dir) == []
+    assert journal._disk_bytes == 0
+
+
+def test_segment_kept_when_database_unavailable(journal_dir):
+    calls = []
+
+    async def unavailable(segment_id, records):
+        calls.append(segment_id)
+        return False
+
+    async def available(segment_id, records):
+        calls.append(segment_id)
+        return True
+
+    async def run():
+        journal.init()
+        journal.append("user", [1, "a"])
+        await journal.replay(unavailable)
+        kept = _files(journal_dir)
+        await journal.replay(available)
+        return kept
+
+    kept = asyncio.run(run())
+
+    assert len(kept) == 1
+    assert calls[0] == calls[1]
+    assert _files(journal_dir) == []
+
+
+def test_failing_segment_is_quarantined(journal_dir):
+    async def broken(segment_id, records):
+        raise ValueError("bad record")
+
+    async def run():
+        journal.init()
+        journal.append("unknown", {})
+        await journal.replay(broken)
+
+    asyncio.run(run())
+
+    files = _files(journal_dir)
+    assert len(files) == 1 and files[0].endswith(".jsonl.bad")
+    assert journal._disk_bytes == 0
+
+
+def test_append_rejected_when_journal_full(monkeypatch):
+    monkeypatch.setattr(journal, "JOURNAL_MAX_BYTES", 200)
+
+    assert journal.append("clicks", [["Gaz", -100, 1]])
+    accepted = [journal.append("clicks", [["Gaz", -100, 1]]) for _ in range(10)]
+
+    assert not all(accepted)
+    assert journal._disk_bytes <= 200
+
+
+def test_truncated_last_line_is_skipped(journal_dir):
+    path = journal_dir / "0000000000001-1-000001.jsonl"
+    path.write_text('{"op":"clicks","at":1,"data":[]}\n{"op":"cli', encoding="utf-8")
+
+    assert journal._read_segment(str(path)) == [{"op": "clicks", "at": 1, "data": []}]
@@ -0,0 +1,121 @@
+import asyncio
+import datetime
+from unittest import mock
+
+from aiogram.types import Chat, Message, Update, User
+
+import middlewares
+from middlewares import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_MEDIUM, OrderedUpdatesMiddleware, PrioritySemaphore
+
+
+async def _waiter(semaphore, priority, name, order):
+    await semaphore.acquire(priority)
+    order.append(name)
+
+
+def test_free_slot_is_taken_without_waiting():
+    async def scenario():
+        semaphore = PrioritySemaphore(2)
+        await semaphore.acquire(PRIORITY_LOW)
+        await semaphore.acquire(PRIORITY_LOW)
+        assert semaphore.waiting == 0
+        assert semaphore._value == 0
+
+    asyncio.run(scenario())
+
+
+def test_released_slot_goes_to_highest_priority_then_fifo():
+    async def scenario():
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire(PRIORITY_HIGH)
+        order = []
+        tasks = [
+            asyncio.create_task(_waiter(semaphore, PRIORITY_LOW, "low", order)),
+            asyncio.create_task(_waiter(semaphore, PRIORITY_HIGH, "high-1", order)),
+            asyncio.create_task(_waiter(semaphore, PRIORITY_MEDIUM, "medium", order)),
+            asyncio.create_task(_waiter(semaphore, PRIORITY_HIGH, "high-2", order)),
+        ]
+        await asyncio.sleep(0)
+        assert semaphore.waiting == 4
+
+        for expected in ("high-1", "high-2", "medium", "low"):
+            semaphore.release()
+            await asyncio.sleep(0)
+            assert order[-1] == expected
+        assert semaphore.waiting == 0
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire(PRIORITY_HIGH)
+        order = []
+        cancelled = asyncio.create_task(_waiter(semaphore, PRIORITY_HIGH, "cancelled", order))
+        other = asyncio.create_task(_waiter(semaphore, PRIORITY_LOW, "other", order))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        assert semaphore.waiting == 1
+
+        semaphore.release()
+        await other
+        assert order == ["other"]
+
+    asyncio.run(scenario())
+
+
+def test_slot_handed_to_cancelled_waiter_is_passed_on():
+    async def scenario():
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire(PRIORITY_HIGH)
+        order = []
+        first = asyncio.create_task(_waiter(semaphore, PRIORITY_HIGH, "first", order))
+        second = asyncio.create_task(_waiter(semaphore, PRIORITY_LOW, "second", order))
+        await asyncio.sleep(0)
+
+        # Joy berildi, lekin kutuvchi uyg'onishdan oldin bekor qilindi
+        semaphore.release()
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+
+        await second
+        assert order == ["second"]
+        assert semaphore.waiting == 0
+
+        semaphore.release()
+        assert semaphore._value == 1
+
+    asyncio.run(scenario())
+
+
+def _group_message_update():
+    message = Message(
+        message_id=1,
+        date=datetime.datetime.now(),
+        chat=Chat(id=-100, type="supergroup"),
+        from_user=User(id=42, is_bot=False, first_name="Ali"),
+        text="salom"
+    )
+    return Update(update_id=1, message=message)
+
+
+def test_low_priority_updates_are_shed_when_overloaded():
+    async def scenario():
+        scheduler = OrderedUpdatesMiddleware()
+        handler = mock.AsyncMock(return_value="ok")
+        update = _group_message_update()
+
+        assert await scheduler(handler, update, {}) == "ok"
+
+        scheduler.loop_lag_ms = middlewares.SHED_LOOP_LAG_MS
+        with mock.patch.object(middlewares.random, "random", return_value=1.0):
+            assert await scheduler(handler, update, {}) is None
+        with mock.patch.object(middlewares.random, "random", return_value=0.0):
+            assert await scheduler(handler, update, {}) == "ok"
+        assert handler.await_count == 2
+
+    asyncio.run(scenario())
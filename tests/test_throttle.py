@@ -0,0 +1,113 @@
+import asyncio
+import datetime
+from unittest import mock
+
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+import middlewares
+from middlewares import THROTTLE_OTHER, ThrottlingMiddleware, parse_limit, parse_throttle_rules
+
+USER = User(id=42, is_bot=False, first_name="Ali")
+GROUP = Chat(id=-100, type="supergroup")
+
+
+def _command(text, chat=GROUP):
+    message = Message(message_id=1, date=datetime.datetime.now(), chat=chat, from_user=USER, text=text)
+    return Update(update_id=1, message=message)
+
+
+def _callback(data):
+    call = CallbackQuery(id="1", from_user=USER, chat_instance="x", data=data)
+    return Update(update_id=1, callback_query=call)
+
+
+def _throttle(**kwargs):
+    kwargs.setdefault("rules", {"/aloqa": (2, 10), "admin:users": (1, 10)})
+    kwargs.setdefault("user_limit", "3/10")
+    kwargs.setdefault("group_limit", "100/60")
+    return ThrottlingMiddleware(**kwargs)
+
+
+def _run(throttle, update, chat=GROUP):
+    handler = mock.AsyncMock(return_value="ok")
+    data = {"event_from_user": USER, "event_chat": chat}
+    return asyncio.run(throttle(handler, update, data))
+
+
+def test_parse_rules():
+    assert parse_limit("3/10") == (3.0, 10.0)
+    assert parse_limit("5") == (5.0, 1.0)
+    assert parse_throttle_rules("/Aloqa=3/10, admin:users=2/10,bad=x/y,junk") == {
+        "/aloqa": (3.0, 10.0), "admin:users": (2.0, 10.0)
+    }
+
+
+def test_rule_keys():
+    throttle = _throttle()
+    assert throttle._rule_for(_command("/aloqa@bot foo")) == "/aloqa"
+    assert throttle._rule_for(_command("salom")) is None
+    assert throttle._rule_for(_callback("admin:users:2")) == "admin:users"
+    assert throttle._rule_for(_callback("admin:stats")) == THROTTLE_OTHER
+    assert throttle._rule_for(_command("/x1")) == THROTTLE_OTHER
+    assert throttle._rule_for(_command("/x2")) == THROTTLE_OTHER
+
+
+def test_unknown_commands_share_one_bucket():
+    throttle = _throttle()
+    with mock.patch.object(middlewares.metrics, "inc") as inc:
+        results = [_run(throttle, _command(f"/x{i}")) for i in range(5)]
+    assert results == ["ok", "ok", "ok", None, None]
+    assert len(throttle._buckets) == 2  # umumiy 'other' + guruh
+    counters = {call.args[0] for call in inc.call_args_list}
+    assert counters == {"throttled", "throttled_other"}
+
+
+def test_rule_limit_refills_over_time():
+    clock = [1000.0]
+    throttle = _throttle()
+    with mock.patch.object(middlewares.time, "monotonic", lambda: clock[0]):
+        assert [_run(throttle, _command("/aloqa")) for _ in range(3)] == ["ok", "ok", None]
+        clock[0] += 5
+        assert _run(throttle, _command("/aloqa")) == "ok"
+        assert _run(throttle, _command("/aloqa")) is None
+
+
+def test_group_limit_applies_across_rules():
+    throttle = _throttle(group_limit="2/60")
+    assert _run(throttle, _command("/aloqa")) == "ok"
+    assert _run(throttle, _command("/x")) == "ok"
+    assert _run(throttle, _command("/x")) is None
+    private = Chat(id=42, type="private")
+    assert _run(throttle, _command("/x", chat=private), chat=private) == "ok"
+
+
+def test_plain_messages_pass_through():
+    throttle = _throttle(user_limit="1/10")
+    assert [_run(throttle, _command("salom")) for _ in range(5)] == ["ok"] * 5
+    assert not throttle._buckets
+
+
+def test_throttled_callback_is_answered():
+    throttle = _throttle()
+    with mock.patch.object(CallbackQuery, "answer", mock.AsyncMock()) as answer:
+        assert _run(throttle, _callback("admin:users")) == "ok"
+        assert _run(throttle, _callback("admin:users")) is None
+    answer.assert_awaited_once()
+
+
+def test_idle_and_excess_buckets_are_evicted():
+    clock = [1000.0]
+    throttle = _throttle(max_keys=2)
+    with mock.patch.object(middlewares.time, "monotonic", lambda: clock[0]):
+        _run(throttle, _command("/aloqa"))
+        _run(throttle, _command("/x"))
+        assert len(throttle._buckets) == 3
+        _run(throttle, _command("/x"))
+        # Chegaradan oshganda eng uzoq ishlatilmagani o'chiriladi
+        assert ("user", USER.id, "/aloqa") not in throttle._buckets
+        assert len(throttle._buckets) == 2
+
+        clock[0] += 61
+        _run(throttle, _command("salom"))
+        _run(throttle, _command("/x"))
+        assert set(throttle._buckets) == {("user", USER.id, THROTTLE_OTHER), ("group", GROUP.id)}
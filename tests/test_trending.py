@@ -0,0 +1,50 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+import trending
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(trending, "scores", {})
+    monkeypatch.setattr(trending, "_dirty", set())
+    monkeypatch.setattr(trending, "_removed", set())
+
+
+def test_decayed_groups_are_pruned():
+    now = 1_000_000.0
+    trending.record_click(-100, "Taksi", "+998901234567", now=now - 365 * 86400)
+    trending._dirty.clear()
+    save = mock.AsyncMock(return_value=[])
+
+    with mock.patch.object(trending.db, "save_trending_scores", save), \
+            mock.patch.object(trending.time, "time", return_value=now):
+        assert asyncio.run(trending.persist())
+
+    assert trending.scores == {}
+    assert save.await_args.args[1] == [(-100, "Taksi")]
+
+
+def test_persist_writes_decayed_scores_and_adopts_merged():
+    now = 1_000_000.0
+    trending.record_click(-100, "Taksi", "+998901234567", now=now)
+    merged = [(-100, "Taksi", 5.0, now)]
+    save = mock.AsyncMock(return_value=merged)
+
+    with mock.patch.object(trending.db, "save_trending_scores", save), \
+            mock.patch.object(trending.time, "time", return_value=now):
+        assert asyncio.run(trending.persist())
+
+    rows, removed, decay_rate = save.await_args.args
+    assert rows == [(-100, "Taksi", "+998901234567", 1.0, now)]
+    assert decay_rate == trending.DECAY_RATE
+    assert trending.scores[-100]["Taksi"][:2] == [5.0, now]
+
+
+def test_failed_persist_keeps_dirty_entries():
+    trending.record_click(-100, "Taksi", "+998901234567")
+    with mock.patch.object(trending.db, "save_trending_scores", mock.AsyncMock(return_value=None)):
+        assert not asyncio.run(trending.persist())
+    assert trending._dirty == {(-100, "Taksi")}
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import TRACE_SAMPLE_RATE, TRACE_FILE, TRACE_EXPORT_INTERVAL, TRACE_BUFFER_SIZE
+import logger
+import metrics
+
+log = logger.get_logger("tracing")
+
+SERVICE_NAME = "mahalla-aloqa-bot"
+
+# OTLP span turlari
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+
+class Span:
+    """Bitta o'lchangan amal (OTLP span maydonlari bilan)"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind",
+                 "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: int):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+
+class _NoopSpan:
+    """Tanlanmagan trace - hech narsa yozilmaydi"""
+
+    def set(self, key: str, value: Any):
+        pass
+
+
+NOOP = _NoopSpan()
+
+# Joriy span; asyncio task yaratilganda kontekst bilan birga nusxalanadi
+_current: ContextVar[Optional[Any]] = ContextVar("current_span", default=None)
+_finished: List[Span] = []
+_export_task: Optional[asyncio.Task] = None
+_stop: Optional[asyncio.Event] = None
+
+
+def current_span():
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes) -> Iterator[Any]:
+    """Span ochish: ildiz span tanlash (sampling) qaroridan keyin bolalari unga ergashadi"""
+    parent = _current.get()
+    if parent is NOOP or (parent is None and (TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE)):
+        token = _current.set(NOOP)
+        try:
+            yield NOOP
+        finally:
+            _current.reset(token)
+        return
+
+    if parent is None:
+        new_span = Span(name, os.urandom(16).hex(), None, kind)
+    else:
+        new_span = Span(name, parent.trace_id, parent.span_id, kind)
+    new_span.attributes.update(attributes)
+
+    token = _current.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        new_span.end_ns = time.time_ns()
+        _record(new_span)
+
+
+def _record(finished: Span):
+    if len(_finished) >= TRACE_BUFFER_SIZE:
+        metrics.inc("trace_spans_dropped")
+        return
+    _finished.append(finished)
+
+
+def _attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def _to_otlp(spans: List[Span]) -> str:
+    """OTLP/JSON (ExportTraceServiceRequest) - bitta qator"""
+    otlp_spans = []
+    for s in spans:
+        item = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": s.kind,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [_attribute(k, v) for k, v in s.attributes.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1}
+        }
+        if s.parent_id:
+            item["parentSpanId"] = s.parent_id
+        otlp_spans.append(item)
+
+    return json.dumps({
+        "resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": otlp_spans}]
+        }]
+    }, ensure_ascii=False, separators=(",", ":"))
+
+
+def _append_line(line: str):
+    with open(TRACE_FILE, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+async def export():
+    """Tugagan spanlarni faylga yozish (fon oqimida)"""
+    global _finished
+    if not _finished:
+        return
+
+    spans, _finished = _finished, []
+    try:
+        await asyncio.to_thread(_append_line, _to_otlp(spans))
+        metrics.inc("trace_spans_exported", len(spans))
+    except Exception as e:
+        log.warning(f"⚠️ Trace yozish xatosi: {e}")
+
+
+async def _export_loop(stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=TRACE_EXPORT_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        await export()
+
+
+def start_exporter():
+    """Eksportchini ishga tushirish (sampling o'chirilgan bo'lsa hech narsa qilmaydi)"""
+    global _export_task, _stop
+    if TRACE_SAMPLE_RATE <= 0 or (_export_task is not None and not _export_task.done()):
+        return
+    _stop = asyncio.Event()
+    _export_task = asyncio.create_task(_export_loop(_stop))
+    log.info(f"🔎 Tracing yoqildi: {TRACE_SAMPLE_RATE:.0%} update -> {TRACE_FILE}")
+
+
+async def stop_exporter():
+    """Qolgan spanlarni yozib, eksportchini to'xtatish"""
+    if _export_task is not None:
+        _stop.set()
+        await _export_task
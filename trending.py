@@ -0,0 +1,153 @@
+import asyncio
+import heapq
+import math
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import TRENDING_HALF_LIFE_HOURS, TRENDING_PERSIST_INTERVAL
+import db
+import logger
+
+log = logger.get_logger("trending")
+
+# Ball har TRENDING_HALF_LIFE_HOURS soatda ikki marta kamayadi
+DECAY_RATE = math.log(2) / (TRENDING_HALF_LIFE_HOURS * 3600)
+MIN_VISIBLE_SCORE = 0.5  # bundan kichik ballar reytingda ko'rsatilmaydi
+MIN_KEPT_SCORE = 0.01  # bundan kichik ballar xotiradan o'chiriladi
+
+# group_id -> service -> [ball, ball hisoblangan vaqt, telefon]
+scores: Dict[int, Dict[str, List]] = {}
+_dirty: Set[Tuple[int, str]] = set()
+_removed: Set[Tuple[int, str]] = set()
+_persist_task: Optional[asyncio.Task] = None
+_persist_stop: Optional[asyncio.Event] = None
+
+
+def _decayed(entry: List, now: float) -> float:
+    """Ballni hozirgi vaqtga keltirish"""
+    return entry[0] * math.exp(-DECAY_RATE * (now - entry[1]))
+
+
+def record_click(group_id: int, service: str, phone: str, now: float = None):
+    """Clickni hisobga olish - O(1)"""
+    if now is None:
+        now = time.time()
+    group = scores.setdefault(group_id, {})
+    entry = group.get(service)
+
+    if entry is None:
+        group[service] = [1.0, now, phone]
+    else:
+        entry[0] = _decayed(entry, now) + 1.0
+        entry[1] = now
+        entry[2] = phone
+
+    _dirty.add((group_id, service))
+    _removed.discard((group_id, service))
+
+
+def update_phone(group_id: int, service: str, phone: str):
+    """Kontakt raqami o'zgarganda"""
+    entry = scores.get(group_id, {}).get(service)
+    if entry is not None:
+        entry[2] = phone
+        _dirty.add((group_id, service))
+
+
+def remove_contact(group_id: int, service: str):
+    """O'chirilgan kontaktni reytingdan olib tashlash"""
+    group = scores.get(group_id)
+    if group and group.pop(service, None) is not None:
+        _dirty.discard((group_id, service))
+        _removed.add((group_id, service))
+
+
+def get_trending(group_id: int, limit: int = 8) -> List[Tuple[str, str, float]]:
+    """Guruhdagi hozir eng mashhur kontaktlar (faqat shu guruh yozuvlari ko'riladi)"""
+    group = scores.get(group_id)
+    if not group:
+        return []
+
+    now = time.time()
+    candidates = (
+        (service, entry[2], _decayed(entry, now))
+        for service, entry in group.items()
+    )
+    top = heapq.nlargest(limit, candidates, key=lambda item: item[2])
+    return [item for item in top if item[2] >= MIN_VISIBLE_SCORE]
+
+
+async def load():
+    """Saqlangan ballarni xotiraga yuklash"""
+    rows = await db.load_trending_scores()
+    for group_id, service, phone, score, score_at in rows:
+        scores.setdefault(group_id, {})[service] = [score, score_at, phone]
+
+    if rows:
+        log.info(f"📈 {len(rows)} ta trending ball yuklandi")
+
+
+async def persist() -> bool:
+    """O'zgargan ballarni bazaga yozish"""
+    now = time.time()
+
+    # Juda kichik ballarni va bo'sh qolgan guruhlarni xotiradan tozalash
+    for group_id, group in scores.items():
+        for service in [s for s, e in group.items() if _decayed(e, now) < MIN_KEPT_SCORE]:
+            remove_contact(group_id, service)
+    for group_id in [g for g, group in scores.items() if not group]:
+        del scores[group_id]
+
+    if not _dirty and not _removed:
+        return True
+
+    dirty, removed = list(_dirty), list(_removed)
+    _dirty.clear()
+    _removed.clear()
+
+    # Ballar hozirgi vaqtga keltirib yoziladi - bazada boshqa workerlarnikiga shu vaqtda solishtiriladi
+    rows = []
+    for group_id, service in dirty:
+        entry = scores.get(group_id, {}).get(service)
+        if entry is not None:
+            rows.append((group_id, service, entry[2], _decayed(entry, now), now))
+
+    merged = await db.save_trending_scores(rows, removed, DECAY_RATE)
+    if merged is None:
+        _dirty.update(dirty)
+        _removed.update(key for key in removed if key not in _dirty)
+        return False
+
+    # Boshqa workerlar ballini o'zlashtirish (saqlash paytida yangi click kelganlari bundan mustasno)
+    for group_id, service, score, score_at in merged:
+        entry = scores.get(group_id, {}).get(service)
+        if entry is not None and (group_id, service) not in _dirty:
+            entry[0], entry[1] = score, score_at
+    return True
+
+
+async def _persist_loop(stop: asyncio.Event):
+    """Ballarni muntazam saqlab turish (saqlash o'rtasida bekor qilinmaydi)"""
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=TRENDING_PERSIST_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        await persist()
+
+
+def start_persister():
+    """Saqlovchini fon vazifasi sifatida ishga tushirish"""
+    global _persist_task, _persist_stop
+    if _persist_task is None or _persist_task.done():
+        _persist_stop = asyncio.Event()
+        _persist_task = asyncio.create_task(_persist_loop(_persist_stop))
+
+
+async def stop_persister():
+    """Saqlovchini to'xtatib, oxirgi holatni yozish"""
+    if _persist_task is not None:
+        _persist_stop.set()
+        await _persist_task
+    else:
+        await persist()